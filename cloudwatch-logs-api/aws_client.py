@@ -1,5 +1,8 @@
+import asyncio
 import boto3
 import aioboto3
+from botocore.config import Config
+from contextlib import AsyncExitStack
 from config import settings
 import logging
 
@@ -35,14 +38,67 @@ def get_boto3_resource(service_name):
     credentials = get_aws_credentials()
     return boto3.resource(service_name, **credentials)
 
+def get_client_config():
+    """
+    botocore config shared by the long-lived async clients.
+    """
+    return Config(
+        max_pool_connections=settings.AWS_MAX_POOL_CONNECTIONS,
+        retries={"max_attempts": settings.AWS_MAX_RETRY_ATTEMPTS, "mode": "adaptive"}
+    )
+
 async def get_aioboto3_client(service_name):
     """
-    Get an async boto3 client for the specified service.
+    Get a new async boto3 client context manager for the specified service.
+    Prefer client_manager.get_client() in request paths; this opens a new
+    session and connection pool on every call.
     """
     credentials = get_aws_credentials()
     session = aioboto3.Session()
     return session.client(service_name, **credentials)
 
+class AWSClientManager:
+    """
+    Application-lifetime owner of one aioboto3 session and one client per service.
+    Started from the FastAPI lifespan and closed on shutdown; clients are created
+    lazily so scripts and tests that never call start() still work.
+    """
+
+    def __init__(self):
+        self._session = None
+        self._exit_stack = None
+        self._clients = {}
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        if self._exit_stack is None:
+            self._session = aioboto3.Session(**get_aws_credentials())
+            self._exit_stack = AsyncExitStack()
+            logger.info(f"AWS client manager started (max_pool_connections={settings.AWS_MAX_POOL_CONNECTIONS})")
+
+    async def get_client(self, service_name):
+        client = self._clients.get(service_name)
+        if client is not None:
+            return client
+
+        async with self._lock:
+            if service_name not in self._clients:
+                await self.start()
+                self._clients[service_name] = await self._exit_stack.enter_async_context(
+                    self._session.client(service_name, config=get_client_config())
+                )
+            return self._clients[service_name]
+
+    async def close(self):
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+            logger.info("AWS client manager closed")
+        self._exit_stack = None
+        self._session = None
+        self._clients = {}
+
+client_manager = AWSClientManager()
+
 # Initialize commonly used clients
 logs_client = get_boto3_client('logs')
 cloudwatch_client = get_boto3_client('cloudwatch')
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""
+Benchmark per-call aioboto3 clients against the shared client manager.
+
+Calls describe_log_groups / describe_log_streams repeatedly with both strategies
+and prints p50/p95 latencies. Uses the AWS credentials from config/.env.
+
+Usage:
+    python benchmark_clients.py --iterations 50
+    python benchmark_clients.py --log-group /aws/lambda/my-service --concurrency 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from aws_client import get_aioboto3_client, client_manager
+
+async def call_per_request_client(operation, params):
+    async with await get_aioboto3_client('logs') as logs:
+        await getattr(logs, operation)(**params)
+
+async def call_shared_client(operation, params):
+    logs = await client_manager.get_client('logs')
+    await getattr(logs, operation)(**params)
+
+async def measure(call, operation, params, iterations, concurrency):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await call(operation, params)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(one() for _ in range(iterations)))
+    return latencies
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def main(args):
+    operations = [("describe_log_groups", {"limit": 50})]
+    if args.log_group:
+        operations.append(("describe_log_streams", {
+            "logGroupName": args.log_group,
+            "limit": 50,
+            "descending": True,
+            "orderBy": "LastEventTime"
+        }))
+
+    await client_manager.start()
+    try:
+        # Warm up both paths (credential resolution, DNS)
+        for operation, params in operations:
+            await call_per_request_client(operation, params)
+            await call_shared_client(operation, params)
+
+        print(f"{'operation':<24}{'strategy':<14}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+        for operation, params in operations:
+            for name, call in (("per-request", call_per_request_client), ("shared", call_shared_client)):
+                latencies = await measure(call, operation, params, args.iterations, args.concurrency)
+                print(f"{operation:<24}{name:<14}{percentile(latencies, 50):>10.1f}"
+                      f"{percentile(latencies, 95):>10.1f}{statistics.mean(latencies):>10.1f}")
+    finally:
+        await client_manager.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark aioboto3 client strategies")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--log-group", help="Also benchmark describe_log_streams for this log group")
+    asyncio.run(main(parser.parse_args()))
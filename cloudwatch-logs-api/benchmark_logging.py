@@ -0,0 +1,105 @@
+"""
+Benchmark the cost of a structured log call as seen by the caller.
+
+Compares the per-call JsonFormatter that cli.py used to define (stdlib json,
+datetime.utcnow per record) with FastJsonFormatter, each writing to a file
+directly and through the QueueHandler/QueueListener setup, and prints
+p50/p99/mean microseconds per logger.info call plus the time to drain the queue.
+
+Usage:
+    python benchmark_logging.py --records 20000
+    python benchmark_logging.py --records 50000 --output /tmp/bench.log
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import statistics
+import tempfile
+from datetime import datetime
+
+from json_logging import FastJsonFormatter, setup_queue_logging, stop_queue_logging
+
+class LegacyJsonFormatter(logging.Formatter):
+    """
+    The formatter cli.py used before json_logging, kept as the baseline
+    """
+
+    def format(self, record):
+        log_record = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key.startswith('_') or key in ['args', 'exc_info', 'exc_text', 'levelname',
+                                             'levelno', 'lineno', 'module', 'msecs', 'msg',
+                                             'name', 'pathname', 'process', 'processName',
+                                             'relativeCreated', 'stack_info', 'thread',
+                                             'threadName', 'created', 'filename', 'funcName']:
+                continue
+            log_record[key] = value
+        return json.dumps(log_record)
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def run(name, formatter, queued, records, path):
+    logger = logging.getLogger(f"benchmark.{name}")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    handler = logging.FileHandler(path, mode="w")
+    handler.setFormatter(formatter)
+    listener = None
+    if queued:
+        listener = setup_queue_logging(logger, [handler])
+    else:
+        logger.addHandler(handler)
+
+    latencies = []
+    for i in range(records):
+        started = time.perf_counter_ns()
+        logger.info(
+            "Completed: process_payment",
+            extra={
+                'correlation_id': 'c85e652a-8caf-48bd-8d01-d3074d51ff88',
+                'span': 'process_payment',
+                'span_id': f"{i:016x}",
+                'duration_ms': '12.34',
+                'status': 'success'
+            }
+        )
+        latencies.append((time.perf_counter_ns() - started) / 1000)
+
+    started = time.perf_counter()
+    if listener:
+        stop_queue_logging(listener)
+    drain_ms = (time.perf_counter() - started) * 1000
+    for existing in list(logger.handlers):
+        logger.removeHandler(existing)
+    handler.close()
+
+    print(f"{name:<24}{percentile(latencies, 50):>10.1f}{percentile(latencies, 99):>10.1f}"
+          f"{statistics.mean(latencies):>10.1f}{drain_ms:>12.1f}")
+
+def main(args):
+    path = args.output or os.path.join(tempfile.gettempdir(), "benchmark_logging.log")
+    print(f"{'setup':<24}{'p50 us':>10}{'p99 us':>10}{'mean us':>10}{'drain ms':>12}")
+    for name, formatter, queued in (
+        ("legacy/direct", LegacyJsonFormatter(), False),
+        ("fast/direct", FastJsonFormatter(), False),
+        ("legacy/queue", LegacyJsonFormatter(), True),
+        ("fast/queue", FastJsonFormatter(), True),
+    ):
+        run(name, formatter, queued, args.records, path)
+    os.remove(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark JSON log formatting and queue-based handlers")
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--output", help="Log file to write to (default: a temporary file)")
+    main(parser.parse_args())
@@ -0,0 +1,269 @@
+import time
+import bisect
+import asyncio
+import functools
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from aws_client import client_manager
+from config import settings
+from schemas import LogGroup, LogStream
+from logs_service import to_log_group, to_log_stream
+
+logger = logging.getLogger(__name__)
+
+# lastEventTimestamp is updated eventually (typically within an hour of ingestion),
+# so incremental stream refreshes re-read streams this far behind the newest one seen
+STREAM_EVENT_LAG_MS = 3600 * 1000
+
+# Marks tokens that page straight through describe_log_streams rather than through an index
+CLOUDWATCH_TOKEN_PREFIX = "cw:"
+
+def prefix_end(prefix: str) -> str:
+    """
+    Smallest string greater than every string starting with prefix
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+class CatalogIndex:
+    """
+    Immutable snapshot of log groups or streams, sorted by name so a prefix
+    maps to a contiguous range found with two bisects.
+    """
+
+    def __init__(self, items: Iterable):
+        self.items = sorted(items, key=lambda item: item.name)
+        self.names = [item.name for item in self.items]
+        self._recent = None
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @property
+    def recent(self) -> list:
+        """
+        Streams ordered by last event, newest first (built on first use)
+        """
+        if self._recent is None:
+            self._recent = sorted(self.items, key=lambda item: item.last_event_timestamp or 0, reverse=True)
+        return self._recent
+
+    @property
+    def latest_event_timestamp(self) -> int:
+        return max((item.last_event_timestamp or 0 for item in self.items), default=0)
+
+    def by_prefix(self, prefix: Optional[str], limit: int, next_token: Optional[str] = None) -> Tuple[list, Optional[str]]:
+        """
+        Page of items in name order. The token is the last name returned.
+        """
+        low, high = 0, len(self.names)
+        if prefix:
+            low = bisect.bisect_left(self.names, prefix)
+            high = bisect.bisect_left(self.names, prefix_end(prefix), low)
+        if next_token:
+            low = max(low, bisect.bisect_right(self.names, next_token))
+
+        end = min(high, low + limit)
+        return self.items[low:end], self.names[end - 1] if end < high else None
+
+    def by_recency(self, limit: int, next_token: Optional[str] = None) -> Tuple[list, Optional[str]]:
+        """
+        Page of items ordered by last event. The token is the offset of the next page.
+        """
+        if next_token and not next_token.isdigit():
+            raise ValueError(f"Invalid next_token: {next_token}")
+        start = int(next_token) if next_token else 0
+        end = start + limit
+        return self.recent[start:end], str(end) if end < len(self.recent) else None
+
+class LogCatalog:
+    """
+    In-memory catalog of log groups and of the streams of the CATALOG_MAX_LOG_GROUPS
+    most recently listed groups. Indexes are fully paginated in background tasks
+    and replaced atomically. Once older than CATALOG_TTL_SECONDS they are still
+    served while a refresh runs. The first listing of a group is answered with a
+    single describe_log_streams page while its index is built.
+    """
+
+    def __init__(self):
+        self.groups: Optional[CatalogIndex] = None
+        self.groups_refreshed_at = 0.0
+        self.streams: "OrderedDict[str, CatalogIndex]" = OrderedDict()
+        self.streams_refreshed_at: Dict[str, float] = {}
+        self.streams_full_refresh_at: Dict[str, float] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+
+    def schedule(self, key: str, refresh: Callable[[], Awaitable[None]]) -> asyncio.Task:
+        """
+        Start a refresh unless one for the same key is already running
+        """
+        task = self.tasks.get(key)
+        if task is None or task.done():
+            task = asyncio.create_task(refresh())
+            task.add_done_callback(self._log_failure)
+            self.tasks[key] = task
+        return task
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception():
+            logger.error(f"Error refreshing log catalog: {str(task.exception())}")
+
+    def is_stale(self, refreshed_at: float) -> bool:
+        return time.monotonic() - refreshed_at > settings.CATALOG_TTL_SECONDS
+
+    async def refresh_log_groups(self) -> None:
+        logs = await client_manager.get_client('logs')
+        params = {"limit": 50}
+        log_groups = []
+        while True:
+            response = await logs.describe_log_groups(**params)
+            log_groups.extend(to_log_group(lg) for lg in response.get("logGroups", []))
+            next_token = response.get("nextToken")
+            if not next_token:
+                break
+            params["nextToken"] = next_token
+
+        self.groups = CatalogIndex(log_groups)
+        self.groups_refreshed_at = time.monotonic()
+        logger.info(f"Log catalog holds {len(log_groups)} log groups")
+
+    async def refresh_log_streams(self, log_group_name: str) -> CatalogIndex:
+        """
+        Page through the streams newest first. Between full refreshes, stop at
+        streams that have seen no events since the previous refresh and merge
+        the rest into the existing index.
+        """
+        previous = self.streams.get(log_group_name)
+        full = previous is None or (
+            time.monotonic() - self.streams_full_refresh_at.get(log_group_name, 0) > settings.CATALOG_FULL_REFRESH_SECONDS
+        )
+        since = None if full else previous.latest_event_timestamp - STREAM_EVENT_LAG_MS
+
+        logs = await client_manager.get_client('logs')
+        params = {
+            "logGroupName": log_group_name,
+            "limit": 50,
+            "descending": True,
+            "orderBy": "LastEventTime"
+        }
+        streams: Dict[str, LogStream] = {}
+        done = False
+        while not done:
+            response = await logs.describe_log_streams(**params)
+            for ls in response.get("logStreams", []):
+                if since is not None and (ls.get("lastEventTimestamp") or 0) < since:
+                    done = True
+                    break
+                streams[ls["logStreamName"]] = to_log_stream(ls, log_group_name)
+            next_token = response.get("nextToken")
+            if not next_token:
+                break
+            params["nextToken"] = next_token
+
+        if not full:
+            streams = {**{item.name: item for item in previous.items}, **streams}
+
+        now = time.monotonic()
+        index = CatalogIndex(streams.values())
+        self.streams[log_group_name] = index
+        self.streams.move_to_end(log_group_name)
+        self.streams_refreshed_at[log_group_name] = now
+        if full:
+            self.streams_full_refresh_at[log_group_name] = now
+
+        # Least recently listed groups are dropped and re-listed on their next request
+        while len(self.streams) > settings.CATALOG_MAX_LOG_GROUPS:
+            evicted, _ = self.streams.popitem(last=False)
+            self.streams_refreshed_at.pop(evicted, None)
+            self.streams_full_refresh_at.pop(evicted, None)
+        return index
+
+    async def describe_log_streams_page(
+        self,
+        log_group_name: str,
+        prefix: Optional[str],
+        limit: int,
+        next_token: Optional[str] = None
+    ) -> Tuple[List[LogStream], Optional[str]]:
+        """
+        One describe_log_streams page in the order the index would serve it
+        """
+        logs = await client_manager.get_client('logs')
+        params = {"logGroupName": log_group_name, "limit": min(limit, 50)}
+        if prefix:
+            params["logStreamNamePrefix"] = prefix
+        else:
+            params.update(descending=True, orderBy="LastEventTime")
+        if next_token:
+            params["nextToken"] = next_token
+
+        response = await logs.describe_log_streams(**params)
+        streams = [to_log_stream(ls, log_group_name) for ls in response.get("logStreams", [])]
+        token = response.get("nextToken")
+        return streams, CLOUDWATCH_TOKEN_PREFIX + token if token else None
+
+    async def list_log_groups(
+        self,
+        prefix: Optional[str] = None,
+        limit: int = 50,
+        next_token: Optional[str] = None,
+        refresh: bool = False
+    ) -> Tuple[List[LogGroup], Optional[str]]:
+        if self.groups is None or refresh:
+            # Shielded so a cancelled request does not cancel a refresh others may be waiting on
+            await asyncio.shield(self.schedule("groups", self.refresh_log_groups))
+        elif self.is_stale(self.groups_refreshed_at):
+            self.schedule("groups", self.refresh_log_groups)
+        return self.groups.by_prefix(prefix, limit, next_token)
+
+    async def list_log_streams(
+        self,
+        log_group_name: str,
+        prefix: Optional[str] = None,
+        limit: int = 50,
+        next_token: Optional[str] = None,
+        refresh: bool = False
+    ) -> Tuple[List[LogStream], Optional[str]]:
+        """
+        Streams matching a prefix in name order, otherwise all streams newest first
+        (the same orders describe_log_streams supports)
+        """
+        # Pages started against CloudWatch keep paging there, whatever the index holds by now
+        if next_token and next_token.startswith(CLOUDWATCH_TOKEN_PREFIX):
+            return await self.describe_log_streams_page(
+                log_group_name, prefix, limit, next_token[len(CLOUDWATCH_TOKEN_PREFIX):]
+            )
+
+        key = f"streams:{log_group_name}"
+        refresh_streams = functools.partial(self.refresh_log_streams, log_group_name)
+        index = self.streams.get(log_group_name)
+        if refresh or (index is None and next_token):
+            index = await asyncio.shield(self.schedule(key, refresh_streams))
+        elif index is None:
+            # First listing: crawl every page in the background, answer this one directly
+            self.schedule(key, refresh_streams)
+            return await self.describe_log_streams_page(log_group_name, prefix, limit)
+        else:
+            self.streams.move_to_end(log_group_name)
+            if self.is_stale(self.streams_refreshed_at[log_group_name]):
+                self.schedule(key, refresh_streams)
+
+        if prefix:
+            return index.by_prefix(prefix, limit, next_token)
+        return index.by_recency(limit, next_token)
+
+    def start(self) -> None:
+        """
+        Load the log groups in the background so the first request is served from memory
+        """
+        self.schedule("groups", self.refresh_log_groups)
+
+    async def close(self) -> None:
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        self.tasks = {}
+
+log_catalog = LogCatalog()
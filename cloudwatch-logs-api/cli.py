@@ -1,32 +1,19 @@
 #!/usr/bin/env python3
-import json
-import logging
-import random
+import os
 import time
 import uuid
-from datetime import datetime
+import random
+import logging
+import argparse
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
 from typing import Dict, List, Optional, Any, Tuple
 
-# Configure logging
-class JsonFormatter(logging.Formatter):
-    def format(self, record):
-        log_record = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "level": record.levelname,
-            "message": record.getMessage(),
-        }
-        
-        # Add extra fields from the record
-        for key, value in record.__dict__.items():
-            if key.startswith('_') or key in ['args', 'exc_info', 'exc_text', 'levelname', 
-                                             'levelno', 'lineno', 'module', 'msecs', 'msg', 
-                                             'name', 'pathname', 'process', 'processName', 
-                                             'relativeCreated', 'stack_info', 'thread', 
-                                             'threadName', 'created', 'filename', 'funcName']:
-                continue
-            log_record[key] = value
-            
-        return json.dumps(log_record)
+from json_logging import FastJsonFormatter, setup_queue_logging
 
 # Setup logger
 logger = logging.getLogger("ecommerce")
@@ -34,13 +21,14 @@ logger.setLevel(logging.INFO)
 
 # Console handler
 console_handler = logging.StreamHandler()
-console_handler.setFormatter(JsonFormatter())
-logger.addHandler(console_handler)
+console_handler.setFormatter(FastJsonFormatter())
 
 # Optional file handler
 file_handler = logging.FileHandler("ecommerce.log")
-file_handler.setFormatter(JsonFormatter())
-logger.addHandler(file_handler)
+file_handler.setFormatter(FastJsonFormatter())
+
+# Format and write on a listener thread; logging calls only enqueue the record
+log_listener = setup_queue_logging(logger, [console_handler, file_handler])
 
 # Sample data
 products = {
@@ -55,80 +43,144 @@ payment_methods = ["credit_card", "paypal", "bank_transfer", "crypto"]
 shipping_methods = ["standard", "express", "overnight", "pickup"]
 user_locations = ["New York", "London", "Tokyo", "Sydney", "Berlin"]
 
+# Simulated latency is opt-in so runs without it measure the real tracing overhead
+SIMULATE_LATENCY = os.getenv("SIMULATE_LATENCY", "false").lower() == "true"
+
+def simulate_delay(low: float, high: float) -> float:
+    """Sleep for a random time in [low, high] seconds when latency simulation is on."""
+    if not SIMULATE_LATENCY:
+        return 0.0
+    delay = random.uniform(low, high)
+    time.sleep(delay)
+    return delay
+
 # Tracing utility
-class TracingContext:
-    def __init__(self, correlation_id: str = None, parent_span: str = None):
-        self.correlation_id = correlation_id or str(uuid.uuid4())
-        self.parent_span = parent_span
+class Span:
+    """
+    A timed operation. Durations use perf_counter_ns, so they are monotonic;
+    start_time is the wall-clock start, for placing the span in time.
+    """
+    __slots__ = ('name', 'span_id', 'parent', 'correlation_id', 'start_time', 'start_ns', 'end_ns', 'status', 'error')
+
+    def __init__(self, name: str, correlation_id: str, parent: Optional['Span'] = None):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent = parent
+        self.correlation_id = correlation_id
         self.start_time = time.time()
-        
-    def create_child_context(self, span_name: str) -> 'TracingContext':
-        """Create a new context for a child operation."""
-        return TracingContext(
-            correlation_id=self.correlation_id,
-            parent_span=span_name
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+        self.status = 'success'
+        self.error = None
+
+    @property
+    def parent_span(self) -> Optional[str]:
+        return self.parent.name if self.parent else None
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.perf_counter_ns()) - self.start_ns) / 1_000_000
+
+    @property
+    def end_time(self) -> float:
+        return self.start_time + self.duration_ms / 1000
+
+def format_wall_time(seconds: float) -> str:
+    """ISO-8601 UTC with millisecond precision, like the log record timestamps"""
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
+
+# The span of the code currently running; child spans pick up their parent from here
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def log_spans(spans: List[Span]):
+    """
+    Default exporter: one log line per finished span. Lines are written when the
+    recorder flushes, so span_start/span_end carry when the span actually ran.
+    """
+    for span in spans:
+        fields = {
+            'correlation_id': span.correlation_id,
+            'span': span.name,
+            'span_id': span.span_id,
+            'parent_span': span.parent_span,
+            'span_start': format_wall_time(span.start_time),
+            'span_end': format_wall_time(span.end_time),
+            'duration_ms': f"{span.duration_ms:.2f}",
+            'status': span.status,
+        }
+        if span.error is not None:
+            fields['error_message'] = str(span.error)
+            fields['error_type'] = type(span.error).__name__
+            logger.error(f"Failed: {span.name} - {span.error}", extra=fields)
+        else:
+            logger.info(f"Completed: {span.name}", extra=fields)
+
+class SpanRecorder:
+    """
+    Keeps finished spans in a ring buffer and hands them to the exporter in
+    batches, so recording a span costs a deque append instead of a log call.
+    When more than `capacity` spans are waiting, the oldest are dropped.
+    """
+
+    def __init__(self, exporter=log_spans, capacity: int = 4096, batch_size: int = 256):
+        self.exporter = exporter
+        self.buffer = deque(maxlen=capacity)
+        self.batch_size = batch_size
+        self.recorded = 0
+        self.exported = 0
+        self.lock = threading.Lock()
+
+    @property
+    def dropped(self) -> int:
+        return max(0, self.recorded - self.exported - len(self.buffer))
+
+    def record(self, span: Span):
+        self.buffer.append(span)
+        self.recorded += 1
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            batch = list(self.buffer)
+            self.buffer.clear()
+        if batch and self.exporter:
+            self.exporter(batch)
+        self.exported += len(batch)
+
+    @contextmanager
+    def span(self, name: str, correlation_id: Optional[str] = None):
+        """Run a block as a child of the current span (or as a new trace)."""
+        parent = current_span.get()
+        span = Span(
+            name,
+            correlation_id or (parent.correlation_id if parent else str(uuid.uuid4())),
+            parent
         )
+        token = current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.status = 'error'
+            span.error = e
+            raise
+        finally:
+            span.end_ns = time.perf_counter_ns()
+            current_span.reset(token)
+            self.record(span)
+
+recorder = SpanRecorder()
 
 # Timing decorator for method-level tracing
 def trace(span_name: str):
     def decorator(func):
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            # Extract context from kwargs or create new one
-            ctx = kwargs.get('ctx') or TracingContext()
-            
-            # Create a new span for this operation
-            current_span = span_name
-            start_time = time.time()
-            
-            # Add the context back to kwargs
-            kwargs['ctx'] = ctx
-            
-            # Prepare common log fields
-            log_fields = {
-                'correlation_id': ctx.correlation_id,
-                'span': current_span,
-                'parent_span': ctx.parent_span,
-                'duration_ms': 0
-            }
-            
-            # Log operation start
-            logger.info(f"Started: {current_span}", extra=log_fields)
-            
-            # Add random small delay to simulate processing time
-            simulation_delay = random.uniform(0.01, 0.2)
-            time.sleep(simulation_delay)
-            
-            try:
-                # Execute the function
-                result = func(*args, **kwargs)
-                
-                # Log success
-                duration_ms = (time.time() - start_time) * 1000
-                logger.info(
-                    f"Completed: {current_span}",
-                    extra={
-                        **log_fields,
-                        'duration_ms': f"{duration_ms:.2f}",
-                        'status': 'success',
-                    }
-                )
-                return result
-                
-            except Exception as e:
-                # Log error
-                duration_ms = (time.time() - start_time) * 1000
-                logger.error(
-                    f"Failed: {current_span} - {str(e)}",
-                    extra={
-                        **log_fields,
-                        'duration_ms': f"{duration_ms:.2f}",
-                        'status': 'error',
-                        'error_message': str(e),
-                        'error_type': type(e).__name__
-                    }
-                )
-                raise
-                
+            with recorder.span(span_name) as span:
+                # Methods read the correlation ID from ctx
+                kwargs['ctx'] = span
+                simulate_delay(0.01, 0.2)
+                return func(*args, **kwargs)
         return wrapper
     return decorator
 
@@ -136,7 +188,7 @@ def trace(span_name: str):
 class EcommerceService:
     
     @trace(span_name="browse_products")
-    def browse_products(self, search_term: str = None, filters: Dict = None, ctx: TracingContext = None) -> List[Dict]:
+    def browse_products(self, search_term: str = None, filters: Dict = None, ctx: Span = None) -> List[Dict]:
         """Browse and filter products."""
         filters = filters or {}
         
@@ -197,7 +249,7 @@ class EcommerceService:
     
     @trace(span_name="add_to_cart")
     def add_to_cart(self, cart_id: str, product_id: str, quantity: int, 
-                   ctx: TracingContext = None) -> Dict:
+                   ctx: Span = None) -> Dict:
         """Add a product to the shopping cart."""
         # Validate product exists
         if product_id not in products:
@@ -215,8 +267,7 @@ class EcommerceService:
         product = products[product_id]
         
         # Check stock availability
-        stock_ctx = ctx.create_child_context("check_stock")
-        in_stock = self.check_stock(product_id, quantity, ctx=stock_ctx)
+        in_stock = self.check_stock(product_id, quantity)
         
         if not in_stock:
             logger.error(
@@ -258,7 +309,7 @@ class EcommerceService:
         }
     
     @trace(span_name="check_stock")
-    def check_stock(self, product_id: str, quantity: int, ctx: TracingContext = None) -> bool:
+    def check_stock(self, product_id: str, quantity: int, ctx: Span = None) -> bool:
         """Check if a product is in stock."""
         # Simulate database lookup
         if product_id not in products:
@@ -290,7 +341,7 @@ class EcommerceService:
         )
         
         # Simulate occasional stock check delays
-        if random.random() < 0.2:  # 20% chance of delay
+        if SIMULATE_LATENCY and random.random() < 0.2:  # 20% chance of delay
             delay = random.uniform(0.5, 1.5)
             logger.info(
                 f"Stock database experiencing slowness: {delay:.2f}s delay",
@@ -307,7 +358,7 @@ class EcommerceService:
     
     @trace(span_name="process_payment")
     def process_payment(self, order_id: str, amount: float, payment_method: str, 
-                       payment_details: Dict, ctx: TracingContext = None) -> Dict:
+                       payment_details: Dict, ctx: Span = None) -> Dict:
         """Process a payment for an order."""
         # Log payment attempt
         logger.info(
@@ -327,10 +378,7 @@ class EcommerceService:
         
         # Simulate payment processing steps
         # 1. Validate payment details
-        validation_ctx = ctx.create_child_context("validate_payment")
-        validation_result = self.validate_payment_details(
-            payment_method, payment_details, ctx=validation_ctx
-        )
+        validation_result = self.validate_payment_details(payment_method, payment_details)
         
         if not validation_result['valid']:
             logger.error(
@@ -359,8 +407,7 @@ class EcommerceService:
         )
         
         # Simulate gateway processing time
-        gateway_time = random.uniform(0.5, 2.0)
-        time.sleep(gateway_time)
+        gateway_time = simulate_delay(0.5, 2.0)
         
         # 3. Process payment (with simulated failures)
         success_rate = {
@@ -423,7 +470,7 @@ class EcommerceService:
     
     @trace(span_name="validate_payment_details")
     def validate_payment_details(self, payment_method: str, payment_details: Dict, 
-                                ctx: TracingContext = None) -> Dict:
+                                ctx: Span = None) -> Dict:
         """Validate payment details for a specific payment method."""
         validation_errors = []
         
@@ -503,7 +550,7 @@ class EcommerceService:
     @trace(span_name="create_shipment")
     def create_shipment(self, order_id: str, shipping_address: Dict, 
                        items: List[Dict], shipping_method: str, 
-                       ctx: TracingContext = None) -> Dict:
+                       ctx: Span = None) -> Dict:
         """Create a shipment for an order."""
         shipment_id = f"shp-{uuid.uuid4().hex[:8]}"
         
@@ -532,8 +579,7 @@ class EcommerceService:
         }.get(shipping_method, 5)
         
         # Check stock and allocate inventory
-        inventory_ctx = ctx.create_child_context("allocate_inventory")
-        allocation_success = self.allocate_inventory(items, ctx=inventory_ctx)
+        allocation_success = self.allocate_inventory(items)
         
         if not allocation_success:
             logger.error(
@@ -549,8 +595,7 @@ class EcommerceService:
             raise ValueError("Failed to allocate inventory for shipment")
         
         # Validate shipping address
-        address_ctx = ctx.create_child_context("validate_address")
-        address_validation = self.validate_shipping_address(shipping_address, ctx=address_ctx)
+        address_validation = self.validate_shipping_address(shipping_address)
         
         if not address_validation['valid']:
             logger.error(
@@ -614,7 +659,7 @@ class EcommerceService:
         }
     
     @trace(span_name="allocate_inventory")
-    def allocate_inventory(self, items: List[Dict], ctx: TracingContext = None) -> bool:
+    def allocate_inventory(self, items: List[Dict], ctx: Span = None) -> bool:
         """Allocate inventory for a list of items."""
         # Log inventory allocation start
         logger.info(
@@ -677,7 +722,7 @@ class EcommerceService:
             )
         
         # Simulate occasional inventory system lag
-        if random.random() < 0.15:  # 15% chance of delay
+        if SIMULATE_LATENCY and random.random() < 0.15:  # 15% chance of delay
             delay = random.uniform(0.3, 1.0)
             logger.info(
                 f"Inventory system experiencing lag: {delay:.2f}s delay",
@@ -693,7 +738,7 @@ class EcommerceService:
         return True
     
     @trace(span_name="validate_shipping_address")
-    def validate_shipping_address(self, address: Dict, ctx: TracingContext = None) -> Dict:
+    def validate_shipping_address(self, address: Dict, ctx: Span = None) -> Dict:
         """Validate a shipping address."""
         required_fields = ['name', 'street', 'city', 'postal_code', 'country']
         missing_fields = [field for field in required_fields if field not in address or not address[field]]
@@ -718,7 +763,7 @@ class EcommerceService:
             }
             
         # Simulate address validation service (with occasional slowness)
-        if random.random() < 0.2:  # 20% chance of slow validation
+        if SIMULATE_LATENCY and random.random() < 0.2:  # 20% chance of slow validation
             delay = random.uniform(0.5, 1.5)
             logger.info(
                 f"Address validation service slow: {delay:.2f}s delay",
@@ -761,10 +806,10 @@ class EcommerceService:
         }
 
 # Simulate a full order process
-def simulate_order_process():
-    # Create a correlation ID for the entire process
-    correlation_id = str(uuid.uuid4())
-    main_ctx = TracingContext(correlation_id=correlation_id)
+@trace(span_name="order_process")
+def simulate_order_process(ctx: Span = None):
+    # The root span carries the correlation ID for the entire process
+    correlation_id = ctx.correlation_id
     
     # Log start of order process
     logger.info(
@@ -786,11 +831,9 @@ def simulate_order_process():
             'price_max': 1000
         }
         
-        browse_ctx = main_ctx.create_child_context("browse_products")
         found_products = service.browse_products(
             search_term="phone", 
-            filters=filters, 
-            ctx=browse_ctx
+            filters=filters
         )
         
         if not found_products:
@@ -811,13 +854,11 @@ def simulate_order_process():
         for product in found_products[:2]:  # Add up to 2 products
             quantity = random.randint(1, 3)
             
-            add_ctx = main_ctx.create_child_context("add_to_cart")
             try:
                 cart_item = service.add_to_cart(
                     cart_id=cart_id,
                     product_id=product['id'],
-                    quantity=quantity,
-                    ctx=add_ctx
+                    quantity=quantity
                 )
                 cart_items.append(cart_item)
             except ValueError as e:
@@ -896,14 +937,12 @@ def simulate_order_process():
                 "wallet_address": "0x1234567890abcdef"
             })
         
-        payment_ctx = main_ctx.create_child_context("process_payment")
         try:
             payment_result = service.process_payment(
                 order_id=order_id,
                 amount=total,
                 payment_method=payment_method,
-                payment_details=payment_details,
-                ctx=payment_ctx
+                payment_details=payment_details
             )
         except ValueError as e:
             logger.error(
@@ -931,14 +970,12 @@ def simulate_order_process():
             "country": "United States"
         }
         
-        shipment_ctx = main_ctx.create_child_context("create_shipment")
         try:
             shipment_result = service.create_shipment(
                 order_id=order_id,
                 shipping_address=shipping_address,
                 items=cart_items,
-                shipping_method=shipping_method,
-                ctx=shipment_ctx
+                shipping_method=shipping_method
             )
         except Exception as e:
             logger.error(
@@ -982,30 +1019,45 @@ def simulate_order_process():
 
 # Run multiple simulations
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate traced e-commerce order flows")
+    parser.add_argument("--simulations", type=int, default=5, help="Number of order flows to run")
+    parser.add_argument("--simulate-latency", action="store_true",
+                        help="Add random processing delays (also enabled by SIMULATE_LATENCY=true)")
+    args = parser.parse_args()
+    SIMULATE_LATENCY = SIMULATE_LATENCY or args.simulate_latency
+    
     logger.info(
         "Starting e-commerce flow simulations",
         extra={
-            'simulation_count': 5,
-            'simulation_type': 'order_flow'
+            'simulation_count': args.simulations,
+            'simulation_type': 'order_flow',
+            'simulate_latency': SIMULATE_LATENCY
         }
     )
     
-    for i in range(5):
+    started_ns = time.perf_counter_ns()
+    for i in range(args.simulations):
         logger.info(
-            f"Running simulation {i+1}/5",
+            f"Running simulation {i+1}/{args.simulations}",
             extra={
                 'simulation_number': i+1,
                 'simulation_type': 'order_flow'
             }
         )
         simulate_order_process()
-        time.sleep(1)  # Pause between simulations
+        simulate_delay(1, 1)  # Pause between simulations
+    
+    # Export whatever is left in the span buffer
+    recorder.flush()
     
     logger.info(
         "All simulations completed",
         extra={
-            'simulation_count': 5,
+            'simulation_count': args.simulations,
             'simulation_type': 'order_flow',
+            'span_count': recorder.recorded,
+            'spans_dropped': recorder.dropped,
+            'duration_ms': f"{(time.perf_counter_ns() - started_ns) / 1_000_000:.2f}",
             'status': 'complete'
         }
-    )
\ No newline at end of file
+    )
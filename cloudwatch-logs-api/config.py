@@ -18,6 +18,10 @@ class Settings(BaseSettings):
     # If running in AWS, these can be empty and boto3 will use instance profile
     USE_AWS_INSTANCE_PROFILE: bool = os.getenv("USE_AWS_INSTANCE_PROFILE", "False").lower() == "true"
     
+    # Connection pool for the shared async AWS clients
+    AWS_MAX_POOL_CONNECTIONS: int = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50"))
+    AWS_MAX_RETRY_ATTEMPTS: int = int(os.getenv("AWS_MAX_RETRY_ATTEMPTS", "5"))
+    
     # CORS Settings
     CORS_ORIGINS: List[str] = [
         "http://localhost:4200",  # Angular dev server
@@ -33,6 +37,50 @@ class Settings(BaseSettings):
     MAX_LOGS_RESULTS: int = int(os.getenv("MAX_LOGS_RESULTS", "1000"))
     MAX_QUERY_DURATION_SECONDS: int = int(os.getenv("MAX_QUERY_DURATION_SECONDS", "300"))
     
+    # Logs Insights polling: keep the interval on progress, double up to the max otherwise
+    QUERY_POLL_INITIAL_SECONDS: float = float(os.getenv("QUERY_POLL_INITIAL_SECONDS", "1"))
+    QUERY_POLL_MAX_SECONDS: float = float(os.getenv("QUERY_POLL_MAX_SECONDS", "5"))
+    # GetQueryResults calls per second across all pollers (account quota is 5)
+    QUERY_POLL_RATE_PER_SECOND: float = float(os.getenv("QUERY_POLL_RATE_PER_SECOND", "4"))
+    
+    # Logs Insights concurrency (account quota is 30 concurrent queries per region)
+    MAX_CONCURRENT_QUERIES: int = int(os.getenv("MAX_CONCURRENT_QUERIES", "10"))
+    JOIN_QUERY_TIMEOUT_SECONDS: int = int(os.getenv("JOIN_QUERY_TIMEOUT_SECONDS", "60"))
+    # Joins producing more rows (one per matched combination) are rejected instead of built
+    MAX_JOIN_ROWS: int = int(os.getenv("MAX_JOIN_ROWS", "100000"))
+    
+    # Query result cache; closed windows are kept until evicted, the open tail expires.
+    # A query is only split into buckets when it repeats within QUERY_CACHE_REPEAT_SECONDS
+    QUERY_CACHE_ENABLED: bool = os.getenv("QUERY_CACHE_ENABLED", "False").lower() == "true"
+    QUERY_CACHE_REPEAT_SECONDS: int = int(os.getenv("QUERY_CACHE_REPEAT_SECONDS", "3600"))
+    QUERY_CACHE_BUCKET_SECONDS: int = int(os.getenv("QUERY_CACHE_BUCKET_SECONDS", "3600"))
+    QUERY_CACHE_TTL_SECONDS: int = int(os.getenv("QUERY_CACHE_TTL_SECONDS", "60"))
+    QUERY_CACHE_SETTLE_SECONDS: int = int(os.getenv("QUERY_CACHE_SETTLE_SECONDS", "300"))
+    QUERY_CACHE_MAX_BYTES: int = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    REDIS_URL: str = os.getenv("REDIS_URL", "")
+    
+    # In-memory log group/stream catalog; stale entries are served while a background refresh runs
+    CATALOG_TTL_SECONDS: int = int(os.getenv("CATALOG_TTL_SECONDS", "300"))
+    CATALOG_FULL_REFRESH_SECONDS: int = int(os.getenv("CATALOG_FULL_REFRESH_SECONDS", "3600"))
+    CATALOG_MAX_LOG_GROUPS: int = int(os.getenv("CATALOG_MAX_LOG_GROUPS", "100"))
+    
+    # Local Parquet mirror of selected log groups, answered without calling CloudWatch
+    LOG_MIRROR_ENABLED: bool = os.getenv("LOG_MIRROR_ENABLED", "False").lower() == "true"
+    LOG_MIRROR_DIR: str = os.getenv("LOG_MIRROR_DIR", "./log-mirror")
+    LOG_MIRROR_LOG_GROUPS: str = os.getenv("LOG_MIRROR_LOG_GROUPS", "")  # comma-separated
+    LOG_MIRROR_SYNC_INTERVAL_SECONDS: int = int(os.getenv("LOG_MIRROR_SYNC_INTERVAL_SECONDS", "60"))
+    LOG_MIRROR_LAG_SECONDS: int = int(os.getenv("LOG_MIRROR_LAG_SECONDS", "120"))
+    LOG_MIRROR_BACKFILL_HOURS: int = int(os.getenv("LOG_MIRROR_BACKFILL_HOURS", "24"))
+    LOG_MIRROR_BATCH_SIZE: int = int(os.getenv("LOG_MIRROR_BATCH_SIZE", "50000"))
+    LOG_MIRROR_ROW_GROUP_SIZE: int = int(os.getenv("LOG_MIRROR_ROW_GROUP_SIZE", "10000"))
+    
+    # Span latency percentiles, folded from span logs into per-bucket sketches
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "False").lower() == "true"
+    METRICS_LOG_FILES: str = os.getenv("METRICS_LOG_FILES", "")  # comma-separated JSON log files, e.g. ecommerce.log
+    METRICS_RESOLUTION_SECONDS: int = int(os.getenv("METRICS_RESOLUTION_SECONDS", "60"))
+    METRICS_RETENTION_HOURS: int = int(os.getenv("METRICS_RETENTION_HOURS", "168"))
+    METRICS_INGEST_INTERVAL_SECONDS: int = int(os.getenv("METRICS_INGEST_INTERVAL_SECONDS", "30"))
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,35 +1,70 @@
+import orjson
 from fastapi import APIRouter, HTTPException, Query as QueryParam, Body
+from fastapi.responses import Response
 from typing import List, Optional
 from datetime import datetime
 
 from schemas import JoinLogsRequest, JoinedLogResults
 from logs_service import join_logs_query
+from join_engine import parse_join_fields, to_arrow_ipc
+from query_cache import cached_query_logs
 
 router = APIRouter()
 
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+def arrow_response(results, join_field, services, failures):
+    """
+    Arrow IPC stream of the joined rows; partial-result details travel as schema metadata
+    """
+    try:
+        content = to_arrow_ipc(
+            results,
+            keys=parse_join_fields(join_field),
+            services=services,
+            metadata={
+                "partial": str(bool(failures)).lower(),
+                "failed_services": orjson.dumps([f.model_dump() for f in failures]).decode()
+            }
+        )
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Arrow output requires pyarrow to be installed")
+    return Response(content=content, media_type=ARROW_STREAM_MEDIA_TYPE)
+
 @router.post("/join-query", response_model=JoinedLogResults)
 async def join_logs_data(request: JoinLogsRequest = Body(...)):
     """
     Run the same query against multiple log groups and join the results by a common field.
     """
     try:
-        results, start_time, end_time = await join_logs_query(
+        results, start_time, end_time, failures = await join_logs_query(
             services=request.services,
             log_groups=request.log_groups,
             query_string=request.query_string,
             join_field=request.join_field,
             start_time=request.start_time,
-            end_time=request.end_time
+            end_time=request.end_time,
+            query_fn=cached_query_logs,
+            join_type=request.join_type,
+            time_window_seconds=request.time_window_seconds,
+            timestamp_field=request.timestamp_field
         )
         
+        if request.output_format == "arrow":
+            return arrow_response(results, request.join_field, request.services, failures)
+        
         return JoinedLogResults(
             start_time=start_time,
             end_time=end_time,
             services=request.services,
             join_field=request.join_field,
             results=results,
-            count=len(results)
+            count=len(results),
+            partial=bool(failures),
+            failed_services=failures
         )
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -42,7 +77,11 @@ async def join_logs_data_get(
     query_string: str = QueryParam(..., description="CloudWatch Logs Insights query to run against each log group"),
     join_field: str = QueryParam(..., description="Field to use for joining results across services"),
     start_time: Optional[datetime] = QueryParam(None, description="Start time for query (ISO format)"),
-    end_time: Optional[datetime] = QueryParam(None, description="End time for query (ISO format)")
+    end_time: Optional[datetime] = QueryParam(None, description="End time for query (ISO format)"),
+    join_type: str = QueryParam("full", description="inner, left or full", pattern="^(inner|left|full)$"),
+    time_window_seconds: Optional[float] = QueryParam(None, description="Only match rows within this many seconds of the first service's row", ge=0),
+    timestamp_field: str = QueryParam("@timestamp", description="Field holding the row timestamp for time-window joins"),
+    output_format: str = QueryParam("json", description="json or arrow", pattern="^(json|arrow)$")
 ):
     """
     Run the same query against multiple log groups and join the results by a common field using GET.
@@ -54,23 +93,34 @@ async def join_logs_data_get(
                 detail="Number of services must match number of log groups"
             )
         
-        results, start_time, end_time = await join_logs_query(
+        results, start_time, end_time, failures = await join_logs_query(
             services=services,
             log_groups=log_groups,
             query_string=query_string,
             join_field=join_field,
             start_time=start_time,
-            end_time=end_time
+            end_time=end_time,
+            query_fn=cached_query_logs,
+            join_type=join_type,
+            time_window_seconds=time_window_seconds,
+            timestamp_field=timestamp_field
         )
         
+        if output_format == "arrow":
+            return arrow_response(results, join_field, services, failures)
+        
         return JoinedLogResults(
             start_time=start_time,
             end_time=end_time,
             services=services,
             join_field=join_field,
             results=results,
-            count=len(results)
+            count=len(results),
+            partial=bool(failures),
+            failed_services=failures
         )
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
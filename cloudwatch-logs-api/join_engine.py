@@ -0,0 +1,207 @@
+import io
+import bisect
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+JOIN_TYPES = ("inner", "left", "full")
+
+Row = Dict[str, Any]
+Key = Tuple[Any, ...]
+
+def parse_join_fields(join_field: str) -> List[str]:
+    """
+    'requestId' -> ['requestId']; 'requestId, userId' -> ['requestId', 'userId']
+    """
+    return [field.strip() for field in join_field.split(",") if field.strip()]
+
+def parse_timestamp(value: Any) -> Optional[float]:
+    """
+    Seconds since the epoch from an Insights timestamp ('2024-03-01 12:00:00.000'),
+    an ISO string or epoch seconds/milliseconds
+    """
+    if value is None:
+        return None
+    try:
+        number = float(value)
+        return number / 1000 if number > 1e11 else number
+    except (TypeError, ValueError):
+        pass
+    try:
+        parsed = datetime.fromisoformat(str(value).strip().replace(" ", "T", 1).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    # Insights timestamps are UTC without an offset
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def join_key(row: Row, keys: Sequence[str]) -> Optional[Key]:
+    values = tuple(row.get(key) for key in keys)
+    return None if any(value is None for value in values) else values
+
+class BuildIndex:
+    """
+    Hash table over one service's rows. With a time window, the rows of each key
+    are kept sorted by timestamp so matches are found with a range lookup.
+    """
+
+    def __init__(self, rows: List[Row], keys: Sequence[str], window: Optional[float], timestamp_field: str):
+        self.window = window
+        self.buckets: Dict[Key, list] = {}
+
+        for position, row in enumerate(rows):
+            key = join_key(row, keys)
+            if window is None:
+                self.buckets.setdefault(key, []).append((position, row))
+                continue
+            timestamp = parse_timestamp(row.get(timestamp_field))
+            if timestamp is not None:
+                self.buckets.setdefault(key, []).append((timestamp, position, row))
+
+        if window is not None:
+            for entries in self.buckets.values():
+                entries.sort(key=lambda entry: (entry[0], entry[1]))
+            self.timestamps = {key: [entry[0] for entry in entries] for key, entries in self.buckets.items()}
+
+    def probe(self, key: Key, timestamp: Optional[float]) -> List[Tuple[int, Row]]:
+        entries = self.buckets.get(key)
+        if not entries:
+            return []
+        if self.window is None:
+            return entries
+        if timestamp is None:
+            return []
+        timestamps = self.timestamps[key]
+        low = bisect.bisect_left(timestamps, timestamp - self.window)
+        high = bisect.bisect_right(timestamps, timestamp + self.window)
+        return [(position, row) for _, position, row in entries[low:high]]
+
+def format_key(key: Optional[Key], keys: Sequence[str]) -> str:
+    return ", ".join(f"{field}={value!r}" for field, value in zip(keys, key or ()))
+
+def join_tables(
+    tables: List[Tuple[str, List[Row]]],
+    keys: Sequence[str],
+    how: str = "full",
+    window: Optional[float] = None,
+    timestamp_field: str = "@timestamp",
+    max_rows: Optional[int] = None
+) -> Iterator[Row]:
+    """
+    Left-deep hash join of in-memory tables. Every output row holds one row per
+    matched service, so one-to-many matches produce one output row per combination.
+    With a window, rows also have to be within ±window seconds of the first
+    service's row of the combination. Raises ValueError naming the join key once
+    more than max_rows combinations are generated.
+    """
+    if not tables:
+        return
+
+    def anchor_timestamp(row: Row) -> Optional[float]:
+        return parse_timestamp(row.get(timestamp_field)) if window is not None else None
+
+    def check_size(combos: list, key: Optional[Key], service: str) -> None:
+        if max_rows is not None and len(combos) > max_rows:
+            raise ValueError(
+                f"Join on {', '.join(keys)} exceeds {max_rows} rows at {service} "
+                f"(key {format_key(key, keys)}); narrow the query or the time range"
+            )
+
+    first_service, first_rows = tables[0]
+    # (key, anchor timestamp, {service: row})
+    combos = [
+        (join_key(row, keys), anchor_timestamp(row), {first_service: row})
+        for row in first_rows
+    ]
+
+    for service, rows in tables[1:]:
+        index = BuildIndex(rows, keys, window, timestamp_field)
+        matched = set()
+        next_combos = []
+
+        for key, timestamp, services in combos:
+            matches = index.probe(key, timestamp)
+            for position, row in matches:
+                matched.add(position)
+                next_combos.append((key, timestamp, {**services, service: row}))
+            if not matches and how != "inner":
+                next_combos.append((key, timestamp, services))
+            check_size(next_combos, key, service)
+
+        if how == "full":
+            for position, row in enumerate(rows):
+                if position not in matched:
+                    next_combos.append((join_key(row, keys), anchor_timestamp(row), {service: row}))
+                    check_size(next_combos, next_combos[-1][0], service)
+
+        combos = next_combos
+
+    for key, _, services in combos:
+        yield {
+            "join_value": key[0] if len(keys) == 1 else dict(zip(keys, key)),
+            "services": services
+        }
+
+def hash_join(
+    inputs: Sequence[Tuple[str, Iterable[Row]]],
+    keys: Sequence[str],
+    how: str = "full",
+    window: Optional[float] = None,
+    timestamp_field: str = "@timestamp",
+    max_rows: Optional[int] = None
+) -> Iterator[Row]:
+    """
+    Join the rows of several services on `keys`. Rows missing a join field cannot
+    match anything and are skipped. Every input is one service's query results,
+    capped at MAX_LOGS_RESULTS rows, and the output at max_rows, so the join runs
+    in memory.
+    """
+    if how not in JOIN_TYPES:
+        raise ValueError(f"Unsupported join type: {how}")
+    if not keys:
+        raise ValueError("At least one join field is required")
+
+    tables = [
+        (service, [row for row in rows if join_key(row, keys) is not None])
+        for service, rows in inputs
+    ]
+    yield from join_tables(tables, keys, how, window, timestamp_field, max_rows)
+
+def to_arrow_ipc(results: List[Row], keys: Sequence[str], services: Sequence[str], metadata: Optional[Dict[str, str]] = None) -> bytes:
+    """
+    Flatten joined rows into an Arrow IPC stream: one column per join field, then
+    one `service.field` column per field seen in that service's rows
+    """
+    import pyarrow as pa
+
+    columns: Dict[str, list] = {key: [] for key in keys}
+    service_fields = {service: [] for service in services}
+    for row in results:
+        for service, service_row in row["services"].items():
+            fields = service_fields.setdefault(service, [])
+            for field in service_row:
+                if field not in fields:
+                    fields.append(field)
+
+    for service, fields in service_fields.items():
+        for field in fields:
+            columns[f"{service}.{field}"] = []
+
+    for row in results:
+        join_value = row["join_value"] if len(keys) > 1 else {keys[0]: row["join_value"]}
+        for key in keys:
+            columns[key].append(join_value.get(key))
+        for service, fields in service_fields.items():
+            service_row = row["services"].get(service) or {}
+            for field in fields:
+                value = service_row.get(field)
+                columns[f"{service}.{field}"].append(None if value is None else str(value))
+
+    table = pa.Table.from_pydict(
+        {name: pa.array(values, type=pa.string()) for name, values in columns.items()},
+        metadata=metadata
+    )
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
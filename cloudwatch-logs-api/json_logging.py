@@ -0,0 +1,111 @@
+"""
+Structured JSON logging shared by cli.py and the observability services.
+
+FastJsonFormatter writes one JSON object per record: timestamp, level and
+message, then any static fields, then the `extra` fields passed to the log
+call. setup_queue_logging moves formatting and handler I/O to a listener
+thread, so the logging call itself only enqueues the record.
+"""
+import copy
+import json
+import queue
+import atexit
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+# Attributes every LogRecord has; anything else on the record came from `extra`
+RESERVED_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+def _dumps_json(value) -> str:
+    return json.dumps(value, default=str)
+
+def _dumps_orjson(value) -> str:
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+
+dumps = _dumps_orjson if orjson else _dumps_json
+
+class TimestampCache:
+    """
+    ISO-8601 UTC timestamps with millisecond precision. Records logged within
+    the same millisecond reuse the string formatted for the first one.
+    """
+
+    def __init__(self):
+        self.last_millis = None
+        self.last_value = None
+
+    def format(self, created: float) -> str:
+        millis = int(created * 1000)
+        if millis != self.last_millis:
+            self.last_value = datetime.fromtimestamp(millis / 1000, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
+            self.last_millis = millis
+        return self.last_value
+
+class FastJsonFormatter(logging.Formatter):
+    def __init__(self, static_fields=None, timestamp_field="timestamp", level_field="level"):
+        super().__init__()
+        self.static_fields = dict(static_fields or {})
+        self.timestamp_field = timestamp_field
+        self.level_field = level_field
+        self.timestamps = TimestampCache()
+
+    def format(self, record):
+        log_record = {
+            self.timestamp_field: self.timestamps.format(record.created),
+            self.level_field: record.levelname,
+            "message": record.getMessage(),
+        }
+        log_record.update(self.static_fields)
+
+        # Add extra fields from the record
+        for key, value in record.__dict__.items():
+            if key not in RESERVED_ATTRS and key[0] != "_":
+                log_record[key] = value
+
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            log_record["exc_info"] = record.exc_text
+
+        return dumps(log_record)
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Enqueue records with their message resolved (args may be mutated after the
+    call returns) but leave exception and JSON formatting to the listener.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+def setup_queue_logging(logger: logging.Logger, handlers) -> QueueListener:
+    """
+    Replace the logger's handlers with a queue handler. The given handlers run on a
+    QueueListener thread, which is stopped (and drained) at interpreter exit.
+    """
+    log_queue = queue.SimpleQueue()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(DeferredQueueHandler(log_queue))
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_queue_logging, listener)
+    return listener
+
+def stop_queue_logging(listener: QueueListener) -> None:
+    """
+    Drain the queue and stop the listener thread. Safe to call more than once.
+    """
+    if listener._thread is not None:
+        listener.stop()
@@ -0,0 +1,302 @@
+import os
+import glob
+import math
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import orjson
+
+from config import settings
+from join_engine import parse_timestamp
+from log_mirror import COMPACTED_FILE, compacted_parts, log_mirror, mirrored_log_groups
+
+logger = logging.getLogger(__name__)
+
+GROUP_BY_FIELDS = ("service", "span", "status")
+PERCENTILES = (50, 95, 99)
+
+SeriesKey = Tuple[str, str, str]
+
+class LatencySketch:
+    """
+    Quantile sketch with relative error guarantees (DDSketch). Each value is
+    counted in the logarithmic bucket ceil(log_gamma(value)), so any quantile is
+    returned within `relative_accuracy` of the true value, memory grows with the
+    log of the value range rather than with the count, and two sketches merge
+    by adding their bucket counts.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float) -> None:
+        key = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "LatencySketch") -> None:
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                # Midpoint of the bucket (gamma^(k-1), gamma^k] in relative terms
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+def span_fields(record: Dict[str, Any], default_service: str) -> Optional[Tuple[SeriesKey, float]]:
+    """
+    Series key and duration of a span log record, or None for records without a
+    span name or a positive duration_ms (including the "0.00" placeholders
+    logged when a span starts)
+    """
+    if not record.get("span"):
+        return None
+    try:
+        duration_ms = float(record.get("duration_ms"))
+    except (TypeError, ValueError):
+        return None
+    if not duration_ms > 0 or math.isinf(duration_ms):
+        return None
+
+    status = record.get("status") or record.get("status_code")
+    if status is None:
+        level = record.get("level") or record.get("severity")
+        status = "error" if record.get("error") or level in ("ERROR", "CRITICAL") else "success"
+
+    key = (
+        str(record.get("service") or default_service),
+        str(record["span"]),
+        str(status)
+    )
+    return key, duration_ms
+
+class LatencyMetrics:
+    """
+    Latency sketches per (service, span, status) and time bucket of
+    METRICS_RESOLUTION_SECONDS. Span logs are folded in once, as they arrive;
+    a percentile query merges the buckets of its window instead of reading logs.
+    """
+
+    def __init__(self, resolution_seconds: int, relative_accuracy: float = 0.01):
+        self.resolution_seconds = resolution_seconds
+        self.relative_accuracy = relative_accuracy
+        self.series: Dict[SeriesKey, Dict[int, LatencySketch]] = {}
+        self.lock = threading.Lock()
+        # Ingestion progress: byte offset per log file, Parquet files already read per mirror
+        self.file_offsets: Dict[str, Tuple[int, int]] = {}
+        self.mirror_files: Dict[str, set] = {}
+
+    def add(self, key: SeriesKey, timestamp: float, duration_ms: float) -> None:
+        bucket = int(timestamp // self.resolution_seconds * self.resolution_seconds)
+        buckets = self.series.setdefault(key, {})
+        sketch = buckets.get(bucket)
+        if sketch is None:
+            sketch = buckets[bucket] = LatencySketch(self.relative_accuracy)
+        sketch.add(duration_ms)
+
+    def add_records(self, records: Iterable[Tuple[float, Dict[str, Any]]], default_service: str) -> int:
+        """
+        Fold (timestamp, record) pairs in; returns the number of spans recorded.
+        A span is bucketed by its span_end when the record has one: span logs are
+        written in batches, so the record timestamp can be well after the span.
+        """
+        spans = []
+        for timestamp, record in records:
+            fields = span_fields(record, default_service)
+            span_end = parse_timestamp(record.get("span_end")) if fields is not None else None
+            if span_end is not None:
+                timestamp = span_end
+            if fields is not None and timestamp is not None:
+                spans.append((fields[0], timestamp, fields[1]))
+
+        with self.lock:
+            for key, timestamp, duration_ms in spans:
+                self.add(key, timestamp, duration_ms)
+        return len(spans)
+
+    def ingest_file(self, path: str, default_service: str) -> int:
+        """
+        Read the JSON lines appended to a log file since the last call. A file
+        that shrank or was replaced (rotation) is read again from the start.
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return 0
+        inode, offset = self.file_offsets.get(path, (stat.st_ino, 0))
+        if inode != stat.st_ino or stat.st_size < offset:
+            offset = 0
+
+        with open(path, "rb") as handle:
+            handle.seek(offset)
+            data = handle.read()
+        # Leave a partially written last line for the next call
+        end = data.rfind(b"\n") + 1
+        self.file_offsets[path] = (stat.st_ino, offset + end)
+
+        def records():
+            for line in data[:end].splitlines():
+                if b"duration_ms" not in line:
+                    continue
+                try:
+                    record = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue
+                if isinstance(record, dict):
+                    yield parse_timestamp(record.get("timestamp")), record
+
+        return self.add_records(records(), default_service)
+
+    def ingest_mirror(self, log_group_name: str) -> int:
+        """
+        Read the mirror's Parquet files not seen before. Committed files never
+        change, so each one is read once. A compacted file replaces parts that may
+        already have been read; only the rows of its unseen parts are added.
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        seen = self.mirror_files.setdefault(log_group_name, set())
+        paths = sorted(set(glob.glob(os.path.join(log_mirror.group_dir(log_group_name), "hour=*", "*.parquet"))) - seen)
+
+        added = 0
+        for path in paths:
+            # A compacted file sorts before the parts it replaced and marks them seen
+            if path in seen:
+                continue
+            try:
+                table = pq.read_table(path, columns=["timestamp", "message"])
+            except FileNotFoundError:
+                # Merged into the hour's compacted file since the listing; read that next time
+                continue
+            if os.path.basename(path) == COMPACTED_FILE:
+                directory = os.path.dirname(path)
+                offset = 0
+                unseen = []
+                for name, rows in compacted_parts(path):
+                    part = os.path.join(directory, name)
+                    if part not in seen:
+                        unseen.append(table.slice(offset, rows))
+                    seen.add(part)
+                    offset += rows
+                table = pa.concat_tables(unseen) if unseen else table.slice(0, 0)
+            table = table.filter(pc.match_substring(table["message"], "duration_ms"))
+
+            def records():
+                for timestamp, message in zip(table["timestamp"].to_pylist(), table["message"].to_pylist()):
+                    try:
+                        record = orjson.loads(message)
+                    except orjson.JSONDecodeError:
+                        continue
+                    if isinstance(record, dict):
+                        yield timestamp / 1000, record
+
+            added += self.add_records(records(), log_group_name)
+            seen.add(path)
+        return added
+
+    def prune(self, before: float) -> None:
+        with self.lock:
+            for key in list(self.series):
+                buckets = self.series[key]
+                for bucket in [bucket for bucket in buckets if bucket < before]:
+                    del buckets[bucket]
+                if not buckets:
+                    del self.series[key]
+
+    def percentiles(
+        self,
+        start: float,
+        end: float,
+        service: Optional[str] = None,
+        span: Optional[str] = None,
+        status: Optional[str] = None,
+        group_by: Sequence[str] = GROUP_BY_FIELDS
+    ) -> List[Dict[str, Any]]:
+        """
+        Merge the buckets overlapping [start, end] per group and read p50/p95/p99 off them
+        """
+        first_bucket = start // self.resolution_seconds * self.resolution_seconds
+        filters = dict(zip(GROUP_BY_FIELDS, (service, span, status)))
+        groups: Dict[Tuple[str, ...], LatencySketch] = {}
+
+        with self.lock:
+            for key, buckets in self.series.items():
+                fields = dict(zip(GROUP_BY_FIELDS, key))
+                if any(value is not None and fields[name] != value for name, value in filters.items()):
+                    continue
+                group = tuple(fields[name] for name in group_by)
+                for bucket, sketch in buckets.items():
+                    if first_bucket <= bucket <= end:
+                        merged = groups.get(group)
+                        if merged is None:
+                            merged = groups[group] = LatencySketch(self.relative_accuracy)
+                        merged.merge(sketch)
+
+        results = []
+        for group, sketch in sorted(groups.items()):
+            row = dict(zip(group_by, group))
+            row.update({
+                "count": sketch.count,
+                "min_ms": sketch.min,
+                "max_ms": sketch.max,
+                **{f"p{pct}_ms": sketch.quantile(pct / 100) for pct in PERCENTILES}
+            })
+            results.append(row)
+        return results
+
+    def ingest_all(self) -> int:
+        """
+        One pass over the configured log files and the mirrored log groups
+        """
+        added = 0
+        for path in metrics_log_files():
+            added += self.ingest_file(path, os.path.splitext(os.path.basename(path))[0])
+        if settings.LOG_MIRROR_ENABLED:
+            for log_group_name in mirrored_log_groups():
+                added += self.ingest_mirror(log_group_name)
+        return added
+
+    async def run(self) -> None:
+        """
+        Background task: fold in new span logs, drop buckets past the retention, sleep
+        """
+        while True:
+            try:
+                added = await asyncio.to_thread(self.ingest_all)
+                if added:
+                    logger.info(f"Recorded {added} span latencies")
+                await asyncio.to_thread(self.prune, time.time() - settings.METRICS_RETENTION_HOURS * 3600)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error ingesting span latencies: {str(e)}")
+            await asyncio.sleep(settings.METRICS_INGEST_INTERVAL_SECONDS)
+
+def metrics_log_files() -> List[str]:
+    return [path.strip() for path in settings.METRICS_LOG_FILES.split(",") if path.strip()]
+
+latency_metrics = LatencyMetrics(settings.METRICS_RESOLUTION_SECONDS)
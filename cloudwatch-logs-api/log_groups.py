@@ -1,21 +1,29 @@
 from fastapi import APIRouter, HTTPException, Query
-from typing import Optional, List
+from typing import Optional
 
-from schemas import LogGroup, LogGroupList
-from logs_service import get_log_groups
+from schemas import LogGroupList
+from catalog import log_catalog
 
 router = APIRouter()
 
-@router.get("/log-groups", response_model=List[LogGroup])
+@router.get("/log-groups", response_model=LogGroupList)
 async def list_log_groups(
     prefix: Optional[str] = Query(None, description="Log group name prefix filter"),
-    limit: int = Query(50, description="Maximum number of log groups to return", gt=0, le=100)
+    limit: int = Query(50, description="Maximum number of log groups to return", gt=0, le=1000),
+    next_token: Optional[str] = Query(None, description="Token from the previous page"),
+    refresh: bool = Query(False, description="Reload the catalog from CloudWatch before answering")
 ):
     """
-    Get all CloudWatch log groups, optionally filtered by prefix.
+    Get CloudWatch log groups in name order, optionally filtered by prefix.
+    Served from the in-memory catalog, which is refreshed in the background.
     """
     try:
-        log_groups = await get_log_groups(prefix=prefix, limit=limit)
-        return log_groups
+        log_groups, token = await log_catalog.list_log_groups(
+            prefix=prefix,
+            limit=limit,
+            next_token=next_token,
+            refresh=refresh
+        )
+        return LogGroupList(log_groups=log_groups, next_token=token)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching log groups: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error fetching log groups: {str(e)}")
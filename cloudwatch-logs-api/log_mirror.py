@@ -0,0 +1,341 @@
+import os
+import re
+import glob
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import orjson
+
+from config import settings
+from logs_service import iter_log_events
+
+logger = logging.getLogger(__name__)
+
+HOUR_MS = 3600 * 1000
+
+# Single file an hour partition is merged into once the hour is closed
+COMPACTED_FILE = "compacted.parquet"
+
+LEVEL_PATTERN = re.compile(r"\b(DEBUG|INFO|WARN(?:ING)?|ERROR|CRITICAL|FATAL)\b")
+CORRELATION_PATTERN = re.compile(r"correlation[_-]?id[\"']?\s*[=:]\s*[\"']?([\w.:-]+)", re.IGNORECASE)
+
+CORRELATION_KEYS = ("correlation_id", "correlationId", "request_id", "requestId")
+LEVEL_KEYS = ("level", "severity", "levelname")
+
+def extract_fields(message: str) -> Dict[str, Optional[str]]:
+    """
+    Pull correlation_id and level out of a JSON log line, or out of plain text
+    """
+    correlation_id = None
+    level = None
+
+    if message.startswith("{"):
+        try:
+            record = orjson.loads(message)
+            correlation_id = next((str(record[k]) for k in CORRELATION_KEYS if record.get(k)), None)
+            level = next((str(record[k]) for k in LEVEL_KEYS if record.get(k)), None)
+        except (orjson.JSONDecodeError, AttributeError):
+            pass
+
+    if correlation_id is None:
+        match = CORRELATION_PATTERN.search(message)
+        correlation_id = match.group(1) if match else None
+    if level is None:
+        match = LEVEL_PATTERN.search(message)
+        level = match.group(1) if match else None
+
+    return {
+        "correlation_id": correlation_id,
+        "level": level.upper() if level else None
+    }
+
+def matches_fields(message: str, correlation_id: Optional[str] = None, level: Optional[str] = None) -> bool:
+    """
+    Whether the correlation_id and level extracted from a message equal the requested
+    values; the mirror and the CloudWatch path both filter with these semantics
+    """
+    fields = extract_fields(message)
+    if correlation_id and fields["correlation_id"] != correlation_id:
+        return False
+    if level and fields["level"] != level.upper():
+        return False
+    return True
+
+def mirror_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("timestamp", pa.int64()),
+        ("ingestion_time", pa.int64()),
+        ("log_stream_name", pa.string()),
+        ("message", pa.string()),
+        ("correlation_id", pa.string()),
+        ("level", pa.string()),
+    ])
+
+class LogMirror:
+    """
+    Incremental local copy of CloudWatch log groups. Events are stored as Parquet
+    files partitioned by log group and hour, sorted by timestamp, and a checkpoint
+    per group records the contiguous range [synced_from, synced_until) that is
+    complete locally. Every sync adds a file per hour it touches; once an hour is
+    closed its files are merged into a single compacted.parquet.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.locks: Dict[str, asyncio.Lock] = {}
+
+    def group_dir(self, log_group_name: str) -> str:
+        return os.path.join(self.directory, quote(log_group_name, safe=""))
+
+    def hour_dir(self, log_group_name: str, hour_start_ms: int) -> str:
+        hour = datetime.fromtimestamp(hour_start_ms / 1000, timezone.utc).strftime("%Y%m%d%H")
+        return os.path.join(self.group_dir(log_group_name), f"hour={hour}")
+
+    def read_checkpoint(self, log_group_name: str) -> Optional[Dict[str, int]]:
+        try:
+            with open(os.path.join(self.group_dir(log_group_name), "_checkpoint.json"), "rb") as handle:
+                return orjson.loads(handle.read())
+        except FileNotFoundError:
+            return None
+
+    def write_checkpoint(self, log_group_name: str, checkpoint: Dict[str, int]) -> None:
+        path = os.path.join(self.group_dir(log_group_name), "_checkpoint.json")
+        # Write-then-rename so a crash never leaves a checkpoint ahead of the data
+        with open(path + ".tmp", "wb") as handle:
+            handle.write(orjson.dumps(checkpoint))
+        os.replace(path + ".tmp", path)
+
+    def covers(self, log_group_name: str, start_ms: int, end_ms: int) -> bool:
+        checkpoint = self.read_checkpoint(log_group_name)
+        return bool(checkpoint) and checkpoint["synced_from"] <= start_ms and end_ms < checkpoint["synced_until"]
+
+    def write_events(self, log_group_name: str, events: List[Dict[str, Any]]) -> List[str]:
+        """
+        Stage a batch of events as one Parquet file per hour they fall into.
+        Staged files are invisible to queries until commit_files renames them.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        staged = []
+        by_hour: Dict[int, List[Dict[str, Any]]] = {}
+        for event in events:
+            by_hour.setdefault(event["timestamp"] // HOUR_MS * HOUR_MS, []).append(event)
+
+        for hour_start, hour_events in by_hour.items():
+            hour_events.sort(key=lambda e: e["timestamp"])
+            table = pa.Table.from_pylist(hour_events, schema=mirror_schema())
+            directory = self.hour_dir(log_group_name, hour_start)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"part-{hour_events[0]['timestamp']}-{time.time_ns()}.parquet")
+            pq.write_table(table, path + ".pending", row_group_size=settings.LOG_MIRROR_ROW_GROUP_SIZE)
+            staged.append(path)
+
+        return staged
+
+    def commit_files(self, log_group_name: str, staged: List[str], checkpoint: Dict[str, int]) -> None:
+        for path in staged:
+            os.replace(path + ".pending", path)
+        self.write_checkpoint(log_group_name, checkpoint)
+
+    def hour_files(self, directory: str) -> List[str]:
+        """
+        Parquet files of one hour partition. A compacted hour is read from its compacted
+        file alone, so parts left behind by an interrupted compaction are never read twice.
+        """
+        if not os.path.isdir(directory):
+            return []
+        names = sorted(name for name in os.listdir(directory) if name.endswith(".parquet"))
+        if COMPACTED_FILE in names:
+            names = [COMPACTED_FILE]
+        return [os.path.join(directory, name) for name in names]
+
+    def compact_closed_hours(self, log_group_name: str, synced_until_ms: int) -> int:
+        """
+        Merge the part files of every hour that ends at or before synced_until_ms into
+        one file. Closed hours never receive new parts. The parts are concatenated in
+        name (first timestamp) order, and the schema metadata lists each source part
+        with its row count, so readers that already consumed some parts can skip their
+        rows. Returns the number of hours compacted.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        compacted = 0
+        for directory in sorted(glob.glob(os.path.join(self.group_dir(log_group_name), "hour=*"))):
+            hour_start = int(datetime.strptime(os.path.basename(directory)[len("hour="):], "%Y%m%d%H")
+                             .replace(tzinfo=timezone.utc).timestamp() * 1000)
+            if hour_start + HOUR_MS > synced_until_ms:
+                continue
+
+            target = os.path.join(directory, COMPACTED_FILE)
+            parts = sorted(glob.glob(os.path.join(directory, "part-*.parquet")))
+            if not parts:
+                continue
+            if not os.path.exists(target):
+                tables = [pq.read_table(path, schema=mirror_schema()) for path in parts]
+                sources = [[os.path.basename(path), len(table)] for path, table in zip(parts, tables)]
+                table = pa.concat_tables(tables).replace_schema_metadata({"parts": orjson.dumps(sources)})
+                pq.write_table(table, target + ".pending", row_group_size=settings.LOG_MIRROR_ROW_GROUP_SIZE)
+                os.replace(target + ".pending", target)
+                compacted += 1
+            # Readers switch to the compacted file as soon as it exists
+            for path in parts:
+                os.remove(path)
+
+        return compacted
+
+    def discard_pending(self, log_group_name: str) -> None:
+        """
+        Remove files staged by a sync that never committed, so they are fetched again
+        """
+        for path in glob.glob(os.path.join(self.group_dir(log_group_name), "hour=*", "*.pending")):
+            os.remove(path)
+
+    async def sync_log_group(self, log_group_name: str) -> int:
+        """
+        Fetch everything between the checkpoint and now minus the ingestion lag.
+        Returns the number of events mirrored.
+        """
+        lock = self.locks.setdefault(log_group_name, asyncio.Lock())
+        async with lock:
+            os.makedirs(self.group_dir(log_group_name), exist_ok=True)
+            self.discard_pending(log_group_name)
+            checkpoint = self.read_checkpoint(log_group_name)
+
+            now_ms = int(time.time() * 1000)
+            until_ms = now_ms - settings.LOG_MIRROR_LAG_SECONDS * 1000
+            if checkpoint:
+                from_ms = checkpoint["synced_until"]
+            else:
+                from_ms = now_ms - settings.LOG_MIRROR_BACKFILL_HOURS * HOUR_MS
+                checkpoint = {"synced_from": from_ms, "synced_until": from_ms}
+
+            if until_ms <= from_ms:
+                return 0
+
+            total = 0
+            # Commit hour by hour so a long backfill keeps its progress if interrupted
+            while from_ms < until_ms:
+                chunk_end_ms = min(until_ms, from_ms + HOUR_MS)
+                staged = []
+                batch = []
+                # filter_log_events treats endTime as inclusive, the checkpoint end as exclusive
+                async for event in iter_log_events(
+                    log_group_name=log_group_name,
+                    start_time=datetime.fromtimestamp(from_ms / 1000),
+                    end_time=datetime.fromtimestamp((chunk_end_ms - 1) / 1000)
+                ):
+                    event.update(extract_fields(event["message"]))
+                    batch.append(event)
+                    total += 1
+                    if len(batch) >= settings.LOG_MIRROR_BATCH_SIZE:
+                        staged += await asyncio.to_thread(self.write_events, log_group_name, batch)
+                        batch = []
+
+                if batch:
+                    staged += await asyncio.to_thread(self.write_events, log_group_name, batch)
+
+                # Publish the data and advance the checkpoint only once the chunk is complete
+                checkpoint["synced_until"] = chunk_end_ms
+                self.commit_files(log_group_name, staged, checkpoint)
+                from_ms = chunk_end_ms
+
+            await asyncio.to_thread(self.compact_closed_hours, log_group_name, checkpoint["synced_until"])
+            logger.info(f"Mirrored {total} events from {log_group_name}")
+            return total
+
+    async def run(self, log_group_names: List[str]) -> None:
+        """
+        Background task: sync every configured group, then sleep for the sync interval
+        """
+        while True:
+            for log_group_name in log_group_names:
+                try:
+                    await self.sync_log_group(log_group_name)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error mirroring {log_group_name}: {str(e)}")
+            await asyncio.sleep(settings.LOG_MIRROR_SYNC_INTERVAL_SECONDS)
+
+    def query(
+        self,
+        log_group_name: str,
+        start_ms: int,
+        end_ms: int,
+        log_stream_name: Optional[str] = None,
+        correlation_id: Optional[str] = None,
+        level: Optional[str] = None,
+        contains: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Read mirrored events in [start_ms, end_ms]. Only the hour partitions in range
+        are opened, and the timestamp/stream/correlation_id/level predicates are
+        pushed down to the Parquet row groups.
+        """
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        expression = (ds.field("timestamp") >= start_ms) & (ds.field("timestamp") <= end_ms)
+        if log_stream_name:
+            expression &= ds.field("log_stream_name") == log_stream_name
+        if correlation_id:
+            expression &= ds.field("correlation_id") == correlation_id
+        if level:
+            expression &= ds.field("level") == level.upper()
+
+        def read():
+            paths = []
+            hour = start_ms // HOUR_MS * HOUR_MS
+            while hour <= end_ms:
+                paths.extend(self.hour_files(self.hour_dir(log_group_name, hour)))
+                hour += HOUR_MS
+            if not paths:
+                return None
+            return ds.dataset(paths, schema=mirror_schema(), format="parquet").to_table(filter=expression)
+
+        try:
+            table = read()
+        except FileNotFoundError:
+            # A compaction replaced the parts between listing and reading them
+            table = read()
+        if table is None:
+            return []
+        if contains:
+            table = table.filter(pc.match_substring(table["message"], contains))
+
+        table = table.sort_by("timestamp")
+        if limit is not None:
+            table = table.slice(0, limit)
+        return table.to_pylist()
+
+log_mirror = LogMirror(settings.LOG_MIRROR_DIR)
+
+def mirrored_log_groups() -> List[str]:
+    return [name.strip() for name in settings.LOG_MIRROR_LOG_GROUPS.split(",") if name.strip()]
+
+def compacted_parts(path: str) -> List[Tuple[str, int]]:
+    """
+    (part file name, row count) of the parts a compacted file was merged from, in row order
+    """
+    import pyarrow.parquet as pq
+
+    metadata = pq.read_schema(path).metadata or {}
+    return [(name, rows) for name, rows in orjson.loads(metadata.get(b"parts", b"[]"))]
+
+def mirror_range(start_time: Optional[datetime], end_time: Optional[datetime]):
+    """
+    Millisecond bounds of a request, with the same last-24-hours default as the CloudWatch path
+    """
+    if not end_time:
+        end_time = datetime.now()
+    if not start_time:
+        start_time = end_time - timedelta(hours=24)
+    return int(start_time.timestamp() * 1000), int(end_time.timestamp() * 1000)
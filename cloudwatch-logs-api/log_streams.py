@@ -1,26 +1,33 @@
 from fastapi import APIRouter, HTTPException, Path, Query
-from typing import Optional, List
+from typing import Optional
 
-from schemas import LogStream, LogStreamList
-from logs_service import get_log_streams
+from schemas import LogStreamList
+from catalog import log_catalog
 
 router = APIRouter()
 
-@router.get("/log-streams/{log_group_name}", response_model=List[LogStream])
+@router.get("/log-streams/{log_group_name}", response_model=LogStreamList)
 async def list_log_streams(
     log_group_name: str = Path(..., description="Log group name"),
     prefix: Optional[str] = Query(None, description="Log stream name prefix filter"),
-    limit: int = Query(50, description="Maximum number of log streams to return", gt=0, le=100)
+    limit: int = Query(50, description="Maximum number of log streams to return", gt=0, le=1000),
+    next_token: Optional[str] = Query(None, description="Token from the previous page"),
+    refresh: bool = Query(False, description="Reload the streams from CloudWatch before answering")
 ):
     """
-    Get log streams for a specific log group.
+    Get log streams for a specific log group, newest first, or in name order
+    when filtered by prefix. Served from the in-memory catalog.
     """
     try:
-        log_streams = await get_log_streams(
+        log_streams, token = await log_catalog.list_log_streams(
             log_group_name=log_group_name, 
             prefix=prefix, 
-            limit=limit
+            limit=limit,
+            next_token=next_token,
+            refresh=refresh
         )
-        return log_streams
+        return LogStreamList(log_streams=log_streams, next_token=token)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching log streams: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error fetching log streams: {str(e)}")
@@ -1,12 +1,76 @@
+import asyncio
+import logging
+import orjson
 from fastapi import APIRouter, HTTPException, Path, Query, Body
+from fastapi.responses import StreamingResponse
 from typing import Optional, List
 from datetime import datetime
 
 from schemas import LogEvent, LogEventList, LogsQueryRequest, LogQueryResult
-from logs_service import get_log_events, query_logs
+from logs_service import get_log_events, iter_log_events, iter_query_results
+from query_planner import query_logs_sliced
+from query_cache import cached_query_logs
+from config import settings
+from log_mirror import log_mirror, matches_fields, mirror_range
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+async def stream_ndjson(events):
+    """Serialize events one per line; errors after the first byte are reported in-band"""
+    try:
+        async for event in events:
+            yield orjson.dumps(event) + b"\n"
+    except Exception as e:
+        logger.error(f"Error streaming logs: {str(e)}")
+        yield orjson.dumps({"error": f"Error fetching logs: {str(e)}"}) + b"\n"
+
+async def filter_fields(events, correlation_id: Optional[str], level: Optional[str], limit: Optional[int]):
+    """Events whose extracted correlation_id and level equal the requested ones, up to limit"""
+    count = 0
+    async for event in events:
+        if matches_fields(event["message"], correlation_id, level):
+            yield event
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+def sse_event(event: str, data) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+async def stream_query_events(snapshots):
+    """
+    Turn query snapshots into server-sent events: `progress` with status and statistics,
+    `rows` with rows not sent before (matched on @ptr), or `snapshot` with the full result
+    set for queries whose rows have no @ptr (aggregates, which change while running),
+    and finally `complete` or `error`.
+    """
+    sent = set()
+    try:
+        snapshot = None
+        async for snapshot in snapshots:
+            yield sse_event("progress", {
+                "query_id": snapshot["query_id"],
+                "status": snapshot["status"],
+                "statistics": snapshot["statistics"]
+            })
+            
+            results = snapshot["results"]
+            if results and all("@ptr" in row for row in results):
+                new_rows = [row for row in results if row["@ptr"] not in sent]
+                sent.update(row["@ptr"] for row in new_rows)
+                if new_rows:
+                    yield sse_event("rows", new_rows)
+            elif results:
+                yield sse_event("snapshot", results)
+        
+        if snapshot:
+            yield sse_event("complete", {"query_id": snapshot["query_id"], "status": snapshot["status"]})
+    except Exception as e:
+        logger.error(f"Error streaming query results: {str(e)}")
+        yield sse_event("error", {"detail": f"Error querying logs: {str(e)}"})
+
 @router.get("/logs/{log_group_name}", response_model=List[LogEvent])
 async def list_logs(
     log_group_name: str = Path(..., description="Log group name"),
@@ -14,11 +78,71 @@ async def list_logs(
     start_time: Optional[datetime] = Query(None, description="Start time for log events (ISO format)"),
     end_time: Optional[datetime] = Query(None, description="End time for log events (ISO format)"),
     filter_pattern: str = Query("", description="CloudWatch Logs filter pattern"),
-    limit: int = Query(1000, description="Maximum number of log events to return", gt=0, le=10000)
+    limit: Optional[int] = Query(None, description="Maximum number of log events to return (default 1000; unlimited when streaming)", gt=0),
+    stream: bool = Query(False, description="Stream every matching event as NDJSON, following all result pages"),
+    correlation_id: Optional[str] = Query(None, description="Only events with this correlation ID"),
+    level: Optional[str] = Query(None, description="Only events with this log level, e.g. ERROR")
 ):
     """
     Get logs from a specific log group and optionally a specific log stream.
+    Ranges covered by the local mirror are answered without calling CloudWatch.
     """
+    if settings.LOG_MIRROR_ENABLED and not filter_pattern:
+        start_ms, end_ms = mirror_range(start_time, end_time)
+        if log_mirror.covers(log_group_name, start_ms, end_ms):
+            try:
+                events = await asyncio.to_thread(
+                    log_mirror.query,
+                    log_group_name,
+                    start_ms,
+                    end_ms,
+                    log_stream_name=log_stream_name,
+                    correlation_id=correlation_id,
+                    level=level,
+                    limit=limit if stream else limit or 1000
+                )
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Error reading mirrored logs: {str(e)}")
+            if stream:
+                return StreamingResponse((orjson.dumps(event) + b"\n" for event in events), media_type="application/x-ndjson")
+            return events
+    
+    if correlation_id or level:
+        # Same field equality as the mirror: the correlation ID narrows the CloudWatch scan as a
+        # filter pattern term (level is matched case-insensitively, so it cannot be a term), and
+        # every fetched event is then checked against the fields extracted from its message
+        if correlation_id and not filter_pattern.strip().startswith("{"):
+            filter_pattern = " ".join(filter(None, [filter_pattern, f'"{correlation_id}"']))
+        events = filter_fields(
+            iter_log_events(
+                log_group_name=log_group_name,
+                log_stream_name=log_stream_name,
+                start_time=start_time,
+                end_time=end_time,
+                filter_pattern=filter_pattern
+            ),
+            correlation_id,
+            level,
+            limit if stream else limit or 1000
+        )
+        if stream:
+            return StreamingResponse(stream_ndjson(events), media_type="application/x-ndjson")
+        try:
+            return [event async for event in events]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error fetching logs: {str(e)}")
+    
+    if stream:
+        events = iter_log_events(
+            log_group_name=log_group_name,
+            log_stream_name=log_stream_name,
+            start_time=start_time,
+            end_time=end_time,
+            filter_pattern=filter_pattern,
+            limit=limit
+        )
+        return StreamingResponse(stream_ndjson(events), media_type="application/x-ndjson")
+    
     try:
         log_events = await get_log_events(
             log_group_name=log_group_name,
@@ -26,7 +150,7 @@ async def list_logs(
             start_time=start_time,
             end_time=end_time,
             filter_pattern=filter_pattern,
-            limit=limit
+            limit=limit or 1000
         )
         return log_events
     except Exception as e:
@@ -38,7 +162,18 @@ async def query_log_data(request: LogsQueryRequest = Body(...)):
     Run a CloudWatch Logs Insights query against a log group.
     """
     try:
-        result = await query_logs(
+        if request.slices and request.slices > 1:
+            return await query_logs_sliced(
+                log_group_name=request.log_group_name,
+                service_name=request.service_name or request.log_group_name.split('/')[-1],
+                query_string=request.query_string,
+                start_time=request.start_time,
+                end_time=request.end_time,
+                slices=request.slices,
+                limit=request.limit
+            )
+        
+        result = await cached_query_logs(
             log_group_name=request.log_group_name,
             service_name=request.service_name or request.log_group_name.split('/')[-1],
             query_string=request.query_string,
@@ -57,13 +192,25 @@ async def query_log_data_get(
     query_string: str = Query(..., description="CloudWatch Logs Insights query"),
     start_time: Optional[datetime] = Query(None, description="Start time for query (ISO format)"),
     end_time: Optional[datetime] = Query(None, description="End time for query (ISO format)"),
-    limit: int = Query(1000, description="Maximum number of results to return", gt=0, le=10000)
+    limit: int = Query(1000, description="Maximum number of results to return", gt=0, le=10000),
+    slices: Optional[int] = Query(None, description="Split the time range into this many concurrent sub-queries", ge=1, le=100)
 ):
     """
     Run a CloudWatch Logs Insights query against a log group using GET.
     """
     try:
-        result = await query_logs(
+        if slices and slices > 1:
+            return await query_logs_sliced(
+                log_group_name=log_group_name,
+                service_name=service_name or log_group_name.split('/')[-1],
+                query_string=query_string,
+                start_time=start_time,
+                end_time=end_time,
+                slices=slices,
+                limit=limit
+            )
+        
+        result = await cached_query_logs(
             log_group_name=log_group_name,
             service_name=service_name or log_group_name.split('/')[-1],
             query_string=query_string,
@@ -73,4 +220,28 @@ async def query_log_data_get(
         )
         return result
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error querying logs: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error querying logs: {str(e)}")
+
+@router.get("/query/stream")
+async def query_log_data_stream(
+    log_group_name: str = Query(..., description="Log group name"),
+    query_string: str = Query(..., description="CloudWatch Logs Insights query"),
+    start_time: Optional[datetime] = Query(None, description="Start time for query (ISO format)"),
+    end_time: Optional[datetime] = Query(None, description="End time for query (ISO format)"),
+    limit: int = Query(1000, description="Maximum number of results to return", gt=0, le=10000)
+):
+    """
+    Run a CloudWatch Logs Insights query and push partial results and progress as server-sent events.
+    """
+    snapshots = iter_query_results(
+        log_group_name=log_group_name,
+        query_string=query_string,
+        start_time=start_time,
+        end_time=end_time,
+        limit=limit
+    )
+    return StreamingResponse(
+        stream_query_events(snapshots),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,15 +1,60 @@
 import time
+import random
 import logging
 import asyncio
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator, Awaitable, Callable
 
-from aws_client import logs_client, get_aioboto3_client
+from aws_client import logs_client, client_manager
 from config import settings
-from schemas import LogGroup, LogStream, LogEvent, LogQueryResult
+from schemas import LogGroup, LogStream, LogEvent, LogQueryResult, FailedServiceQuery
+from join_engine import JOIN_TYPES, hash_join, parse_join_fields
 
 logger = logging.getLogger(__name__)
 
+# Maximum events returned by one filter_log_events call
+FILTER_LOG_EVENTS_PAGE_SIZE = 10000
+
+# Shared across requests so the account's concurrent Logs Insights quota is respected
+query_semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_QUERIES)
+
+class RateLimiter:
+    """
+    Spaces calls at least 1 / rate seconds apart across every caller in the event loop
+    """
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self.next_slot = 0.0
+
+    async def wait(self) -> None:
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+# Every poller shares the account's GetQueryResults quota (5 transactions per second)
+poll_rate_limiter = RateLimiter(settings.QUERY_POLL_RATE_PER_SECOND)
+
+def to_log_group(lg: Dict[str, Any]) -> LogGroup:
+    return LogGroup(
+        name=lg["logGroupName"],
+        arn=lg["arn"],
+        creation_time=lg.get("creationTime"),
+        retention_in_days=lg.get("retentionInDays"),
+        metric_filter_count=lg.get("metricFilterCount")
+    )
+
+def to_log_stream(ls: Dict[str, Any], log_group_name: str) -> LogStream:
+    return LogStream(
+        name=ls["logStreamName"],
+        log_group_name=log_group_name,
+        creation_time=ls.get("creationTime"),
+        first_event_timestamp=ls.get("firstEventTimestamp"),
+        last_event_timestamp=ls.get("lastEventTimestamp"),
+        last_ingestion_time=ls.get("lastIngestionTime")
+    )
+
 async def get_log_groups(prefix: Optional[str] = None, limit: int = 50) -> List[LogGroup]:
     """
     Get CloudWatch log groups, optionally filtered by prefix
@@ -19,19 +64,10 @@ async def get_log_groups(prefix: Optional[str] = None, limit: int = 50) -> List[
         if prefix:
             params["logGroupNamePrefix"] = prefix
         
-        async with await get_aioboto3_client('logs') as logs:
-            response = await logs.describe_log_groups(**params)
+        logs = await client_manager.get_client('logs')
+        response = await logs.describe_log_groups(**params)
         
-        log_groups = [
-            LogGroup(
-                name=lg["logGroupName"],
-                arn=lg["arn"],
-                creation_time=lg.get("creationTime"),
-                retention_in_days=lg.get("retentionInDays"),
-                metric_filter_count=lg.get("metricFilterCount")
-            ) 
-            for lg in response.get("logGroups", [])
-        ]
+        log_groups = [to_log_group(lg) for lg in response.get("logGroups", [])]
         
         return log_groups
     except Exception as e:
@@ -53,26 +89,75 @@ async def get_log_streams(log_group_name: str, prefix: Optional[str] = None, lim
         if prefix:
             params["logStreamNamePrefix"] = prefix
         
-        async with await get_aioboto3_client('logs') as logs:
-            response = await logs.describe_log_streams(**params)
+        logs = await client_manager.get_client('logs')
+        response = await logs.describe_log_streams(**params)
         
-        log_streams = [
-            LogStream(
-                name=ls["logStreamName"],
-                log_group_name=log_group_name,
-                creation_time=ls.get("creationTime"),
-                first_event_timestamp=ls.get("firstEventTimestamp"),
-                last_event_timestamp=ls.get("lastEventTimestamp"),
-                last_ingestion_time=ls.get("lastIngestionTime")
-            ) 
-            for ls in response.get("logStreams", [])
-        ]
+        log_streams = [to_log_stream(ls, log_group_name) for ls in response.get("logStreams", [])]
         
         return log_streams
     except Exception as e:
         logger.error(f"Error fetching log streams for {log_group_name}: {str(e)}")
         raise
 
+async def iter_log_events(
+    log_group_name: str,
+    log_stream_name: Optional[str] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    filter_pattern: str = "",
+    limit: Optional[int] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield log events page by page, following nextToken until the range is exhausted
+    or limit events have been produced (no limit when None).
+    """
+    # Default to last 24 hours if not specified
+    if not end_time:
+        end_time = datetime.now()
+    if not start_time:
+        start_time = end_time - timedelta(hours=24)
+    
+    # Convert datetime to milliseconds timestamp
+    params = {
+        "logGroupName": log_group_name,
+        "startTime": int(start_time.timestamp() * 1000),
+        "endTime": int(end_time.timestamp() * 1000),
+    }
+    
+    if log_stream_name:
+        params["logStreamNames"] = [log_stream_name]
+    
+    if filter_pattern:
+        params["filterPattern"] = filter_pattern
+    
+    logs = await client_manager.get_client('logs')
+    remaining = limit
+    
+    while True:
+        if remaining is not None:
+            params["limit"] = min(remaining, FILTER_LOG_EVENTS_PAGE_SIZE)
+        
+        response = await logs.filter_log_events(**params)
+        
+        for event in response.get("events", []):
+            yield {
+                "timestamp": event["timestamp"],
+                "message": event["message"],
+                "ingestion_time": event.get("ingestionTime"),
+                "log_stream_name": event["logStreamName"]
+            }
+        
+        if remaining is not None:
+            remaining -= len(response.get("events", []))
+            if remaining <= 0:
+                return
+        
+        next_token = response.get("nextToken")
+        # The API can hand back the same token once the range is exhausted
+        if not next_token or next_token == params.get("nextToken"):
+            return
+        params["nextToken"] = next_token
+
 async def get_log_events(
     log_group_name: str,
     log_stream_name: Optional[str] = None,
@@ -85,111 +170,142 @@ async def get_log_events(
     Get logs from a specific log group and optionally a specific log stream
     """
     try:
-        # Default to last 24 hours if not specified
-        if not end_time:
-            end_time = datetime.now()
-        if not start_time:
-            start_time = end_time - timedelta(hours=24)
-        
-        # Convert datetime to milliseconds timestamp
-        start_timestamp = int(start_time.timestamp() * 1000)
-        end_timestamp = int(end_time.timestamp() * 1000)
-        
-        params = {
-            "logGroupName": log_group_name,
-            "startTime": start_timestamp,
-            "endTime": end_timestamp,
-            "limit": min(limit, settings.MAX_LOGS_RESULTS),
-        }
-        
-        if log_stream_name:
-            params["logStreamNames"] = [log_stream_name]
-        
-        if filter_pattern:
-            params["filterPattern"] = filter_pattern
-            
-        async with await get_aioboto3_client('logs') as logs:
-            response = await logs.filter_log_events(**params)
-        
-        log_events = [
-            LogEvent(
-                timestamp=event["timestamp"],
-                message=event["message"],
-                ingestion_time=event.get("ingestionTime"),
-                log_stream_name=event["logStreamName"]
-            ) 
-            for event in response.get("events", [])
+        return [
+            LogEvent(**event)
+            async for event in iter_log_events(
+                log_group_name=log_group_name,
+                log_stream_name=log_stream_name,
+                start_time=start_time,
+                end_time=end_time,
+                filter_pattern=filter_pattern,
+                limit=min(limit, settings.MAX_LOGS_RESULTS)
+            )
         ]
-        
-        return log_events
     except Exception as e:
         logger.error(f"Error fetching logs for {log_group_name}: {str(e)}")
         raise
 
-async def query_logs(
+def next_poll_interval(interval: float, progressed: bool) -> float:
+    """
+    Keep the interval while the query is making progress, back off exponentially otherwise
+    """
+    if progressed:
+        return interval
+    return min(interval * 2, settings.QUERY_POLL_MAX_SECONDS)
+
+def format_query_results(raw_results: List[List[Dict[str, str]]]) -> List[Dict[str, Any]]:
+    results = []
+    for result in raw_results:
+        result_dict = {}
+        for field in result:
+            result_dict[field['field']] = field['value']
+        results.append(result_dict)
+    return results
+
+async def iter_query_results(
     log_group_name: str,
-    service_name: str,
     query_string: str,
     start_time: Optional[datetime] = None,
     end_time: Optional[datetime] = None,
     limit: int = 1000
-) -> LogQueryResult:
+) -> AsyncIterator[Dict[str, Any]]:
     """
-    Run a CloudWatch Logs Insights query against a log group
+    Run a CloudWatch Logs Insights query and yield a snapshot (query_id, status,
+    statistics, results) every time it makes progress. The last snapshot is final.
     """
-    try:
-        # Default to last 24 hours if not specified
-        if not end_time:
-            end_time = datetime.now()
-        if not start_time:
-            start_time = end_time - timedelta(hours=24)
+    # Default to last 24 hours if not specified
+    if not end_time:
+        end_time = datetime.now()
+    if not start_time:
+        start_time = end_time - timedelta(hours=24)
+    
+    # Convert datetime to seconds timestamp (Logs Insights uses seconds)
+    start_timestamp = int(start_time.timestamp())
+    end_timestamp = int(end_time.timestamp())
+    
+    # Start the query once a slot under the concurrency quota is free
+    async with query_semaphore:
+        logs = await client_manager.get_client('logs')
+        start_query_response = await logs.start_query(
+            logGroupName=log_group_name,
+            startTime=start_timestamp,
+            endTime=end_timestamp,
+            queryString=query_string,
+            limit=min(limit, settings.MAX_LOGS_RESULTS)
+        )
         
-        # Convert datetime to seconds timestamp (Logs Insights uses seconds)
-        start_timestamp = int(start_time.timestamp())
-        end_timestamp = int(end_time.timestamp())
+        query_id = start_query_response['queryId']
         
-        # Start the query
-        async with await get_aioboto3_client('logs') as logs:
-            start_query_response = await logs.start_query(
-                logGroupName=log_group_name,
-                startTime=start_timestamp,
-                endTime=end_timestamp,
-                queryString=query_string,
-                limit=min(limit, settings.MAX_LOGS_RESULTS)
-            )
-            
-            query_id = start_query_response['queryId']
-            
-            # Poll for results with timeout
-            max_time = time.time() + settings.MAX_QUERY_DURATION_SECONDS
-            
-            while time.time() < max_time:
+        # Poll for results with timeout
+        max_time = time.time() + settings.MAX_QUERY_DURATION_SECONDS
+        interval = settings.QUERY_POLL_INITIAL_SECONDS
+        last_progress = None
+        finished = False
+        
+        try:
+            while True:
+                await poll_rate_limiter.wait()
                 query_response = await logs.get_query_results(queryId=query_id)
+                status = query_response['status']
+                statistics = query_response.get('statistics', {})
+                finished = status in ['Complete', 'Failed', 'Cancelled', 'Timeout']
+                
+                progress = (status, statistics.get('recordsScanned'), len(query_response['results']))
+                progressed = progress != last_progress
+                last_progress = progress
+                
+                if progressed or finished or time.time() >= max_time:
+                    yield {
+                        'query_id': query_id,
+                        'status': status,
+                        'statistics': statistics,
+                        'results': format_query_results(query_response['results'])
+                    }
                 
-                if query_response['status'] in ['Complete', 'Failed', 'Cancelled', 'Timeout']:
+                if finished or time.time() >= max_time:
                     break
                 
-                # Wait before checking again
-                await asyncio.sleep(1)
-            
-            # Process results
-            results = []
-            for result in query_response['results']:
-                result_dict = {}
-                for field in result:
-                    result_dict[field['field']] = field['value']
-                results.append(result_dict)
-            
-            # Get statistics if available
-            statistics = query_response.get('statistics', None)
-            
-            return LogQueryResult(
-                service=service_name,
-                log_group_name=log_group_name,
-                query_id=query_id,
-                results=results,
-                status=query_response['status']
-            )
+                # Jittered wait, never shorter than the interval, so concurrent pollers do not hit the API in lockstep
+                interval = next_poll_interval(interval, progressed)
+                await asyncio.sleep(random.uniform(interval, interval * 1.5))
+        except (asyncio.CancelledError, GeneratorExit):
+            # Caller timed out or went away; free the Insights slot instead of letting the query run on
+            if not finished:
+                try:
+                    await logs.stop_query(queryId=query_id)
+                except Exception as e:
+                    logger.warning(f"Could not stop query {query_id}: {str(e)}")
+            raise
+
+async def query_logs(
+    log_group_name: str,
+    service_name: str,
+    query_string: str,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    limit: int = 1000
+) -> LogQueryResult:
+    """
+    Run a CloudWatch Logs Insights query against a log group
+    """
+    try:
+        snapshot = None
+        async for snapshot in iter_query_results(
+            log_group_name=log_group_name,
+            query_string=query_string,
+            start_time=start_time,
+            end_time=end_time,
+            limit=limit
+        ):
+            pass
+        
+        return LogQueryResult(
+            service=service_name,
+            log_group_name=log_group_name,
+            query_id=snapshot['query_id'],
+            results=snapshot['results'],
+            status=snapshot['status']
+        )
     except Exception as e:
         logger.error(f"Error querying logs for {log_group_name}: {str(e)}")
         raise
@@ -200,13 +316,26 @@ async def join_logs_query(
     query_string: str,
     join_field: str,
     start_time: Optional[datetime] = None,
-    end_time: Optional[datetime] = None
-) -> Tuple[List[Dict[str, Any]], datetime, datetime]:
+    end_time: Optional[datetime] = None,
+    query_fn: Optional[Callable[..., Awaitable[LogQueryResult]]] = None,
+    join_type: str = "full",
+    time_window_seconds: Optional[float] = None,
+    timestamp_field: str = "@timestamp"
+) -> Tuple[List[Dict[str, Any]], datetime, datetime, List[FailedServiceQuery]]:
     """
-    Run the same query against multiple log groups and join the results
+    Run the same query against multiple log groups concurrently and join the results.
+    join_field may list several comma-separated fields. Services whose query fails
+    or times out are returned as failures alongside the partial join. query_fn
+    replaces query_logs, e.g. with the cached variant.
     """
+    query_fn = query_fn or query_logs
     if len(services) != len(log_groups):
         raise ValueError("Number of services must match number of log groups")
+    if join_type not in JOIN_TYPES:
+        raise ValueError(f"Join type must be one of: {', '.join(JOIN_TYPES)}")
+    join_fields = parse_join_fields(join_field)
+    if not join_fields:
+        raise ValueError("At least one join field is required")
     
     # Default to last 24 hours if not specified
     if not end_time:
@@ -214,36 +343,46 @@ async def join_logs_query(
     if not start_time:
         start_time = end_time - timedelta(hours=24)
     
-    # Query each service's logs
-    query_results = []
-    for service, log_group in zip(services, log_groups):
-        result = await query_logs(
-            log_group_name=log_group,
-            service_name=service,
-            query_string=query_string,
-            start_time=start_time,
-            end_time=end_time
+    # Query each service's logs concurrently; query_logs enforces the quota
+    async def run_service_query(service: str, log_group: str) -> LogQueryResult:
+        return await asyncio.wait_for(
+            query_fn(
+                log_group_name=log_group,
+                service_name=service,
+                query_string=query_string,
+                start_time=start_time,
+                end_time=end_time
+            ),
+            timeout=settings.JOIN_QUERY_TIMEOUT_SECONDS
         )
-        query_results.append(result)
     
-    # Join results based on the join field
-    joined_data = {}
-    for service_result in query_results:
-        service = service_result.service
-        for result in service_result.results:
-            if join_field in result:
-                join_value = result[join_field]
-                
-                if join_value not in joined_data:
-                    joined_data[join_value] = {
-                        "join_value": join_value,
-                        "services": {}
-                    }
-                
-                # Add service-specific data
-                joined_data[join_value]["services"][service] = result
+    outcomes = await asyncio.gather(
+        *(run_service_query(service, log_group) for service, log_group in zip(services, log_groups)),
+        return_exceptions=True
+    )
+    
+    # Keep whatever succeeded and report the rest
+    query_results = []
+    failures = []
+    for service, log_group, outcome in zip(services, log_groups, outcomes):
+        if isinstance(outcome, BaseException):
+            error = "Query timed out" if isinstance(outcome, asyncio.TimeoutError) else str(outcome)
+            logger.warning(f"Join query failed for {service} ({log_group}): {error}")
+            failures.append(FailedServiceQuery(service=service, log_group_name=log_group, error=error))
+        else:
+            query_results.append(outcome)
+    
+    if not query_results and failures:
+        raise RuntimeError(f"All service queries failed: {failures[0].error}")
     
-    # Convert to list of results
-    final_results = list(joined_data.values())
+    # Hash join in service order; the first service that returned results is the left side
+    final_results = list(hash_join(
+        [(result.service, result.results) for result in query_results],
+        keys=join_fields,
+        how=join_type,
+        window=time_window_seconds,
+        timestamp_field=timestamp_field,
+        max_rows=settings.MAX_JOIN_ROWS
+    ))
     
-    return final_results, start_time, end_time
\ No newline at end of file
+    return final_results, start_time, end_time, failures
\ No newline at end of file
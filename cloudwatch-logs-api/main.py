@@ -1,9 +1,15 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from config import settings
-from . import log_groups, log_streams, logs, join
+from aws_client import client_manager
+from log_mirror import log_mirror, mirrored_log_groups
+from catalog import log_catalog
+from latency_metrics import latency_metrics
+from . import log_groups, log_streams, logs, join, mirror, metrics
 
 # Configure logging
 logging.basicConfig(
@@ -11,11 +17,40 @@ logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
 )
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the shared AWS clients on startup and close them on shutdown"""
+    await client_manager.start()
+    log_catalog.start()
+    
+    # Keep the local mirror in sync in the background
+    mirror_task = None
+    if settings.LOG_MIRROR_ENABLED and mirrored_log_groups():
+        mirror_task = asyncio.create_task(log_mirror.run(mirrored_log_groups()))
+    
+    # Fold new span logs into the latency sketches in the background
+    metrics_task = None
+    if settings.METRICS_ENABLED:
+        metrics_task = asyncio.create_task(latency_metrics.run())
+    
+    yield
+    
+    for task in (mirror_task, metrics_task):
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    await log_catalog.close()
+    await client_manager.close()
+
 # Create FastAPI app
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="API for querying and joining AWS CloudWatch logs from multiple services",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -32,6 +67,8 @@ app.include_router(log_groups.router, prefix="/api", tags=["log-groups"])
 app.include_router(log_streams.router, prefix="/api", tags=["log-streams"])
 app.include_router(logs.router, prefix="/api", tags=["logs"])
 app.include_router(join.router, prefix="/api", tags=["join"])
+app.include_router(mirror.router, prefix="/api", tags=["mirror"])
+app.include_router(metrics.router, prefix="/api", tags=["metrics"])
 
 @app.get("/", tags=["root"])
 async def root():
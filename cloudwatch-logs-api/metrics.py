@@ -0,0 +1,40 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional, List
+from datetime import datetime
+
+from schemas import LatencyPercentiles
+from latency_metrics import latency_metrics, GROUP_BY_FIELDS
+from log_mirror import mirror_range
+
+router = APIRouter()
+
+@router.get("/metrics/latency", response_model=List[LatencyPercentiles])
+async def get_latency_percentiles(
+    start_time: Optional[datetime] = Query(None, description="Start of the window (ISO format, default 24 hours before end_time)"),
+    end_time: Optional[datetime] = Query(None, description="End of the window (ISO format, default now)"),
+    service: Optional[str] = Query(None, description="Only spans of this service"),
+    span: Optional[str] = Query(None, description="Only spans with this name"),
+    status: Optional[str] = Query(None, description="Only spans with this status, e.g. success or 500"),
+    group_by: str = Query("service,span,status", description="Comma-separated subset of service, span and status")
+):
+    """
+    Get p50/p95/p99 span latencies over a time window, computed from the
+    pre-aggregated sketches rather than by reading the logs again.
+    """
+    fields = [field.strip() for field in group_by.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in GROUP_BY_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot group by: {', '.join(unknown)}")
+    
+    try:
+        start_ms, end_ms = mirror_range(start_time, end_time)
+        return latency_metrics.percentiles(
+            start=start_ms / 1000,
+            end=end_ms / 1000,
+            service=service,
+            span=span,
+            status=status,
+            group_by=fields
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing latency percentiles: {str(e)}")
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, Path
+from typing import List
+
+from config import settings
+from schemas import MirrorStatus
+from log_mirror import log_mirror, mirrored_log_groups
+
+router = APIRouter()
+
+def mirror_status(log_group_name: str) -> MirrorStatus:
+    checkpoint = log_mirror.read_checkpoint(log_group_name) or {}
+    return MirrorStatus(
+        log_group_name=log_group_name,
+        synced_from=checkpoint.get("synced_from"),
+        synced_until=checkpoint.get("synced_until")
+    )
+
+@router.get("/mirror", response_model=List[MirrorStatus])
+async def list_mirrored_log_groups():
+    """
+    Get the time range mirrored locally for every configured log group.
+    """
+    return [mirror_status(log_group_name) for log_group_name in mirrored_log_groups()]
+
+@router.post("/mirror/{log_group_name:path}/sync", response_model=MirrorStatus)
+async def sync_mirrored_log_group(
+    log_group_name: str = Path(..., description="Log group name")
+):
+    """
+    Fetch new events of a log group into the local mirror now instead of waiting for the background sync.
+    """
+    if not settings.LOG_MIRROR_ENABLED:
+        raise HTTPException(status_code=404, detail="The log mirror is not enabled")
+    
+    try:
+        await log_mirror.sync_log_group(log_group_name)
+        return mirror_status(log_group_name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error syncing log mirror: {str(e)}")
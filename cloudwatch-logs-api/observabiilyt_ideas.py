@@ -6,6 +6,9 @@
 # ├── service_product/
 # │   ├── Dockerfile
 # │   └── main.py
+# ├── shared/
+# │   ├── cloudwatch_handler.py
+# │   └── json_logging.py
 # ├── service_order/
 # │   ├── Dockerfile
 # │   └── main.py
@@ -17,7 +20,7 @@
 fastapi==0.95.0
 uvicorn==0.21.1
 httpx==0.24.0
-python-json-logger==2.0.7
+orjson==3.9.12
 boto3==1.26.115
 
 # docker-compose.yml
@@ -146,6 +149,8 @@ WORKDIR /app
 COPY requirements.txt .
 RUN pip install --no-cache-dir -r requirements.txt
 
+COPY shared/cloudwatch_handler.py .
+COPY shared/json_logging.py .
 COPY service_user/main.py .
 RUN mkdir -p /var/log/services
 
@@ -159,6 +164,8 @@ WORKDIR /app
 COPY requirements.txt .
 RUN pip install --no-cache-dir -r requirements.txt
 
+COPY shared/cloudwatch_handler.py .
+COPY shared/json_logging.py .
 COPY service_order/main.py .
 RUN mkdir -p /var/log/services
 
@@ -172,11 +179,297 @@ WORKDIR /app
 COPY requirements.txt .
 RUN pip install --no-cache-dir -r requirements.txt
 
+COPY shared/cloudwatch_handler.py .
+COPY shared/json_logging.py .
 COPY service_product/main.py .
 RUN mkdir -p /var/log/services
 
 CMD ["uvicorn", "main:app", "--host", "0.0.0.0", "--port", "8000"]
 
+# shared/cloudwatch_handler.py
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import threading
+
+class CloudWatchLogsHandler(logging.Handler):
+    """
+    Ships log records to CloudWatch Logs from a background thread.
+
+    emit() only puts the record on a bounded queue, so logging in a request
+    handler never waits on the network. The worker thread sends batches with
+    put_log_events within the API limits (10,000 events, 1 MB, 24 hours per
+    batch, events in timestamp order) and one batch at a time, so the
+    stream's sequence is preserved. When the queue is full, records are
+    appended to spill_path (if set) and replayed later, otherwise dropped.
+    """
+
+    MAX_BATCH_EVENTS = 10000
+    MAX_BATCH_BYTES = 1048576
+    MAX_EVENT_BYTES = 262144
+    EVENT_OVERHEAD_BYTES = 26
+    MAX_BATCH_SPAN_MS = 24 * 60 * 60 * 1000
+    MAX_SEND_ATTEMPTS = 3
+
+    def __init__(self, client, log_group, log_stream, flush_interval=1.0,
+                 max_queue_size=10000, spill_path=None, level=logging.NOTSET):
+        super().__init__(level)
+        self.client = client
+        self.log_group = log_group
+        self.log_stream = log_stream
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.sequence_token = None
+        self.dropped = 0
+        self.spill_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.worker = threading.Thread(target=self._run, name=f"cloudwatch-{log_stream}", daemon=True)
+        self.worker.start()
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._spill([self._to_event(record)])
+
+    def format(self, record):
+        # Dict messages are shipped as JSON documents
+        if isinstance(record.msg, dict) and not record.args:
+            return json.dumps(record.msg, default=str)
+        return super().format(record)
+
+    def _to_event(self, record):
+        message = self.format(record)
+        encoded = message.encode("utf-8")
+        limit = self.MAX_EVENT_BYTES - self.EVENT_OVERHEAD_BYTES
+        if len(encoded) > limit:
+            message = encoded[:limit].decode("utf-8", "ignore")
+        return {"timestamp": int(record.created * 1000), "message": message}
+
+    def _spill(self, events):
+        if not self.spill_path:
+            self.dropped += len(events)
+            return
+        with self.spill_lock:
+            with open(self.spill_path, "a", encoding="utf-8") as spill:
+                for event in events:
+                    spill.write(json.dumps(event) + "\n")
+
+    def _take_spilled(self):
+        if not self.spill_path:
+            return []
+        with self.spill_lock:
+            try:
+                with open(self.spill_path, encoding="utf-8") as spill:
+                    events = [json.loads(line) for line in spill if line.strip()]
+                os.remove(self.spill_path)
+            except FileNotFoundError:
+                return []
+        return events
+
+    def _run(self):
+        pending = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while not (self.stopping.is_set() and self.queue.empty()):
+            try:
+                record = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                pending.append(self._to_event(record))
+            except queue.Empty:
+                pass
+
+            if len(pending) >= self.MAX_BATCH_EVENTS or time.monotonic() >= deadline:
+                # Replay spilled events once the backlog has cleared
+                if self.queue.empty():
+                    pending = self._take_spilled() + pending
+                self._send(pending)
+                pending = []
+                deadline = time.monotonic() + self.flush_interval
+
+        self._send(pending)
+
+    def _batches(self, events):
+        events.sort(key=lambda event: event["timestamp"])
+        batch = []
+        batch_bytes = 0
+        for event in events:
+            size = len(event["message"].encode("utf-8")) + self.EVENT_OVERHEAD_BYTES
+            if batch and (len(batch) >= self.MAX_BATCH_EVENTS
+                          or batch_bytes + size > self.MAX_BATCH_BYTES
+                          or event["timestamp"] - batch[0]["timestamp"] > self.MAX_BATCH_SPAN_MS):
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append(event)
+            batch_bytes += size
+        if batch:
+            yield batch
+
+    def _send(self, events):
+        for batch in self._batches(events):
+            for attempt in range(self.MAX_SEND_ATTEMPTS):
+                try:
+                    self._put(batch)
+                    break
+                except Exception as e:
+                    if attempt == self.MAX_SEND_ATTEMPTS - 1:
+                        # Report on stderr like logging.Handler.handleError: stdout may be the
+                        # application's output, and logging would route back into this handler
+                        if logging.raiseExceptions:
+                            sys.stderr.write(f"{type(self).__name__}: failed to send {len(batch)} events "
+                                             f"to CloudWatch: {str(e)}\n")
+                        # Keep the batch for a later replay instead of blocking the queue
+                        self._spill(batch)
+                    else:
+                        time.sleep(0.5 * 2 ** attempt)
+
+    def _put(self, batch):
+        params = {
+            "logGroupName": self.log_group,
+            "logStreamName": self.log_stream,
+            "logEvents": batch,
+        }
+        if self.sequence_token:
+            params["sequenceToken"] = self.sequence_token
+        try:
+            response = self.client.put_log_events(**params)
+        except self.client.exceptions.InvalidSequenceTokenException as e:
+            # Another writer used the stream; continue from the token CloudWatch expects
+            self.sequence_token = e.response.get("expectedSequenceToken")
+            raise
+        except self.client.exceptions.ResourceNotFoundException:
+            self.client.create_log_stream(logGroupName=self.log_group, logStreamName=self.log_stream)
+            raise
+        self.sequence_token = response.get("nextSequenceToken")
+
+    def flush(self):
+        """Wait until everything queued so far has been handed to the worker"""
+        while not self.queue.empty() and self.worker.is_alive():
+            time.sleep(0.01)
+
+    def close(self):
+        self.stopping.set()
+        self.worker.join(timeout=self.flush_interval + 10)
+        super().close()
+
+# shared/json_logging.py
+# Same module as cloudwatch-logs-api/json_logging.py
+"""
+Structured JSON logging shared by cli.py and the observability services.
+
+FastJsonFormatter writes one JSON object per record: timestamp, level and
+message, then any static fields, then the `extra` fields passed to the log
+call. setup_queue_logging moves formatting and handler I/O to a listener
+thread, so the logging call itself only enqueues the record.
+"""
+import copy
+import json
+import queue
+import atexit
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+# Attributes every LogRecord has; anything else on the record came from `extra`
+RESERVED_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+def _dumps_json(value) -> str:
+    return json.dumps(value, default=str)
+
+def _dumps_orjson(value) -> str:
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+
+dumps = _dumps_orjson if orjson else _dumps_json
+
+class TimestampCache:
+    """
+    ISO-8601 UTC timestamps with millisecond precision. Records logged within
+    the same millisecond reuse the string formatted for the first one.
+    """
+
+    def __init__(self):
+        self.last_millis = None
+        self.last_value = None
+
+    def format(self, created: float) -> str:
+        millis = int(created * 1000)
+        if millis != self.last_millis:
+            self.last_value = datetime.fromtimestamp(millis / 1000, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
+            self.last_millis = millis
+        return self.last_value
+
+class FastJsonFormatter(logging.Formatter):
+    def __init__(self, static_fields=None, timestamp_field="timestamp", level_field="level"):
+        super().__init__()
+        self.static_fields = dict(static_fields or {})
+        self.timestamp_field = timestamp_field
+        self.level_field = level_field
+        self.timestamps = TimestampCache()
+
+    def format(self, record):
+        log_record = {
+            self.timestamp_field: self.timestamps.format(record.created),
+            self.level_field: record.levelname,
+            "message": record.getMessage(),
+        }
+        log_record.update(self.static_fields)
+
+        # Add extra fields from the record
+        for key, value in record.__dict__.items():
+            if key not in RESERVED_ATTRS and key[0] != "_":
+                log_record[key] = value
+
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            log_record["exc_info"] = record.exc_text
+
+        return dumps(log_record)
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Enqueue records with their message resolved (args may be mutated after the
+    call returns) but leave exception and JSON formatting to the listener.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+def setup_queue_logging(logger: logging.Logger, handlers) -> QueueListener:
+    """
+    Replace the logger's handlers with a queue handler. The given handlers run on a
+    QueueListener thread, which is stopped (and drained) at interpreter exit.
+    """
+    log_queue = queue.SimpleQueue()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(DeferredQueueHandler(log_queue))
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_queue_logging, listener)
+    return listener
+
+def stop_queue_logging(listener: QueueListener) -> None:
+    """
+    Drain the queue and stop the listener thread. Safe to call more than once.
+    """
+    if listener._thread is not None:
+        listener.stop()
+
 # service_user/main.py
 import os
 import logging
@@ -187,8 +480,8 @@ import time
 import boto3
 from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pythonjsonlogger import jsonlogger
-import datetime
+from cloudwatch_handler import CloudWatchLogsHandler
+from json_logging import FastJsonFormatter, setup_queue_logging
 
 # Get environment variables
 service_name = os.getenv("SERVICE_NAME", "user-service")
@@ -210,48 +503,42 @@ console_handler = logging.StreamHandler()
 console_handler.setLevel(logging.INFO)
 
 # JSON formatter
-class CustomJsonFormatter(jsonlogger.JsonFormatter):
-    def add_fields(self, log_record, record, message_dict):
-        super(CustomJsonFormatter, self).add_fields(log_record, record, message_dict)
-        log_record['service'] = service_name
-        log_record['timestamp'] = datetime.datetime.now().isoformat()
-        if not log_record.get('severity'):
-            log_record['severity'] = record.levelname
-
-formatter = CustomJsonFormatter('%(timestamp)s %(service)s %(severity)s %(message)s %(correlation_id)s %(duration_ms)s %(span)s')
+formatter = FastJsonFormatter(static_fields={'service': service_name}, level_field='severity')
 file_handler.setFormatter(formatter)
 console_handler.setFormatter(formatter)
 
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+# Request handlers only enqueue records; a listener thread formats and writes them
+log_listener = setup_queue_logging(logger, [file_handler, console_handler])
 
-# Setup CloudWatch client
+# Setup CloudWatch client; events go through a dedicated logger so they stay out of the file/console logs
 cloudwatch = boto3.client('logs', endpoint_url=aws_endpoint_url, 
                          region_name='us-east-1',
                          aws_access_key_id='test',
                          aws_secret_access_key='test')
+cloudwatch_handler = CloudWatchLogsHandler(
+    cloudwatch,
+    log_group='/microservices',
+    log_stream=service_name,
+    spill_path=os.getenv("CLOUDWATCH_SPILL_FILE", f"/tmp/{service_name}-cloudwatch.spill")
+)
+cloudwatch_logger = logging.getLogger(f"{service_name}.cloudwatch")
+cloudwatch_logger.setLevel(logging.INFO)
+cloudwatch_logger.propagate = False
+cloudwatch_logger.addHandler(cloudwatch_handler)
 
 # Helper function for CloudWatch Logs
 def send_to_cloudwatch(log_event, correlation_id):
-    try:
-        timestamp = int(time.time() * 1000)
-        cloudwatch.put_log_events(
-            logGroupName='/microservices',
-            logStreamName=service_name,
-            logEvents=[
-                {
-                    'timestamp': timestamp,
-                    'message': json.dumps({**log_event, 'correlation_id': correlation_id})
-                }
-            ]
-        )
-    except Exception as e:
-        logger.error(f"Failed to send logs to CloudWatch: {str(e)}", 
-                    extra={'correlation_id': correlation_id, 'span': 'cloudwatch_error'})
+    # Only enqueues; the handler's worker thread batches and sends
+    cloudwatch_logger.info({**log_event, 'correlation_id': correlation_id})
 
 # Create FastAPI app
 app = FastAPI(title="User Service")
 
+@app.on_event("shutdown")
+def flush_cloudwatch_logs():
+    # Send whatever is still queued before the process exits
+    cloudwatch_handler.close()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -608,8 +895,8 @@ import time
 import boto3
 from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pythonjsonlogger import jsonlogger
-import datetime
+from cloudwatch_handler import CloudWatchLogsHandler
+from json_logging import FastJsonFormatter, setup_queue_logging
 
 # Get environment variables
 service_name = os.getenv("SERVICE_NAME", "order-service")
@@ -631,48 +918,42 @@ console_handler = logging.StreamHandler()
 console_handler.setLevel(logging.INFO)
 
 # JSON formatter
-class CustomJsonFormatter(jsonlogger.JsonFormatter):
-    def add_fields(self, log_record, record, message_dict):
-        super(CustomJsonFormatter, self).add_fields(log_record, record, message_dict)
-        log_record['service'] = service_name
-        log_record['timestamp'] = datetime.datetime.now().isoformat()
-        if not log_record.get('severity'):
-            log_record['severity'] = record.levelname
-
-formatter = CustomJsonFormatter('%(timestamp)s %(service)s %(severity)s %(message)s %(correlation_id)s %(duration_ms)s %(span)s')
+formatter = FastJsonFormatter(static_fields={'service': service_name}, level_field='severity')
 file_handler.setFormatter(formatter)
 console_handler.setFormatter(formatter)
 
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+# Request handlers only enqueue records; a listener thread formats and writes them
+log_listener = setup_queue_logging(logger, [file_handler, console_handler])
 
-# Setup CloudWatch client
+# Setup CloudWatch client; events go through a dedicated logger so they stay out of the file/console logs
 cloudwatch = boto3.client('logs', endpoint_url=aws_endpoint_url, 
                          region_name='us-east-1',
                          aws_access_key_id='test',
                          aws_secret_access_key='test')
+cloudwatch_handler = CloudWatchLogsHandler(
+    cloudwatch,
+    log_group='/microservices',
+    log_stream=service_name,
+    spill_path=os.getenv("CLOUDWATCH_SPILL_FILE", f"/tmp/{service_name}-cloudwatch.spill")
+)
+cloudwatch_logger = logging.getLogger(f"{service_name}.cloudwatch")
+cloudwatch_logger.setLevel(logging.INFO)
+cloudwatch_logger.propagate = False
+cloudwatch_logger.addHandler(cloudwatch_handler)
 
 # Helper function for CloudWatch Logs
 def send_to_cloudwatch(log_event, correlation_id):
-    try:
-        timestamp = int(time.time() * 1000)
-        cloudwatch.put_log_events(
-            logGroupName='/microservices',
-            logStreamName=service_name,
-            logEvents=[
-                {
-                    'timestamp': timestamp,
-                    'message': json.dumps({**log_event, 'correlation_id': correlation_id})
-                }
-            ]
-        )
-    except Exception as e:
-        logger.error(f"Failed to send logs to CloudWatch: {str(e)}", 
-                    extra={'correlation_id': correlation_id, 'span': 'cloudwatch_error'})
+    # Only enqueues; the handler's worker thread batches and sends
+    cloudwatch_logger.info({**log_event, 'correlation_id': correlation_id})
 
 # Create FastAPI app
 app = FastAPI(title="Order Service")
 
+@app.on_event("shutdown")
+def flush_cloudwatch_logs():
+    # Send whatever is still queued before the process exits
+    cloudwatch_handler.close()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
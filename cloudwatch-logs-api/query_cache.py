@@ -0,0 +1,251 @@
+import re
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+
+from config import settings
+from schemas import LogQueryResult
+from logs_service import query_logs
+from query_planner import parse_query, rewrite_for_slices, combine_windows
+
+logger = logging.getLogger(__name__)
+
+def normalize_query(query_string: str) -> str:
+    """
+    Collapse whitespace outside string literals so cosmetic edits share a cache entry
+    """
+    parts = re.split(r"""("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')""", query_string)
+    normalized = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            normalized.append(part)
+        else:
+            normalized.append(re.sub(r"\s*\|\s*", " | ", re.sub(r"\s+", " ", part)))
+    return "".join(normalized).strip().strip("|").strip()
+
+def query_fingerprint(log_group_name: str, query_string: str) -> str:
+    digest = hashlib.sha256(f"{log_group_name}\n{normalize_query(query_string)}".encode("utf-8")).hexdigest()
+    return f"insights-seen:{digest}"
+
+def cache_key(log_group_name: str, query_string: str, start_timestamp: int, end_timestamp: int, limit: int) -> str:
+    digest = hashlib.sha256(
+        f"{log_group_name}\n{normalize_query(query_string)}\n{start_timestamp}\n{end_timestamp}\n{limit}".encode("utf-8")
+    ).hexdigest()
+    return f"insights:{digest}"
+
+class MemoryCacheBackend:
+    """
+    In-process LRU bounded by the serialized size of its entries.
+    Entries without a TTL live until they are evicted.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.entries: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: Optional[int]) -> None:
+        if len(value) > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (value, time.monotonic() + ttl if ttl else None)
+        self.current_bytes += len(value)
+        while self.current_bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key: str) -> None:
+        value, _ = self.entries.pop(key)
+        self.current_bytes -= len(value)
+
+class RedisCacheBackend:
+    """
+    Shared cache for multi-worker deployments. Size-based eviction is left to the
+    server (configure maxmemory with maxmemory-policy allkeys-lru).
+    """
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self.client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[int]) -> None:
+        await self.client.set(key, value, ex=ttl)
+
+class QueryResultCache:
+    """
+    Caches Logs Insights results per time window. Windows that ended more than
+    QUERY_CACHE_SETTLE_SECONDS ago cannot change any more and are kept until
+    evicted; the open tail window expires after QUERY_CACHE_TTL_SECONDS.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Query cache read failed: {str(e)}")
+            value = None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return orjson.loads(value)
+
+    async def seen_before(self, key: str) -> bool:
+        """
+        Whether this key was marked within QUERY_CACHE_REPEAT_SECONDS; marks it either way
+        """
+        try:
+            seen = await self.backend.get(key) is not None
+            await self.backend.set(key, b"1", settings.QUERY_CACHE_REPEAT_SECONDS)
+        except Exception as e:
+            logger.warning(f"Query cache read failed: {str(e)}")
+            return False
+        return seen
+
+    async def set(self, key: str, value: Dict[str, Any], closed: bool) -> None:
+        ttl = None if closed else settings.QUERY_CACHE_TTL_SECONDS
+        try:
+            await self.backend.set(key, orjson.dumps(value), ttl)
+        except Exception as e:
+            logger.warning(f"Query cache write failed: {str(e)}")
+
+def create_cache() -> QueryResultCache:
+    if settings.REDIS_URL:
+        logger.info("Using Redis for the query result cache")
+        return QueryResultCache(RedisCacheBackend(settings.REDIS_URL))
+    return QueryResultCache(MemoryCacheBackend(settings.QUERY_CACHE_MAX_BYTES))
+
+query_cache = create_cache()
+
+def bucket_windows(start_timestamp: int, end_timestamp: int, bucket_seconds: int) -> List[Tuple[int, int]]:
+    """
+    Split [start, end] at bucket boundaries so interior windows repeat across refreshes
+    """
+    windows = []
+    window_start = start_timestamp
+    while window_start <= end_timestamp:
+        boundary = (window_start // bucket_seconds + 1) * bucket_seconds
+        window_end = min(boundary - 1, end_timestamp)
+        windows.append((window_start, window_end))
+        window_start = window_end + 1
+    return windows
+
+async def cached_window(log_group_name, service_name, query_string, window, limit) -> Dict[str, Any]:
+    """
+    Results of one window, from the cache when possible
+    """
+    window_start, window_end = window
+    key = cache_key(log_group_name, query_string, window_start, window_end, limit)
+
+    cached = await query_cache.get(key)
+    if cached is not None:
+        return cached
+
+    result = await query_logs(
+        log_group_name=log_group_name,
+        service_name=service_name,
+        query_string=query_string,
+        start_time=datetime.fromtimestamp(window_start),
+        end_time=datetime.fromtimestamp(window_end),
+        limit=limit
+    )
+    value = {"query_id": result.query_id, "results": result.results, "status": result.status}
+
+    # Only finished queries are worth keeping
+    if result.status == "Complete":
+        closed = window_end < time.time() - settings.QUERY_CACHE_SETTLE_SECONDS
+        await query_cache.set(key, value, closed)
+
+    return value
+
+async def cached_query_logs(
+    log_group_name: str,
+    service_name: str,
+    query_string: str,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    limit: int = 1000
+) -> LogQueryResult:
+    """
+    Drop-in replacement for query_logs that answers from per-bucket cached results.
+    Queries whose results cannot be merged across windows are cached as a whole.
+
+    Buckets only pay off when the same query comes back (a dashboard refresh):
+    a query seen for the first time runs as one Insights query instead of one per
+    bucket, and only repeats are split.
+    """
+    if not settings.QUERY_CACHE_ENABLED:
+        return await query_logs(
+            log_group_name=log_group_name,
+            service_name=service_name,
+            query_string=query_string,
+            start_time=start_time,
+            end_time=end_time,
+            limit=limit
+        )
+
+    # Default to last 24 hours if not specified
+    if not end_time:
+        end_time = datetime.now()
+    if not start_time:
+        start_time = end_time - timedelta(hours=24)
+
+    start_timestamp = int(start_time.timestamp())
+    end_timestamp = int(end_time.timestamp())
+
+    commands, plan, sliceable = parse_query(query_string)
+    repeated = await query_cache.seen_before(query_fingerprint(log_group_name, query_string))
+
+    if not sliceable or not repeated:
+        windows = [(start_timestamp, end_timestamp)]
+        window_query = query_string
+    else:
+        windows = bucket_windows(start_timestamp, end_timestamp, settings.QUERY_CACHE_BUCKET_SECONDS)
+        window_query = rewrite_for_slices(commands, plan) if plan and len(windows) > 1 else query_string
+
+    window_limit = settings.MAX_LOGS_RESULTS if plan and len(windows) > 1 else limit
+
+    values = await asyncio.gather(*(
+        cached_window(log_group_name, service_name, window_query, window, window_limit) for window in windows
+    ))
+
+    statuses = {value["status"] for value in values}
+    status = "Complete" if statuses == {"Complete"} else ", ".join(sorted(statuses))
+
+    if len(values) == 1:
+        results = values[0]["results"]
+    else:
+        results = combine_windows(commands, plan, [value["results"] for value in values], limit)
+
+    return LogQueryResult(
+        service=service_name,
+        log_group_name=log_group_name,
+        query_id=",".join(filter(None, (value.get("query_id") for value in values))),
+        results=results,
+        status=status
+    )
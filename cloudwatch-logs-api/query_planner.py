@@ -0,0 +1,416 @@
+import re
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+
+from config import settings
+from schemas import LogQueryResult
+from logs_service import query_logs
+
+logger = logging.getLogger(__name__)
+
+# Aggregations whose per-window results can be combined exactly
+MERGEABLE_FUNCTIONS = {"count", "sum", "min", "max", "avg"}
+
+# Smallest window the planner will split a saturated window into
+MIN_SLICE_SECONDS = 60
+
+AGGREGATION_PATTERN = re.compile(r"^(\w+)\s*\((.*)\)$", re.DOTALL)
+ALIAS_PATTERN = re.compile(r"^(.*?)\s+as\s+([\w@.]+)$", re.IGNORECASE | re.DOTALL)
+
+def split_top_level(text: str, separator: str) -> List[str]:
+    """
+    Split on a separator that is not inside quotes, backticks or parentheses
+    """
+    parts = []
+    current = []
+    quote = None
+    depth = 0
+
+    for char in text:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in ("'", '"', "`"):
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+
+    parts.append("".join(current).strip())
+    return parts
+
+def split_alias(item: str) -> Tuple[str, str]:
+    """
+    'count(*) as errors' -> ('count(*)', 'errors'); 'bin(1h)' -> ('bin(1h)', 'bin(1h)')
+    """
+    match = ALIAS_PATTERN.match(item.strip())
+    if match:
+        return match.group(1).strip(), match.group(2)
+    return item.strip(), item.strip()
+
+class StatsPlan:
+    """
+    Parsed `stats ... by ...` command of an aggregate query, plus the sort/limit
+    commands that follow it and have to be re-applied after merging.
+    """
+
+    def __init__(self, aggregations, group_fields, sort=None, limit=None):
+        self.aggregations = aggregations  # [(function, argument, output field)]
+        self.group_fields = group_fields
+        self.sort = sort  # (field, descending)
+        self.limit = limit
+
+def parse_query(query_string: str) -> Tuple[List[str], Optional[StatsPlan], bool]:
+    """
+    Split a Logs Insights query into commands and parse its stats command.
+    Returns (commands, stats plan or None, sliceable).
+    """
+    commands = [c for c in split_top_level(query_string, "|") if c]
+    stats_index = next((i for i, c in enumerate(commands) if c.lower().startswith("stats ")), None)
+
+    if stats_index is None:
+        return commands, None, True
+
+    # Only one stats command, followed by nothing but sort/limit, can be merged
+    trailing = commands[stats_index + 1:]
+    if any(not re.match(r"^(sort|limit)\s", c, re.IGNORECASE) for c in trailing):
+        return commands, None, False
+
+    body = commands[stats_index][len("stats "):]
+    by_parts = re.split(r"\s+by\s+", body, maxsplit=1, flags=re.IGNORECASE)
+    aggregation_text = by_parts[0]
+    group_text = by_parts[1] if len(by_parts) > 1 else ""
+
+    aggregations = []
+    for item in split_top_level(aggregation_text, ","):
+        expression, output_field = split_alias(item)
+        match = AGGREGATION_PATTERN.match(expression)
+        if not match or match.group(1).lower() not in MERGEABLE_FUNCTIONS:
+            return commands, None, False
+        aggregations.append((match.group(1).lower(), match.group(2).strip(), output_field))
+
+    group_fields = [split_alias(item)[1] for item in split_top_level(group_text, ",") if item]
+
+    return commands, StatsPlan(aggregations, group_fields, parse_sort(trailing), parse_limit(trailing)), True
+
+def rewrite_for_slices(commands: List[str], plan: StatsPlan) -> str:
+    """
+    Build the per-window query: avg() becomes sum() and count() so windows can be
+    combined, and trailing sort/limit are dropped until after the merge.
+    """
+    items = []
+    for index, (function, argument, output_field) in enumerate(plan.aggregations):
+        expression = f"{function}({argument})"
+        if function == "avg":
+            items.append(f"sum({argument}) as __sum_{index}")
+            items.append(f"count({argument}) as __count_{index}")
+        elif output_field == expression:
+            items.append(expression)
+        else:
+            items.append(f"{expression} as {output_field}")
+
+    stats_command = "stats " + ", ".join(items)
+    if plan.group_fields:
+        stats_index = next(i for i, c in enumerate(commands) if c.lower().startswith("stats "))
+        group_text = re.split(r"\s+by\s+", commands[stats_index], maxsplit=1, flags=re.IGNORECASE)[1]
+        stats_command += " by " + group_text
+
+    prefix = [c for c in commands if not c.lower().startswith(("stats ", "sort ", "limit "))]
+    return " | ".join(prefix + [stats_command])
+
+def to_number(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def compare_values(left: str, right: str) -> int:
+    """
+    Compare two result values numerically when both are numbers, as text otherwise
+    (Insights timestamps like 2024-03-01 12:00:00.000 sort correctly as text)
+    """
+    left_number, right_number = to_number(left), to_number(right)
+    if left_number is not None and right_number is not None:
+        left, right = left_number, right_number
+    return (left > right) - (left < right)
+
+def format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+def merge_aggregates(window_results: List[List[Dict[str, str]]], plan: StatsPlan) -> List[Dict[str, str]]:
+    """
+    Combine per-window stats rows group by group
+    """
+    merged: Dict[tuple, Dict[str, Any]] = {}
+
+    for rows in window_results:
+        for row in rows:
+            key = tuple(row.get(field) for field in plan.group_fields)
+            target = merged.setdefault(key, {})
+
+            for index, (function, _, output_field) in enumerate(plan.aggregations):
+                if function == "avg":
+                    fields = (f"__sum_{index}", f"__count_{index}")
+                    combine = "sum"
+                else:
+                    fields = (output_field,)
+                    combine = "sum" if function == "count" else function
+
+                for field in fields:
+                    if combine != "sum":
+                        # min/max also apply to strings and timestamps: keep the winning raw value
+                        value = row.get(field)
+                        if value is None:
+                            continue
+                        current = target.get(field)
+                        better = -1 if combine == "min" else 1
+                        if current is None or compare_values(value, current) == better:
+                            target[field] = value
+                        continue
+
+                    value = to_number(row.get(field))
+                    if value is None:
+                        continue
+                    target[field] = target.get(field, 0) + value
+
+    results = []
+    for key, values in merged.items():
+        row = {field: value for field, value in zip(plan.group_fields, key) if value is not None}
+        for index, (function, _, output_field) in enumerate(plan.aggregations):
+            if function == "avg":
+                total = values.get(f"__sum_{index}")
+                count = values.get(f"__count_{index}")
+                if total is not None and count:
+                    row[output_field] = format_number(total / count)
+            elif function in ("min", "max"):
+                if output_field in values:
+                    row[output_field] = values[output_field]
+            elif output_field in values:
+                row[output_field] = format_number(values[output_field])
+        results.append(row)
+
+    if plan.sort:
+        results = sort_rows(results, plan.sort)
+    if plan.limit is not None:
+        results = results[:plan.limit]
+
+    return results
+
+def parse_sort(commands: List[str]) -> Optional[Tuple[str, bool]]:
+    """
+    Field and direction (descending?) of the last sort command
+    """
+    for command in reversed(commands):
+        tokens = command.split()
+        if tokens[0].lower() == "sort" and len(tokens) > 1:
+            return tokens[1], len(tokens) > 2 and tokens[2].lower() == "desc"
+    return None
+
+def parse_limit(commands: List[str]) -> Optional[int]:
+    """
+    Row count of the last limit command
+    """
+    for command in reversed(commands):
+        tokens = command.split()
+        if tokens[0].lower() == "limit" and len(tokens) > 1 and tokens[1].isdigit():
+            return int(tokens[1])
+    return None
+
+def sort_rows(rows: List[Dict[str, str]], sort: Tuple[str, bool]) -> List[Dict[str, str]]:
+    field, descending = sort
+    numeric = all(to_number(r.get(field)) is not None for r in rows if field in r)
+    return sorted(
+        rows,
+        key=lambda r: (to_number(r.get(field)) or 0) if numeric else (r.get(field) or ""),
+        reverse=descending
+    )
+
+def combine_windows(
+    commands: List[str],
+    plan: Optional[StatsPlan],
+    window_results: List[List[Dict[str, str]]],
+    limit: int
+) -> List[Dict[str, str]]:
+    """
+    Merge the rows of several windows into the result of the whole query
+    """
+    if plan:
+        return merge_aggregates(window_results, plan)
+
+    results = [row for rows in window_results for row in rows]
+    # Insights returns the newest events first unless the query sorts
+    sort = parse_sort(commands) or ("@timestamp", True)
+    if any(sort[0] in row for row in results):
+        results = sort_rows(results, sort)
+    # Each window honoured the query's own limit; the concatenation has to as well
+    query_limit = parse_limit(commands)
+    if query_limit is not None:
+        limit = min(limit, query_limit)
+    return results[:limit]
+
+def plan_windows(start_timestamp: int, end_timestamp: int, slices: int) -> List[Tuple[int, int]]:
+    """
+    Split [start, end] (inclusive, in seconds) into up to `slices` non-overlapping windows
+    """
+    total = end_timestamp - start_timestamp + 1
+    slices = max(1, min(slices, total // MIN_SLICE_SECONDS or 1))
+    step = total / slices
+
+    windows = []
+    for i in range(slices):
+        window_start = start_timestamp + int(round(i * step))
+        window_end = start_timestamp + int(round((i + 1) * step)) - 1
+        windows.append((window_start, window_end))
+    return windows
+
+def result_order(commands: List[str]) -> Optional[bool]:
+    """
+    True when the merged rows are newest first, False when oldest first, None when
+    the query sorts on another field
+    """
+    field, descending = parse_sort(commands) or ("@timestamp", True)
+    return descending if field == "@timestamp" else None
+
+async def run_window(log_group_name, service_name, query_string, window, limit) -> LogQueryResult:
+    window_start, window_end = window
+    return await query_logs(
+        log_group_name=log_group_name,
+        service_name=service_name,
+        query_string=query_string,
+        start_time=datetime.fromtimestamp(window_start),
+        end_time=datetime.fromtimestamp(window_end),
+        limit=limit
+    )
+
+async def run_windows(log_group_name, service_name, query_string, windows, limit, newest_first) -> List[LogQueryResult]:
+    """
+    Run the windows concurrently and, when the caller wants more rows than one query
+    returns, split windows that hit that cap in half until `limit` rows are covered.
+
+    Windows are visited in result order (newest_first, or oldest first), and only the
+    first saturated one is split; splitting stops once the complete windows ahead of
+    it hold `limit` rows. With newest_first=None the query sorts on another field, so
+    every saturated window is split.
+    """
+    results = list(await asyncio.gather(*(
+        run_window(log_group_name, service_name, query_string, window, limit) for window in windows
+    )))
+    # A split window can only add rows beyond the per-query cap, which the caller would cut anyway
+    cap = settings.MAX_LOGS_RESULTS
+    if limit <= cap:
+        return results
+
+    windows = list(windows)
+    while True:
+        order = range(len(windows))
+        if newest_first is not False:
+            order = reversed(order)
+
+        to_split = []
+        rows = 0
+        for index in order:
+            window_start, window_end = windows[index]
+            saturated = len(results[index].results) >= cap
+            if saturated and window_end - window_start + 1 >= 2 * MIN_SLICE_SECONDS:
+                to_split.append(index)
+                if newest_first is not None:
+                    break
+                continue
+            rows += len(results[index].results)
+            if newest_first is not None and rows >= limit:
+                break
+
+        if not to_split:
+            return results
+
+        logger.info(f"{len(to_split)} window(s) hit the result limit, subdividing")
+        halves = {}
+        for index in to_split:
+            window_start, window_end = windows[index]
+            middle = window_start + (window_end - window_start + 1) // 2
+            halves[index] = [(window_start, middle - 1), (middle, window_end)]
+        split_results = await asyncio.gather(*(
+            run_window(log_group_name, service_name, query_string, half, limit)
+            for index in to_split for half in halves[index]
+        ))
+
+        # Replace every split window by its halves, keeping the windows in time order
+        new_windows, new_results = [], []
+        split_results = iter(split_results)
+        for index, (window, result) in enumerate(zip(windows, results)):
+            if index in halves:
+                new_windows += halves[index]
+                new_results += [next(split_results), next(split_results)]
+            else:
+                new_windows.append(window)
+                new_results.append(result)
+        windows, results = new_windows, new_results
+
+async def query_logs_sliced(
+    log_group_name: str,
+    service_name: str,
+    query_string: str,
+    start_time: Optional[datetime],
+    end_time: Optional[datetime],
+    slices: int,
+    limit: int = 1000
+) -> LogQueryResult:
+    """
+    Run a Logs Insights query as `slices` concurrent sub-window queries and merge them.
+    Aggregate queries with count/sum/min/max/avg are merged per group; other stats
+    queries cannot be split and run as a single query.
+    """
+    # Default to last 24 hours if not specified
+    if not end_time:
+        end_time = datetime.now()
+    if not start_time:
+        start_time = end_time - timedelta(hours=24)
+
+    commands, plan, sliceable = parse_query(query_string)
+
+    if not sliceable or slices <= 1:
+        if not sliceable:
+            logger.info("Query has non-mergeable aggregations, running it unsliced")
+        return await query_logs(
+            log_group_name=log_group_name,
+            service_name=service_name,
+            query_string=query_string,
+            start_time=start_time,
+            end_time=end_time,
+            limit=limit
+        )
+
+    windows = plan_windows(int(start_time.timestamp()), int(end_time.timestamp()), slices)
+
+    # query_logs holds the shared semaphore, so this stays within the concurrency quota
+    if plan:
+        window_query = rewrite_for_slices(commands, plan)
+        window_results = await asyncio.gather(*(
+            run_window(log_group_name, service_name, window_query, window, settings.MAX_LOGS_RESULTS)
+            for window in windows
+        ))
+    else:
+        query_limit = parse_limit(commands)
+        window_limit = min(limit, query_limit) if query_limit is not None else limit
+        window_results = await run_windows(
+            log_group_name, service_name, query_string, windows, window_limit, result_order(commands)
+        )
+
+    statuses = {result.status for result in window_results}
+    status = "Complete" if statuses == {"Complete"} else ", ".join(sorted(statuses))
+
+    return LogQueryResult(
+        service=service_name,
+        log_group_name=log_group_name,
+        query_id=",".join(filter(None, (r.query_id for r in window_results))),
+        results=combine_windows(commands, plan, [r.results for r in window_results], limit),
+        status=status
+    )
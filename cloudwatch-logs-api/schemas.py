@@ -1,4 +1,4 @@
-from typing import List, Dict, Optional, Any, Union
+from typing import List, Dict, Optional, Any, Union, Literal
 from datetime import datetime
 from pydantic import BaseModel, Field
 
@@ -34,6 +34,22 @@ class LogEvent(BaseModel):
     ingestion_time: Optional[int] = None
     log_stream_name: str
 
+class MirrorStatus(BaseModel):
+    log_group_name: str
+    synced_from: Optional[int] = None  # milliseconds, inclusive
+    synced_until: Optional[int] = None  # milliseconds, exclusive
+
+class LatencyPercentiles(BaseModel):
+    service: Optional[str] = None
+    span: Optional[str] = None
+    status: Optional[str] = None
+    count: int
+    min_ms: float
+    max_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
 class LogEventList(BaseModel):
     log_events: List[LogEvent]
     next_token: Optional[str] = None
@@ -46,6 +62,7 @@ class LogsQueryRequest(BaseModel):
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
     limit: Optional[int] = 1000
+    slices: Optional[int] = Field(None, ge=1, le=100, description="Split the time range into this many concurrent sub-queries")
 
 class QueryResultField(BaseModel):
     field: str
@@ -68,14 +85,25 @@ class JoinLogsRequest(BaseModel):
     services: List[str] = Field(..., description="List of service names")
     log_groups: List[str] = Field(..., description="List of log group names corresponding to services")
     query_string: str = Field(..., description="CloudWatch Logs Insights query to run against each log group")
-    join_field: str = Field(..., description="Field to use for joining results across services")
+    join_field: str = Field(..., description="Field to use for joining results across services; comma-separate several fields for a multi-key join")
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
+    join_type: Literal["inner", "left", "full"] = Field("full", description="Keep only matches (inner), every row of the first service (left) or every row (full)")
+    time_window_seconds: Optional[float] = Field(None, ge=0, description="Only match rows whose timestamps are within this many seconds of the first service's row")
+    timestamp_field: str = Field("@timestamp", description="Field holding the row timestamp for time-window joins")
+    output_format: Literal["json", "arrow"] = Field("json", description="Return JSON or an Arrow IPC stream with one column per service field")
     
+class FailedServiceQuery(BaseModel):
+    service: str
+    log_group_name: str
+    error: str
+
 class JoinedLogResults(BaseModel):
     start_time: datetime
     end_time: datetime
     services: List[str]
     join_field: str
     results: List[Dict[str, Any]]
-    count: int
\ No newline at end of file
+    count: int
+    partial: bool = False
+    failed_services: List[FailedServiceQuery] = []
\ No newline at end of file
@@ -0,0 +1,131 @@
+import asyncio
+from unittest.mock import patch
+
+import catalog
+from catalog import LogCatalog
+
+class FakeLogs:
+    def __init__(self, groups, streams, page_size=2):
+        self.groups = groups
+        self.streams = streams
+        self.page_size = page_size
+        self.calls = 0
+
+    def page(self, items, params):
+        self.calls += 1
+        start = int(params.get("nextToken", 0))
+        end = start + min(self.page_size, params["limit"])
+        return items[start:end], str(end) if end < len(items) else None
+
+    async def describe_log_groups(self, **params):
+        items, token = self.page(self.groups, params)
+        response = {"logGroups": [{"logGroupName": name, "arn": f"arn:{name}"} for name in items]}
+        if token:
+            response["nextToken"] = token
+        return response
+
+    async def describe_log_streams(self, **params):
+        if "logStreamNamePrefix" in params:
+            ordered = sorted(s for s in self.streams if s[0].startswith(params["logStreamNamePrefix"]))
+        else:
+            ordered = sorted(self.streams, key=lambda s: s[1], reverse=True)
+        items, token = self.page(ordered, params)
+        response = {"logStreams": [{"logStreamName": name, "lastEventTimestamp": ts} for name, ts in items]}
+        if token:
+            response["nextToken"] = token
+        return response
+
+def run(coro):
+    return asyncio.run(coro)
+
+def names(items):
+    return [item.name for item in items]
+
+def test_log_groups_are_fully_paginated_and_prefix_paged():
+    logs = FakeLogs(["/aws/lambda/orders", "/aws/lambda/users", "/ecs/api", "/aws/lambda/order-worker", "/aws/rds/db"], [])
+    log_catalog = LogCatalog()
+
+    async def scenario():
+        with patch.object(catalog.client_manager, "get_client", return_value=logs):
+            first, token = await log_catalog.list_log_groups(prefix="/aws/lambda/order", limit=1)
+            second, last = await log_catalog.list_log_groups(prefix="/aws/lambda/order", limit=1, next_token=token)
+            everything, _ = await log_catalog.list_log_groups(limit=50)
+            return first, token, second, last, everything
+
+    first, token, second, last, everything = run(scenario())
+
+    assert names(first) == ["/aws/lambda/order-worker"]
+    assert token == "/aws/lambda/order-worker"
+    assert names(second) == ["/aws/lambda/orders"]
+    assert last is None
+    assert len(everything) == 5
+    # Three describe calls to load five groups, none for the later lookups
+    assert logs.calls == 3
+
+@patch.object(catalog, "STREAM_EVENT_LAG_MS", 0)
+@patch.object(catalog.settings, "CATALOG_TTL_SECONDS", 0)
+@patch.object(catalog.settings, "CATALOG_FULL_REFRESH_SECONDS", 3600)
+def test_stale_streams_are_served_while_refreshing_incrementally():
+    logs = FakeLogs([], [("a", 100), ("b", 200), ("c", 300), ("d", 50)])
+    log_catalog = LogCatalog()
+
+    async def scenario():
+        with patch.object(catalog.client_manager, "get_client", return_value=logs):
+            first, token = await log_catalog.list_log_streams("/app", limit=3)
+            await log_catalog.tasks["streams:/app"]
+            logs.streams = [("a", 100), ("b", 200), ("c", 400), ("e", 500), ("d", 50)]
+            logs.calls = 0
+            # Stale: answered from memory, refreshed in the background
+            stale, _ = await log_catalog.list_log_streams("/app", limit=10)
+            await log_catalog.tasks["streams:/app"]
+            fresh, _ = await log_catalog.list_log_streams("/app", limit=10)
+            prefixed, _ = await log_catalog.list_log_streams("/app", prefix="c", limit=10)
+            return first, token, stale, fresh, prefixed
+
+    first, token, stale, fresh, prefixed = run(scenario())
+
+    # The first listing is one page straight from CloudWatch
+    assert names(first) == ["c", "b"]
+    assert token == "cw:2"
+    assert names(stale) == ["c", "b", "a", "d"]
+    assert names(fresh) == ["e", "c", "b", "a", "d"]
+    assert prefixed[0].last_event_timestamp == 400
+    # The incremental refresh stopped at "b" on the second of three pages
+    assert logs.calls == 2
+
+def test_first_listing_is_answered_before_the_crawl_finishes():
+    logs = FakeLogs([], [(f"s{i}", i) for i in range(10)])
+    log_catalog = LogCatalog()
+
+    async def scenario():
+        with patch.object(catalog.client_manager, "get_client", return_value=logs):
+            first, token = await log_catalog.list_log_streams("/app", limit=2)
+            calls_before_crawl = logs.calls
+            second, _ = await log_catalog.list_log_streams("/app", limit=2, next_token=token)
+            await log_catalog.tasks["streams:/app"]
+            indexed, indexed_token = await log_catalog.list_log_streams("/app", limit=2)
+            return first, calls_before_crawl, second, indexed, indexed_token
+
+    first, calls_before_crawl, second, indexed, indexed_token = run(scenario())
+
+    assert calls_before_crawl == 1
+    assert names(first) == ["s9", "s8"]
+    # A CloudWatch token keeps paging through CloudWatch
+    assert names(second) == ["s7", "s6"]
+    assert names(indexed) == ["s9", "s8"]
+    assert indexed_token == "2"
+
+@patch.object(catalog.settings, "CATALOG_MAX_LOG_GROUPS", 2)
+def test_least_recently_listed_stream_indexes_are_evicted():
+    logs = FakeLogs([], [("a", 1)])
+    log_catalog = LogCatalog()
+
+    async def scenario():
+        with patch.object(catalog.client_manager, "get_client", return_value=logs):
+            for group in ["/one", "/two", "/one", "/three"]:
+                await log_catalog.list_log_streams(group, refresh=True)
+
+    run(scenario())
+
+    assert list(log_catalog.streams) == ["/one", "/three"]
+    assert set(log_catalog.streams_refreshed_at) == {"/one", "/three"}
@@ -0,0 +1,116 @@
+import time
+import asyncio
+import pytest
+from unittest.mock import patch
+
+import logs_service
+from join_engine import hash_join
+from schemas import LogQueryResult
+
+def make_fake_query(delays, errors=()):
+    async def fake_query_logs(log_group_name, service_name, **kwargs):
+        await asyncio.sleep(delays.get(service_name, 0.01))
+        if service_name in errors:
+            raise ValueError(f"{service_name} failed")
+        return LogQueryResult(
+            service=service_name,
+            log_group_name=log_group_name,
+            results=[{"requestId": "req-1", "service": service_name}],
+            status="Complete"
+        )
+    return fake_query_logs
+
+def test_join_runs_service_queries_concurrently():
+    services = ["api", "auth", "payment", "orders"]
+    fake = make_fake_query({service: 0.2 for service in services})
+
+    with patch("logs_service.query_logs", side_effect=fake):
+        started = time.perf_counter()
+        results, _, _, failures = asyncio.run(
+            logs_service.join_logs_query(services, [f"/aws/lambda/{s}" for s in services], "q", "requestId")
+        )
+        elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.6
+    assert failures == []
+    assert len(results) == 1
+    assert set(results[0]["services"]) == set(services)
+
+@patch.object(logs_service.settings, "JOIN_QUERY_TIMEOUT_SECONDS", 0.1)
+def test_join_reports_failed_and_timed_out_services():
+    fake = make_fake_query({"slow": 1}, errors={"broken"})
+
+    with patch("logs_service.query_logs", side_effect=fake):
+        results, _, _, failures = asyncio.run(
+            logs_service.join_logs_query(["api", "broken", "slow"], ["g1", "g2", "g3"], "q", "requestId")
+        )
+
+    assert list(results[0]["services"]) == ["api"]
+    assert {f.service: f.error for f in failures} == {"broken": "broken failed", "slow": "Query timed out"}
+
+def test_join_raises_when_every_service_fails():
+    fake = make_fake_query({}, errors={"api", "auth"})
+
+    with patch("logs_service.query_logs", side_effect=fake):
+        with pytest.raises(RuntimeError):
+            asyncio.run(logs_service.join_logs_query(["api", "auth"], ["g1", "g2"], "q", "requestId"))
+
+ORDERS = [
+    {"requestId": "r1", "userId": "u1", "order": "o1"},
+    {"requestId": "r1", "userId": "u1", "order": "o2"},
+    {"requestId": "r2", "userId": "u2", "order": "o3"},
+]
+PAYMENTS = [
+    {"requestId": "r1", "userId": "u1", "payment": "p1"},
+    {"requestId": "r3", "userId": "u3", "payment": "p2"},
+]
+
+def joined_pairs(rows):
+    pairs = [
+        (row["services"].get("orders", {}).get("order"), row["services"].get("payments", {}).get("payment"))
+        for row in rows
+    ]
+    return sorted(pairs, key=str)
+
+@pytest.mark.parametrize("how, expected", [
+    ("inner", [("o1", "p1"), ("o2", "p1")]),
+    ("left", [("o1", "p1"), ("o2", "p1"), ("o3", None)]),
+    ("full", [(None, "p2"), ("o1", "p1"), ("o2", "p1"), ("o3", None)]),
+])
+def test_hash_join_types_keep_one_to_many_matches(how, expected):
+    rows = list(hash_join([("orders", ORDERS), ("payments", PAYMENTS)], ["requestId", "userId"], how=how))
+
+    assert joined_pairs(rows) == sorted(expected, key=str)
+    if how == "inner":
+        assert rows[0]["join_value"] == {"requestId": "r1", "userId": "u1"}
+
+def test_time_window_join_only_matches_nearby_rows():
+    api = [{"correlation_id": "c1", "@timestamp": "2024-03-01 12:00:00.000", "step": "request"}]
+    worker = [
+        {"correlation_id": "c1", "@timestamp": "2024-03-01 12:00:04.500", "step": "near"},
+        {"correlation_id": "c1", "@timestamp": "2024-03-01 12:09:00.000", "step": "far"},
+    ]
+
+    rows = list(hash_join([("api", api), ("worker", worker)], ["correlation_id"], how="inner", window=5))
+
+    assert [row["services"]["worker"]["step"] for row in rows] == ["near"]
+
+def test_full_join_keeps_unmatched_rows_of_both_sides():
+    orders = [{"requestId": f"r{i % 50}", "order": f"o{i}"} for i in range(500)]
+    payments = [{"requestId": f"r{i}", "payment": f"p{i}"} for i in range(0, 80, 2)]
+
+    rows = list(hash_join([("orders", orders), ("payments", payments)], ["requestId"], how="full"))
+
+    # 500 orders, each with at most one payment, plus the 15 payments (r50..r78) without an order
+    assert len(rows) == 500 + 15
+    assert sum("orders" not in row["services"] for row in rows) == 15
+
+def test_join_rejects_output_beyond_max_rows():
+    api = [{"requestId": "hot", "n": i} for i in range(100)]
+    worker = [{"requestId": "hot", "m": i} for i in range(100)]
+
+    with pytest.raises(ValueError, match="requestId='hot'"):
+        list(hash_join([("api", api), ("worker", worker)], ["requestId"], how="inner", max_rows=1000))
+
+    # 10,000 combinations are fine when the limit allows them
+    assert len(list(hash_join([("api", api), ("worker", worker)], ["requestId"], how="inner", max_rows=10000))) == 10000
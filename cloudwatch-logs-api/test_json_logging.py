@@ -0,0 +1,49 @@
+import io
+import json
+import logging
+
+from json_logging import FastJsonFormatter, setup_queue_logging, stop_queue_logging
+
+def make_record(msg, args=(), extra=None, exc_info=None):
+    logger = logging.getLogger("test")
+    return logger.makeRecord("test", logging.ERROR if exc_info else logging.INFO, __file__, 1, msg, args, exc_info, extra=extra)
+
+def test_formatter_writes_static_and_extra_fields():
+    formatter = FastJsonFormatter(static_fields={"service": "user-service"}, level_field="severity")
+    record = make_record("Created %s", ("u1",), extra={"correlation_id": "c-1", "duration_ms": "1.50"})
+
+    line = json.loads(formatter.format(record))
+
+    assert list(line)[:4] == ["timestamp", "severity", "message", "service"]
+    assert line["message"] == "Created u1"
+    assert line["severity"] == "INFO"
+    assert line["correlation_id"] == "c-1"
+    assert line["duration_ms"] == "1.50"
+    assert "args" not in line and "msg" not in line and "created" not in line
+    assert len(line["timestamp"]) == len("2024-03-01T12:00:00.000")
+
+def test_queue_logging_delivers_formatted_records_and_tracebacks():
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(FastJsonFormatter())
+    logger = logging.getLogger("test_queue_logging")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    listener = setup_queue_logging(logger, [handler])
+    items = ["a"]
+    logger.info("Items %s", items, extra={"span": "browse"})
+    # The message is resolved when the call is made, not when the listener runs
+    items.append("b")
+    try:
+        raise ValueError("bad input")
+    except ValueError:
+        logger.exception("Failed")
+    stop_queue_logging(listener)
+    stop_queue_logging(listener)
+
+    first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert first["message"] == "Items ['a']"
+    assert first["span"] == "browse"
+    assert second["level"] == "ERROR"
+    assert "ValueError: bad input" in second["exc_info"]
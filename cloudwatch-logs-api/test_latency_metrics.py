@@ -0,0 +1,103 @@
+import json
+import random
+from unittest.mock import patch
+
+import pytest
+
+import latency_metrics
+from latency_metrics import LatencyMetrics, LatencySketch
+from log_mirror import HOUR_MS, LogMirror
+
+def test_sketch_quantiles_are_within_relative_accuracy_after_merge():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(3, 1) for _ in range(20000)]
+    left, right = LatencySketch(), LatencySketch()
+    for i, value in enumerate(values):
+        (left if i % 2 else right).add(value)
+    left.merge(right)
+
+    ordered = sorted(values)
+    for q in (0.5, 0.95, 0.99):
+        exact = ordered[int(q * (len(ordered) - 1))]
+        assert abs(left.quantile(q) - exact) <= 0.01 * exact
+    assert left.count == len(values)
+    assert len(left.buckets) < 1000
+
+def test_log_file_is_ingested_incrementally(tmp_path):
+    path = tmp_path / "ecommerce.log"
+
+    def line(timestamp, span, duration_ms, **fields):
+        return json.dumps({"timestamp": timestamp, "level": "INFO", "message": f"Completed: {span}",
+                           "span": span, "duration_ms": duration_ms, **fields}) + "\n"
+
+    with open(path, "w") as handle:
+        handle.write(line("2024-03-01T12:00:05.000", "process_payment", "10.00", status="success"))
+        handle.write(line("2024-03-01T12:00:06.000", "process_payment", "0.00"))
+        handle.write(json.dumps({"message": "Starting e-commerce flow simulations"}) + "\n")
+        # Not terminated yet, so left for the next pass
+        handle.write(line("2024-03-01T12:01:10.000", "process_payment", "30.00", status="success").rstrip("\n"))
+
+    metrics = LatencyMetrics(resolution_seconds=60)
+    assert metrics.ingest_file(str(path), "ecommerce") == 1
+
+    with open(path, "a") as handle:
+        handle.write("\n")
+        handle.write(line("2024-03-01T12:01:20.000", "process_payment", "20.00", status="failed"))
+    assert metrics.ingest_file(str(path), "ecommerce") == 2
+    assert metrics.ingest_file(str(path), "ecommerce") == 0
+
+    start = 1709294400  # 2024-03-01T12:00:00Z
+    by_status = metrics.percentiles(start, start + 120)
+    assert [(row["status"], row["count"]) for row in by_status] == [("failed", 1), ("success", 2)]
+    assert by_status[0]["service"] == "ecommerce"
+
+    overall = metrics.percentiles(start, start + 120, group_by=["span"])
+    assert overall == [{
+        "span": "process_payment", "count": 3, "min_ms": 10.0, "max_ms": 30.0,
+        "p50_ms": overall[0]["p50_ms"], "p95_ms": overall[0]["p95_ms"], "p99_ms": overall[0]["p99_ms"]
+    }]
+    assert abs(overall[0]["p50_ms"] - 20) <= 0.2
+
+    # Only the first minute
+    first_minute = metrics.percentiles(start, start + 59, group_by=[])
+    assert first_minute[0]["count"] == 1
+
+def test_spans_are_bucketed_by_their_end_time(tmp_path):
+    path = tmp_path / "ecommerce.log"
+    with open(path, "w") as handle:
+        # Flushed at 12:05 together, but the spans ended in two different minutes
+        for span_end, duration_ms in (("2024-03-01T12:00:30.000", "10.00"), ("2024-03-01T12:01:30.000", "20.00")):
+            handle.write(json.dumps({"timestamp": "2024-03-01T12:05:00.000", "span": "checkout",
+                                     "span_end": span_end, "duration_ms": duration_ms}) + "\n")
+
+    metrics = LatencyMetrics(resolution_seconds=60)
+    assert metrics.ingest_file(str(path), "ecommerce") == 2
+
+    start = 1709294400  # 2024-03-01T12:00:00Z
+    assert metrics.percentiles(start, start + 59, group_by=[])[0]["max_ms"] == 10.0
+    assert metrics.percentiles(start + 60, start + 119, group_by=[])[0]["max_ms"] == 20.0
+    assert metrics.percentiles(start + 300, start + 359, group_by=[]) == []
+
+def test_compacted_mirror_hours_are_not_counted_twice(tmp_path):
+    pytest.importorskip("pyarrow")
+    mirror = LogMirror(str(tmp_path))
+    group = "/aws/lambda/checkout"
+    hour = 1709294400 * 1000  # 2024-03-01T12:00:00Z
+
+    def add_part(offset_ms, duration_ms):
+        event = {"timestamp": hour + offset_ms, "ingestion_time": hour + offset_ms, "log_stream_name": "s",
+                 "message": json.dumps({"span": "checkout", "duration_ms": duration_ms}),
+                 "correlation_id": None, "level": None}
+        mirror.commit_files(group, mirror.write_events(group, [event]), {"synced_from": hour, "synced_until": hour})
+
+    metrics = LatencyMetrics(resolution_seconds=60)
+    with patch.object(latency_metrics, "log_mirror", mirror):
+        add_part(1000, "10.00")
+        assert metrics.ingest_mirror(group) == 1
+        # Written after the last ingest, then merged with the part that was already read
+        add_part(2000, "20.00")
+        assert mirror.compact_closed_hours(group, hour + HOUR_MS) == 1
+        assert metrics.ingest_mirror(group) == 1
+        assert metrics.ingest_mirror(group) == 0
+
+    assert metrics.percentiles(hour // 1000, hour // 1000 + 59, group_by=[])[0]["count"] == 2
@@ -27,43 +27,44 @@ def mock_log_groups():
         )
     ]
 
-@patch("app.services.logs_service.get_log_groups")
+@patch("log_groups.log_catalog.list_log_groups")
 def test_list_log_groups(mock_get_log_groups, mock_log_groups):
     # Setup mock
-    mock_get_log_groups.return_value = mock_log_groups
+    mock_get_log_groups.return_value = (mock_log_groups, None)
     
     # Make request
     response = client.get("/api/log-groups")
     
     # Check response
     assert response.status_code == 200
-    data = response.json()
+    data = response.json()["log_groups"]
     assert len(data) == 2
     assert data[0]["name"] == "/aws/lambda/service1"
     assert data[1]["name"] == "/aws/lambda/service2"
+    assert response.json()["next_token"] is None
     
     # Verify mock was called correctly
-    mock_get_log_groups.assert_called_once_with(prefix=None, limit=50)
+    mock_get_log_groups.assert_called_once_with(prefix=None, limit=50, next_token=None, refresh=False)
 
-@patch("app.services.logs_service.get_log_groups")
+@patch("log_groups.log_catalog.list_log_groups")
 def test_list_log_groups_with_prefix(mock_get_log_groups, mock_log_groups):
     # Setup mock with filtered data
     filtered_groups = [group for group in mock_log_groups if "service1" in group.name]
-    mock_get_log_groups.return_value = filtered_groups
+    mock_get_log_groups.return_value = (filtered_groups, None)
     
     # Make request
     response = client.get("/api/log-groups?prefix=/aws/lambda/service1")
     
     # Check response
     assert response.status_code == 200
-    data = response.json()
+    data = response.json()["log_groups"]
     assert len(data) == 1
     assert data[0]["name"] == "/aws/lambda/service1"
     
     # Verify mock was called correctly
-    mock_get_log_groups.assert_called_once_with(prefix="/aws/lambda/service1", limit=50)
+    mock_get_log_groups.assert_called_once_with(prefix="/aws/lambda/service1", limit=50, next_token=None, refresh=False)
 
-@patch("app.services.logs_service.get_log_groups")
+@patch("log_groups.log_catalog.list_log_groups")
 def test_list_log_groups_error(mock_get_log_groups):
     # Setup mock to raise exception
     mock_get_log_groups.side_effect = Exception("AWS API error")
@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import patch
+
+import query_cache
+from query_cache import MemoryCacheBackend, QueryResultCache, bucket_windows, cached_query_logs, normalize_query
+from schemas import LogQueryResult
+
+def test_normalize_query_ignores_whitespace_but_not_literals():
+    assert normalize_query("fields  @message\n|filter @message like 'a  b'  | ") == "fields @message | filter @message like 'a  b'"
+
+def test_bucket_windows_align_interior_windows():
+    assert bucket_windows(3500, 11000, 3600) == [(3500, 3599), (3600, 7199), (7200, 10799), (10800, 11000)]
+
+def test_memory_backend_evicts_least_recently_used_by_size():
+    backend = MemoryCacheBackend(max_bytes=10)
+
+    async def run():
+        await backend.set("a", b"12345", None)
+        await backend.set("b", b"12345", None)
+        await backend.get("a")
+        await backend.set("c", b"12345", None)
+        return [await backend.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(run()) == [b"12345", None, b"12345"]
+
+def test_closed_windows_are_reused_across_refreshes():
+    calls = []
+
+    async def fake_query_logs(log_group_name, service_name, query_string, start_time, end_time, limit):
+        calls.append(int(start_time.timestamp()))
+        return LogQueryResult(
+            service=service_name,
+            log_group_name=log_group_name,
+            query_id=f"q-{len(calls)}",
+            results=[{"__sum_0": "10", "__count_0": "2", "service": "api"}],
+            status="Complete"
+        )
+
+    cache = QueryResultCache(MemoryCacheBackend(max_bytes=1024 * 1024))
+    query = "stats avg(duration) as mean by service"
+
+    with patch.object(query_cache, "query_logs", fake_query_logs), \
+         patch.object(query_cache, "query_cache", cache), \
+         patch.object(query_cache.settings, "QUERY_CACHE_ENABLED", True), \
+         patch.object(query_cache.settings, "QUERY_CACHE_BUCKET_SECONDS", 3600):
+        # First sighting: one query over the whole range, no buckets
+        asyncio.run(cached_query_logs("/aws/api", "api", query, datetime.fromtimestamp(1800), datetime.fromtimestamp(9000)))
+        assert calls == [1800]
+        calls.clear()
+        second = asyncio.run(cached_query_logs("/aws/api", "api", query, datetime.fromtimestamp(1800), datetime.fromtimestamp(9000)))
+        assert calls == [1800, 3600, 7200]
+        calls.clear()
+        # Same range plus a few minutes: only the changed edges are queried again
+        asyncio.run(cached_query_logs("/aws/api", "api", query, datetime.fromtimestamp(1800), datetime.fromtimestamp(9300)))
+
+    assert second.results == [{"service": "api", "mean": "5"}]
+    assert calls == [7200]
+
+def test_bucketed_query_keeps_its_own_limit():
+    async def fake_query_logs(log_group_name, service_name, query_string, start_time, end_time, limit):
+        rows = [{"@timestamp": f"{int(start_time.timestamp()):06d}-{i:02d}"} for i in range(20)]
+        return LogQueryResult(service=service_name, log_group_name=log_group_name, results=rows, status="Complete")
+
+    cache = QueryResultCache(MemoryCacheBackend(max_bytes=1024 * 1024))
+    query = "fields @timestamp, @message | limit 20"
+
+    with patch.object(query_cache, "query_logs", fake_query_logs), \
+         patch.object(query_cache, "query_cache", cache), \
+         patch.object(query_cache.settings, "QUERY_CACHE_ENABLED", True), \
+         patch.object(query_cache.settings, "QUERY_CACHE_BUCKET_SECONDS", 3600):
+        for _ in range(2):
+            result = asyncio.run(cached_query_logs("/aws/api", "api", query, datetime.fromtimestamp(0), datetime.fromtimestamp(86399)))
+
+    assert len(result.results) == 20
+    assert result.results[0]["@timestamp"] == "082800-19"
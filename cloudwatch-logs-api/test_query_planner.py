@@ -0,0 +1,147 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import patch
+
+import query_planner
+from query_planner import parse_query, rewrite_for_slices, merge_aggregates, plan_windows
+from schemas import LogQueryResult
+
+def test_plan_windows_cover_range_without_overlap():
+    windows = plan_windows(1000, 1000 + 3600 - 1, 4)
+
+    assert len(windows) == 4
+    assert windows[0][0] == 1000
+    assert windows[-1][1] == 1000 + 3600 - 1
+    for (_, previous_end), (next_start, _) in zip(windows, windows[1:]):
+        assert next_start == previous_end + 1
+
+def test_rewrite_splits_avg_into_sum_and_count():
+    commands, plan, sliceable = parse_query(
+        'filter level = "ERROR" | stats count(*) as errors, avg(duration) as avgDuration by service | sort errors desc | limit 5'
+    )
+
+    assert sliceable
+    assert plan.group_fields == ["service"]
+    assert plan.sort == ("errors", True)
+    assert plan.limit == 5
+    assert rewrite_for_slices(commands, plan) == (
+        'filter level = "ERROR" | stats count(*) as errors, sum(duration) as __sum_1, '
+        'count(duration) as __count_1 by service'
+    )
+
+def test_non_mergeable_aggregations_are_not_sliced():
+    _, plan, sliceable = parse_query("stats pct(duration, 99) by service")
+
+    assert plan is None
+    assert not sliceable
+
+def test_merge_aggregates_combines_windows_per_group():
+    _, plan, _ = parse_query("stats count(*) as errors, max(duration) as slowest, avg(duration) as mean by service | sort errors desc")
+    windows = [
+        [{"service": "api", "errors": "2", "slowest": "10", "__sum_2": "12", "__count_2": "2"}],
+        [
+            {"service": "api", "errors": "3", "slowest": "40", "__sum_2": "48", "__count_2": "3"},
+            {"service": "auth", "errors": "1", "slowest": "5", "__sum_2": "5", "__count_2": "1"},
+        ],
+    ]
+
+    assert merge_aggregates(windows, plan) == [
+        {"service": "api", "errors": "5", "slowest": "40", "mean": "12"},
+        {"service": "auth", "errors": "1", "slowest": "5", "mean": "5"},
+    ]
+
+@patch.object(query_planner.settings, "MAX_LOGS_RESULTS", 2)
+def test_saturated_windows_are_subdivided():
+    calls = []
+
+    async def fake_query_logs(log_group_name, service_name, query_string, start_time, end_time, limit):
+        calls.append((start_time, end_time))
+        count = 2 if len(calls) == 1 else 1
+        rows = [{"@timestamp": f"{start_time.isoformat()}-{i}"} for i in range(count)]
+        return LogQueryResult(service=service_name, log_group_name=log_group_name, results=rows, status="Complete")
+
+    with patch("query_planner.query_logs", side_effect=fake_query_logs):
+        result = asyncio.run(query_planner.query_logs_sliced(
+            log_group_name="/aws/lambda/api",
+            service_name="api",
+            query_string="fields @timestamp, @message",
+            start_time=datetime.fromtimestamp(0),
+            end_time=datetime.fromtimestamp(599),
+            slices=2,
+            limit=100
+        ))
+
+    # First window saturated and was split in two; the second window ran once
+    assert len(calls) == 4
+    assert result.status == "Complete"
+    assert len(result.results) == 3
+
+def test_min_max_merge_timestamps_as_text():
+    _, plan, _ = parse_query("stats max(@timestamp) as m, min(@timestamp) as first, count(*) as c")
+    windows = [
+        [{"m": "2024-03-01 12:00:05.000", "first": "2024-03-01 12:00:00.000", "c": "5"}],
+        [{"m": "2024-03-01 12:09:59.000", "first": "2024-03-01 12:05:00.000", "c": "7"}],
+    ]
+
+    assert merge_aggregates(windows, plan) == [
+        {"m": "2024-03-01 12:09:59.000", "first": "2024-03-01 12:00:00.000", "c": "12"}
+    ]
+
+def test_sliced_query_keeps_its_own_limit():
+    async def fake_query_logs(log_group_name, service_name, query_string, start_time, end_time, limit):
+        rows = [{"@timestamp": f"{start_time.isoformat()}-{i:02d}"} for i in range(20)]
+        return LogQueryResult(service=service_name, log_group_name=log_group_name, results=rows, status="Complete")
+
+    with patch("query_planner.query_logs", side_effect=fake_query_logs):
+        result = asyncio.run(query_planner.query_logs_sliced(
+            log_group_name="/aws/lambda/api",
+            service_name="api",
+            query_string="fields @timestamp, @message | limit 20",
+            start_time=datetime.fromtimestamp(0),
+            end_time=datetime.fromtimestamp(3599),
+            slices=4
+        ))
+
+    assert len(result.results) == 20
+    # Newest first across all windows
+    assert result.results[0]["@timestamp"] == datetime.fromtimestamp(2700).isoformat() + "-19"
+
+def full_windows(calls):
+    async def fake_query_logs(log_group_name, service_name, query_string, start_time, end_time, limit):
+        calls.append((int(start_time.timestamp()), int(end_time.timestamp())))
+        rows = [{"@timestamp": f"{start_time.isoformat()}-{i:04d}"} for i in range(min(limit, query_planner.settings.MAX_LOGS_RESULTS))]
+        return LogQueryResult(service=service_name, log_group_name=log_group_name, results=rows, status="Complete")
+    return fake_query_logs
+
+def run_sliced(calls, limit):
+    with patch("query_planner.query_logs", side_effect=full_windows(calls)):
+        return asyncio.run(query_planner.query_logs_sliced(
+            log_group_name="/aws/lambda/api",
+            service_name="api",
+            query_string="fields @timestamp, @message",
+            start_time=datetime.fromtimestamp(0),
+            end_time=datetime.fromtimestamp(86399),
+            slices=4,
+            limit=limit
+        ))
+
+@patch.object(query_planner.settings, "MAX_LOGS_RESULTS", 1000)
+def test_windows_are_not_split_when_one_query_covers_the_limit():
+    calls = []
+    result = run_sliced(calls, limit=1000)
+
+    # One query per slice: splitting could only add rows beyond the limit
+    assert len(calls) == 4
+    assert len(result.results) == 1000
+
+@patch.object(query_planner.settings, "MAX_LOGS_RESULTS", 10)
+def test_newest_windows_are_split_first_until_the_limit_is_covered():
+    calls = []
+    result = run_sliced(calls, limit=25)
+
+    # Every window is saturated, so only the newest one keeps being split, down to the
+    # smallest windows; three of those hold 25 rows and the older slices are never touched again
+    newest = 3 * 21600
+    assert all(start >= newest for start, _ in calls[4:])
+    assert len(calls) == 22
+    assert len(result.results) == 25
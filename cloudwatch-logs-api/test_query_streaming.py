@@ -0,0 +1,77 @@
+import time
+import asyncio
+from unittest.mock import patch
+
+import logs_service
+from logs_service import RateLimiter, iter_query_results, next_poll_interval
+from logs import stream_query_events
+
+def row(ptr, message):
+    return [{"field": "@ptr", "value": ptr}, {"field": "@message", "value": message}]
+
+class FakeLogs:
+    def __init__(self, responses):
+        self.responses = responses
+        self.polls = 0
+        self.stopped = []
+
+    async def start_query(self, **kwargs):
+        return {"queryId": "q-1"}
+
+    async def get_query_results(self, queryId):
+        response = self.responses[min(self.polls, len(self.responses) - 1)]
+        self.polls += 1
+        return response
+
+    async def stop_query(self, queryId):
+        self.stopped.append(queryId)
+
+def collect(generator):
+    async def run():
+        return [item async for item in generator]
+    return asyncio.run(run())
+
+@patch.object(logs_service.settings, "QUERY_POLL_MAX_SECONDS", 8)
+def test_poll_interval_backs_off_and_never_resets():
+    assert next_poll_interval(1, progressed=False) == 2
+    assert next_poll_interval(4, progressed=False) == 8
+    assert next_poll_interval(8, progressed=False) == 8
+    assert next_poll_interval(8, progressed=True) == 8
+
+def test_rate_limiter_spaces_every_caller():
+    limiter = RateLimiter(20)
+
+    async def run():
+        start = time.monotonic()
+        await asyncio.gather(*(limiter.wait() for _ in range(5)))
+        return time.monotonic() - start
+
+    # Five callers at 20 per second: the last one waits four intervals
+    assert asyncio.run(run()) >= 0.19
+
+@patch.object(logs_service.settings, "QUERY_POLL_INITIAL_SECONDS", 0.001)
+@patch.object(logs_service.settings, "QUERY_POLL_MAX_SECONDS", 0.001)
+@patch.object(logs_service, "poll_rate_limiter", RateLimiter(1000))
+def test_partial_rows_are_streamed_once():
+    fake = FakeLogs([
+        {"status": "Running", "statistics": {"recordsScanned": 10}, "results": [row("a", "first")]},
+        {"status": "Running", "statistics": {"recordsScanned": 10}, "results": [row("a", "first")]},
+        {"status": "Complete", "statistics": {"recordsScanned": 20}, "results": [row("a", "first"), row("b", "second")]},
+    ])
+
+    async def get_client(name):
+        return fake
+
+    with patch.object(logs_service.client_manager, "get_client", get_client):
+        snapshots = collect(iter_query_results("/aws/api", "fields @message"))
+        fake.polls = 0
+        events = collect(stream_query_events(iter_query_results("/aws/api", "fields @message")))
+
+    # The unchanged second poll produces no snapshot
+    assert [s["status"] for s in snapshots] == ["Running", "Complete"]
+    assert snapshots[-1]["results"][1] == {"@ptr": "b", "@message": "second"}
+
+    names = [event.split(b"\n")[0] for event in events]
+    assert names == [b"event: progress", b"event: rows", b"event: progress", b"event: rows", b"event: complete"]
+    assert b'"@ptr":"a"' not in events[3]
+    assert fake.stopped == []
@@ -1,12 +1,18 @@
 # main.py
+import io
 import os
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Any
+import re
+import time
+import random
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Optional, Any, Literal
 
 import boto3
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
@@ -28,6 +34,30 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # Initialize CloudWatch Logs client
 logs_client = boto3.client('logs')
 
+# Logs Insights allows a limited number of concurrent queries per account and region
+MAX_CONCURRENT_QUERIES = int(os.getenv("MAX_CONCURRENT_QUERIES", "10"))
+JOIN_QUERY_TIMEOUT_SECONDS = int(os.getenv("JOIN_QUERY_TIMEOUT_SECONDS", "60"))
+query_semaphore = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
+
+# Keep the poll interval while a query makes progress and back off exponentially while it does not
+QUERY_POLL_INITIAL_SECONDS = float(os.getenv("QUERY_POLL_INITIAL_SECONDS", "1"))
+QUERY_POLL_MAX_SECONDS = float(os.getenv("QUERY_POLL_MAX_SECONDS", "5"))
+# GetQueryResults calls per second across all pollers (account quota is 5)
+QUERY_POLL_RATE_PER_SECOND = float(os.getenv("QUERY_POLL_RATE_PER_SECOND", "4"))
+
+# Rows per Arrow record batch / Parquet row group in export responses
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "10000"))
+
+# Compression codecs each export format supports
+EXPORT_COMPRESSION = {
+    "parquet": ("zstd", "gzip", "snappy", "none"),
+    "arrow": ("zstd", "lz4", "none"),
+}
+EXPORT_MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
 # Define models
 class LogGroup(BaseModel):
     name: str
@@ -48,11 +78,18 @@ class LogQueryResult(BaseModel):
     logGroupName: str
     results: List[Dict[str, Any]]
 
+class FailedServiceQuery(BaseModel):
+    service: str
+    logGroupName: str
+    error: str
+
 class JoinedLogResults(BaseModel):
     startTime: datetime
     endTime: datetime
     services: List[str]
     results: List[Dict[str, Any]]
+    partial: bool = False
+    failedServices: List[FailedServiceQuery] = []
 
 @app.get("/", include_in_schema=False)
 async def root():
@@ -153,6 +190,69 @@ async def get_logs(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching logs: {str(e)}")
 
+class RateLimiter:
+    """Spaces calls at least 1 / rate seconds apart across every thread"""
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+# Shared by the worker threads polling queries
+poll_rate_limiter = RateLimiter(QUERY_POLL_RATE_PER_SECOND)
+
+def run_insights_query(log_group_name, query_string, start_timestamp, end_timestamp, limit, timeout=None):
+    """Start a Logs Insights query and poll it to completion (blocking; run in a thread)"""
+    start_query_response = logs_client.start_query(
+        logGroupName=log_group_name,
+        startTime=start_timestamp,
+        endTime=end_timestamp,
+        queryString=query_string,
+        limit=limit
+    )
+    
+    query_id = start_query_response['queryId']
+    deadline = time.monotonic() + timeout if timeout else None
+    
+    # Poll for results
+    response = None
+    interval = QUERY_POLL_INITIAL_SECONDS
+    records_scanned = None
+    while response is None or response['status'] in ('Scheduled', 'Running'):
+        if deadline and time.monotonic() > deadline:
+            # Free the Insights slot instead of letting an abandoned query run on
+            logs_client.stop_query(queryId=query_id)
+            raise TimeoutError(f"Query timed out after {timeout}s")
+        poll_rate_limiter.wait()
+        response = logs_client.get_query_results(
+            queryId=query_id
+        )
+        if response['status'] in ('Scheduled', 'Running'):
+            scanned = response.get('statistics', {}).get('recordsScanned')
+            if scanned == records_scanned:
+                interval = min(interval * 2, QUERY_POLL_MAX_SECONDS)
+            records_scanned = scanned
+            # Jittered wait, never shorter than the interval; this runs in a worker thread,
+            # so sleeping does not block the event loop
+            time.sleep(random.uniform(interval, interval * 1.5))
+    
+    # Format results
+    results = []
+    for result in response['results']:
+        result_dict = {}
+        for field in result:
+            result_dict[field['field']] = field['value']
+        results.append(result_dict)
+    
+    return results
+
 @app.get("/api/query", response_model=LogQueryResult)
 async def query_logs(
     log_group_name: str,
@@ -174,35 +274,16 @@ async def query_logs(
         start_timestamp = int(start_time.timestamp())
         end_timestamp = int(end_time.timestamp())
         
-        # Start the query
-        start_query_response = logs_client.start_query(
-            logGroupName=log_group_name,
-            startTime=start_timestamp,
-            endTime=end_timestamp,
-            queryString=query_string,
-            limit=limit
-        )
-        
-        query_id = start_query_response['queryId']
-        
-        # Poll for results
-        response = None
-        while response is None or response['status'] == 'Running':
-            response = logs_client.get_query_results(
-                queryId=query_id
+        # Run the blocking boto3 calls in a worker thread so the event loop stays free
+        async with query_semaphore:
+            results = await asyncio.to_thread(
+                run_insights_query,
+                log_group_name,
+                query_string,
+                start_timestamp,
+                end_timestamp,
+                limit
             )
-            if response['status'] == 'Running':
-                # Wait a bit before checking again
-                import time
-                time.sleep(1)
-        
-        # Format results
-        results = []
-        for result in response['results']:
-            result_dict = {}
-            for field in result:
-                result_dict[field['field']] = field['value']
-            results.append(result_dict)
         
         return LogQueryResult(
             service=service_name,
@@ -212,6 +293,82 @@ async def query_logs(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error querying logs: {str(e)}")
 
+async def run_join_query(services, log_groups, query_string, join_field, start_time, end_time) -> JoinedLogResults:
+    """Run the same query against every log group concurrently and join the results on join_field"""
+    if len(services) != len(log_groups):
+        raise HTTPException(
+            status_code=400, 
+            detail="Number of services must match number of log groups"
+        )
+    
+    # Default to last 24 hours if not specified
+    if not end_time:
+        end_time = datetime.now()
+    if not start_time:
+        start_time = end_time - timedelta(hours=24)
+    
+    start_timestamp = int(start_time.timestamp())
+    end_timestamp = int(end_time.timestamp())
+    
+    async def run_service_query(service, log_group):
+        async with query_semaphore:
+            results = await asyncio.to_thread(
+                run_insights_query,
+                log_group,
+                query_string,
+                start_timestamp,
+                end_timestamp,
+                1000,
+                JOIN_QUERY_TIMEOUT_SECONDS
+            )
+        return LogQueryResult(service=service, logGroupName=log_group, results=results)
+    
+    # Query each service's logs concurrently, keeping partial results on failure
+    outcomes = await asyncio.gather(
+        *(run_service_query(service, log_group) for service, log_group in zip(services, log_groups)),
+        return_exceptions=True
+    )
+    
+    query_results = []
+    failures = []
+    for service, log_group, outcome in zip(services, log_groups, outcomes):
+        if isinstance(outcome, BaseException):
+            failures.append(FailedServiceQuery(service=service, logGroupName=log_group, error=str(outcome)))
+        else:
+            query_results.append(outcome)
+    
+    if not query_results and failures:
+        raise RuntimeError(f"All service queries failed: {failures[0].error}")
+    
+    # Join results based on the join field
+    joined_data = {}
+    for service_result in query_results:
+        service = service_result.service
+        for result in service_result.results:
+            if join_field in result:
+                join_value = result[join_field]
+                
+                if join_value not in joined_data:
+                    joined_data[join_value] = {
+                        "join_value": join_value,
+                        "services": {}
+                    }
+                
+                # Add service-specific data
+                joined_data[join_value]["services"][service] = result
+    
+    # Convert to list of results
+    final_results = list(joined_data.values())
+    
+    return JoinedLogResults(
+        startTime=start_time,
+        endTime=end_time,
+        services=services,
+        results=final_results,
+        partial=bool(failures),
+        failedServices=failures
+    )
+
 @app.get("/api/join-query", response_model=JoinedLogResults)
 async def join_logs_query(
     services: List[str] = Query(..., description="List of service names"),
@@ -223,60 +380,255 @@ async def join_logs_query(
 ):
     """Run the same query against multiple log groups and join the results"""
     try:
-        if len(services) != len(log_groups):
-            raise HTTPException(
-                status_code=400, 
-                detail="Number of services must match number of log groups"
-            )
-        
-        # Default to last 24 hours if not specified
-        if not end_time:
-            end_time = datetime.now()
-        if not start_time:
-            start_time = end_time - timedelta(hours=24)
-        
-        # Query each service's logs
-        query_results = []
-        for service, log_group in zip(services, log_groups):
-            result = await query_logs(
-                log_group_name=log_group,
-                service_name=service,
-                query_string=query_string,
-                start_time=start_time,
-                end_time=end_time
-            )
-            query_results.append(result)
-        
-        # Join results based on the join field
-        joined_data = {}
-        for service_result in query_results:
-            service = service_result.service
-            for result in service_result.results:
-                if join_field in result:
-                    join_value = result[join_field]
-                    
-                    if join_value not in joined_data:
-                        joined_data[join_value] = {
-                            "join_value": join_value,
-                            "services": {}
-                        }
-                    
-                    # Add service-specific data
-                    joined_data[join_value]["services"][service] = result
-        
-        # Convert to list of results
-        final_results = list(joined_data.values())
-        
-        return JoinedLogResults(
-            startTime=start_time,
-            endTime=end_time,
-            services=services,
-            results=final_results
+        return await run_join_query(services, log_groups, query_string, join_field, start_time, end_time)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error joining log data: {str(e)}")
+
+# Columnar export for Power BI
+INTEGER_PATTERN = re.compile(r"^-?(0|[1-9][0-9]*)$")
+# Decimal notation with a fraction or an exponent: float() would also take "1_000", "nan" and "inf"
+FLOAT_PATTERN = re.compile(r"^-?([0-9]+\.[0-9]*|\.[0-9]+|[0-9]+(?=[eE]))([eE][+-]?[0-9]+)?$")
+LEADING_ZERO_PATTERN = re.compile(r"^-?0[0-9]")
+TIMESTAMP_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(\.\d+)?(Z|[+-]\d{2}:\d{2})?$")
+
+def parse_insights_timestamp(value: str) -> datetime:
+    """'2024-03-01 12:00:00.000' (UTC, as Logs Insights returns @timestamp) or ISO 8601"""
+    parsed = datetime.fromisoformat(value.replace(" ", "T", 1).replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def integer_fits(value: str, bits: int) -> bool:
+    """Whether an INTEGER_PATTERN string lies in [-2**bits, 2**bits) (int64: 63, exact in float64: 53)"""
+    # The length check keeps int() away from arbitrarily long digit strings
+    return len(value.lstrip("-")) <= 19 and -2 ** bits <= int(value) < 2 ** bits
+
+def infer_column(values: List[Optional[str]]):
+    """
+    Arrow array of the narrowest type every non-empty value parses as:
+    int64, float64, bool, timestamp (ms, UTC) or string. Integers with leading
+    zeros (IDs, postcodes) and integers that would lose digits (outside int64, or
+    beyond 2**53 next to decimals) stay strings.
+    """
+    import pyarrow as pa
+
+    present = [value for value in values if value not in (None, "")]
+    if not present or not all(isinstance(value, str) for value in present):
+        return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+    def convert(parse, arrow_type):
+        return pa.array([parse(value) if value not in (None, "") else None for value in values], type=arrow_type)
+
+    numeric = not any(LEADING_ZERO_PATTERN.match(value) for value in present)
+    integers = [value for value in present if INTEGER_PATTERN.match(value)]
+    if numeric and len(integers) == len(present) and all(integer_fits(value, 63) for value in integers):
+        return convert(int, pa.int64())
+    # float64 only when some value has a fraction or exponent, and every integer stays exact
+    if numeric and all(INTEGER_PATTERN.match(value) or FLOAT_PATTERN.match(value) for value in present) \
+            and all(integer_fits(value, 53) for value in integers):
+        return convert(float, pa.float64())
+    if all(value.lower() in ("true", "false") for value in present):
+        return convert(lambda value: value.lower() == "true", pa.bool_())
+    if all(TIMESTAMP_PATTERN.match(value) for value in present):
+        return convert(parse_insights_timestamp, pa.timestamp("ms", tz="UTC"))
+    return pa.array(values, type=pa.string())
+
+def rows_to_table(rows: List[Dict[str, Any]], metadata: Dict[str, str]):
+    """Columnar table with one typed column per field seen in any row, in first-seen order"""
+    import pyarrow as pa
+
+    fields = {}
+    for row in rows:
+        for field in row:
+            fields.setdefault(field, None)
+    columns = {field: infer_column([row.get(field) for row in rows]) for field in fields}
+    return pa.table(columns, metadata=metadata)
+
+def flatten_joined_rows(results: List[Dict[str, Any]], join_field: str) -> List[Dict[str, Any]]:
+    """One flat row per join value: the join field, then a `service.field` column per service field"""
+    rows = []
+    for joined in results:
+        row = {join_field: joined["join_value"]}
+        for service, service_row in joined["services"].items():
+            for field, value in service_row.items():
+                row[f"{service}.{field}"] = value
+        rows.append(row)
+    return rows
+
+def row_timestamp(row: Dict[str, Any], timestamp_fields: List[str]) -> Optional[int]:
+    """Newest of the row's timestamp fields in epoch milliseconds, if it has any"""
+    timestamps = []
+    for field in timestamp_fields:
+        value = row.get(field)
+        if value:
+            try:
+                timestamps.append(int(parse_insights_timestamp(value).timestamp() * 1000))
+            except ValueError:
+                pass
+    return max(timestamps) if timestamps else None
+
+def apply_watermark(rows: List[Dict[str, Any]], timestamp_fields: List[str], since: Optional[int]):
+    """
+    Keep the rows newer than `since` and return them with the new watermark:
+    the newest row timestamp, or `since` when nothing newer arrived. Rows
+    without a timestamp are always kept.
+    """
+    kept = []
+    watermark = since
+    for row in rows:
+        timestamp = row_timestamp(row, timestamp_fields)
+        if timestamp is None:
+            kept.append(row)
+            continue
+        if since is not None and timestamp <= since:
+            continue
+        kept.append(row)
+        watermark = timestamp if watermark is None else max(watermark, timestamp)
+    return kept, watermark
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file that collects what the writer produced since the last drain"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def iter_export(table, export_format: str, compression: str):
+    """Serialize the table batch by batch, yielding the bytes of each batch as soon as it is written"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    codec = None if compression == "none" else compression
+    sink = ChunkSink()
+    if export_format == "parquet":
+        writer = pq.ParquetWriter(sink, table.schema, compression=codec or "none")
+        write_batch = lambda batch: writer.write_table(pa.Table.from_batches([batch], schema=table.schema))
+    else:
+        writer = pa.ipc.new_stream(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression=codec))
+        write_batch = writer.write_batch
+
+    for batch in table.to_batches(max_chunksize=EXPORT_BATCH_ROWS):
+        write_batch(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+def export_response(rows: List[Dict[str, Any]], export_format: str, compression: str, since: Optional[int],
+                    timestamp_fields: List[str], filename: str, metadata: Dict[str, str]):
+    if compression not in EXPORT_COMPRESSION[export_format]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{export_format} supports compression {', '.join(EXPORT_COMPRESSION[export_format])}"
         )
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Columnar export requires pyarrow")
+
+    rows, watermark = apply_watermark(rows, timestamp_fields, since)
+    watermark = "" if watermark is None else str(watermark)
+    table = rows_to_table(rows, {**metadata, "watermark": watermark})
+
+    extension = "parquet" if export_format == "parquet" else "arrows"
+    return StreamingResponse(
+        iter_export(table, export_format, compression),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{extension}"',
+            "X-Watermark": watermark,
+            "X-Row-Count": str(table.num_rows)
+        }
+    )
+
+def watermark_start(start_time: Optional[datetime], since: Optional[int]) -> Optional[datetime]:
+    """Start the query no earlier than the second of the watermark; finer filtering happens on @timestamp"""
+    if since is None:
+        return start_time
+    since_time = datetime.fromtimestamp(since // 1000, tz=timezone.utc)
+    if start_time is None:
+        return since_time
+    # Naive query parameters are local time, as .timestamp() reads them
+    start_time = start_time.astimezone(timezone.utc)
+    return max(since_time, start_time)
+
+@app.get("/api/export/query")
+async def export_query(
+    log_group_name: str,
+    service_name: str,
+    query_string: str,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    limit: int = 10000,
+    since: Optional[int] = Query(None, description="Watermark from the previous refresh (X-Watermark, epoch ms): only rows with a newer @timestamp"),
+    format: Literal["parquet", "arrow"] = Query("parquet", description="Parquet file or Arrow IPC stream"),
+    compression: str = Query("zstd", description="zstd, gzip, snappy or none for Parquet; zstd, lz4 or none for Arrow")
+):
+    """
+    Run a Logs Insights query and return the results as a typed Parquet file or
+    Arrow IPC stream. Include @timestamp in the query for incremental refresh.
+    """
+    result = await query_logs(
+        log_group_name=log_group_name,
+        service_name=service_name,
+        query_string=query_string,
+        start_time=watermark_start(start_time, since),
+        end_time=end_time,
+        limit=limit
+    )
+    return export_response(
+        result.results, format, compression, since,
+        timestamp_fields=["@timestamp"],
+        filename=service_name,
+        metadata={"service": service_name, "log_group_name": log_group_name}
+    )
+
+@app.get("/api/export/join-query")
+async def export_join_query(
+    services: List[str] = Query(..., description="List of service names"),
+    log_groups: List[str] = Query(..., description="List of log group names corresponding to services"),
+    query_string: str = Query(..., description="CloudWatch Logs Insights query to run against each log group"),
+    join_field: str = Query(..., description="Field to use for joining results across services"),
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    since: Optional[int] = Query(None, description="Watermark from the previous refresh (X-Watermark, epoch ms): only joined rows with a newer service @timestamp"),
+    format: Literal["parquet", "arrow"] = Query("parquet", description="Parquet file or Arrow IPC stream"),
+    compression: str = Query("zstd", description="zstd, gzip, snappy or none for Parquet; zstd, lz4 or none for Arrow")
+):
+    """
+    Join logs across services and return one typed row per join value with a
+    `service.field` column per service field. With `since`, a joined row is sent
+    again when any of its services has a row newer than the watermark, so
+    Power BI should key the table on the join field.
+    """
+    try:
+        joined = await run_join_query(services, log_groups, query_string, join_field, start_time, end_time)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error joining log data: {str(e)}")
+    
+    return export_response(
+        flatten_joined_rows(joined.results, join_field), format, compression, since,
+        timestamp_fields=[f"{service}.@timestamp" for service in services],
+        filename="join",
+        metadata={"services": ",".join(services), "partial": str(joined.partial).lower()}
+    )
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,60 @@
+import importlib.util
+import os
+from pathlib import Path
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pytest.importorskip("fastapi")
+pytest.importorskip("boto3")
+
+@pytest.fixture(scope="module")
+def export(tmp_path_factory):
+    # The app mounts ./static and creates a logs client at import
+    workdir = tmp_path_factory.mktemp("app")
+    (workdir / "static").mkdir()
+    previous = os.getcwd()
+    os.chdir(workdir)
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    try:
+        spec = importlib.util.spec_from_file_location("fastapi_cloudwatch", Path(__file__).with_name("fastapi-cloudwatch.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        os.chdir(previous)
+    return module
+
+def test_19_digit_ids_keep_every_digit(export):
+    ids = ["1234567890123456789", "9223372036854775807", "-9223372036854775808", None]
+    column = export.infer_column(ids)
+
+    assert column.type == pa.int64()
+    assert column.to_pylist() == [1234567890123456789, 9223372036854775807, -9223372036854775808, None]
+
+def test_integers_outside_int64_stay_strings(export):
+    ids = ["99999999999999999999", "1"]
+    column = export.infer_column(ids)
+
+    assert column.type == pa.string()
+    assert column.to_pylist() == ids
+
+def test_leading_zeros_stay_strings(export):
+    column = export.infer_column(["00123", "456"])
+
+    assert column.type == pa.string()
+    assert column.to_pylist() == ["00123", "456"]
+
+def test_mixed_integers_and_decimals_become_floats(export):
+    column = export.infer_column(["1", "2.5", "1e3", ""])
+
+    assert column.type == pa.float64()
+    assert column.to_pylist() == [1.0, 2.5, 1000.0, None]
+
+def test_long_integers_next_to_decimals_stay_strings(export):
+    column = export.infer_column(["1234567890123456789", "2.5"])
+
+    assert column.type == pa.string()
+
+@pytest.mark.parametrize("value", ["1_000", "nan", "inf"])
+def test_float_lookalikes_stay_strings(export, value):
+    assert export.infer_column([value, "2.5"]).type == pa.string()
@@ -13,120 +13,417 @@ logger.setLevel(logging.INFO)
 s3 = boto3.client('s3')
 stepfunctions = boto3.client('stepfunctions')
 
-def lambda_handler(event, context):
-    """Lambda handler for file upload API"""
-    logger.info(f"Received event: {json.dumps(event)}")
-    
-    try:
-        # Parse request body
-        if 'body' not in event:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json'
-                },
-                'body': json.dumps({
-                    'error': 'No body found in request'
-                })
-            }
-        
-        # Check if body is base64 encoded
-        body = event['body']
-        is_base64 = event.get('isBase64Encoded', False)
-        
-        if is_base64:
-            body = base64.b64decode(body)
-        
-        # Parse multipart/form-data
-        # For simplicity, we're assuming a direct file upload rather than parsing multipart/form-data
-        # In a real implementation, you would need to parse the multipart/form-data properly
-        
-        # Get content type and file name from headers
-        content_type = 'application/octet-stream'  # Default
-        file_name = f"upload-{str(uuid.uuid4())}.csv"  # Default
-        
-        # Extract content type from headers
-        headers = event.get('headers', {})
-        if headers and 'Content-Type' in headers:
-            content_type = headers['Content-Type']
-        
-        # Extract file name from queryStringParameters or use default
-        query_params = event.get('queryStringParameters', {})
-        if query_params and 'filename' in query_params:
-            file_name = query_params['filename']
-        
-        # Get mapping source
-        mapping_source = 'default'
-        if query_params and 'source' in query_params:
-            mapping_source = query_params['source']
-        
-        # Upload to S3
-        bucket_name = os.environ.get('UPLOAD_BUCKET')
-        s3_key = f"uploads/{file_name}"
-        
+# Presigned URLs for the client-side multipart flow
+PRESIGNED_URL_EXPIRY = int(os.environ.get('PRESIGNED_URL_EXPIRY_SECONDS', '3600'))
+MAX_PRESIGNED_PARTS = 10000
+
+# Base64 characters decoded per step; a multiple of 4 so chunks decode independently
+BASE64_CHUNK_CHARS = 4 * 256 * 1024
+
+def json_response(status_code, body):
+    """Build an API Gateway proxy response"""
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json'
+        },
+        'body': json.dumps(body)
+    }
+
+def get_header(headers, name):
+    """Case-insensitive header lookup"""
+    for key, value in (headers or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+def parse_header_params(value):
+    """Split 'multipart/form-data; boundary=xyz' into ('multipart/form-data', {'boundary': 'xyz'})"""
+    parts = value.split(';')
+    params = {}
+    for part in parts[1:]:
+        if '=' in part:
+            key, param_value = part.split('=', 1)
+            params[key.strip().lower()] = param_value.strip().strip('"')
+    return parts[0].strip().lower(), params
+
+def iter_body_chunks(event):
+    """Yield the request body in decoded chunks without materializing it twice"""
+    body = event.get('body') or ''
+
+    if event.get('isBase64Encoded', False):
+        for start in range(0, len(body), BASE64_CHUNK_CHARS):
+            yield base64.b64decode(body[start:start + BASE64_CHUNK_CHARS])
+    else:
+        data = body.encode('utf-8') if isinstance(body, str) else body
+        for start in range(0, len(data), BASE64_CHUNK_CHARS):
+            yield data[start:start + BASE64_CHUNK_CHARS]
+
+class S3ObjectWriter:
+    """
+    Buffers written bytes and puts them as one S3 object on close(). A direct
+    upload is capped by the 6 MB Lambda payload, so it never needs S3 multipart
+    upload (5 MB minimum part size); larger files use the presigned flow.
+    """
+
+    def __init__(self, bucket, key, content_type):
+        self.bucket = bucket
+        self.key = key
+        self.content_type = content_type
+        self.buffer = bytearray()
+        self.size = 0
+
+    def write(self, data):
+        self.buffer.extend(data)
+        self.size += len(data)
+
+    def close(self):
         s3.put_object(
-            Bucket=bucket_name,
-            Key=s3_key,
-            Body=body,
-            ContentType=content_type
+            Bucket=self.bucket,
+            Key=self.key,
+            Body=bytes(self.buffer),
+            ContentType=self.content_type
         )
-        
-        # Start Step Functions execution
-        state_machine_arn = os.environ.get('STATE_MACHINE_ARN')
-        if state_machine_arn:
-            execution_input = {
+        self.buffer = bytearray()
+
+    def abort(self):
+        self.buffer = bytearray()
+
+class MultipartFormParser:
+    """
+    Incremental multipart/form-data parser.
+
+    Chunks are fed with feed(); file part bodies are handed to a writer created by
+    writer_factory(filename, content_type) as they arrive, and other form fields
+    are collected into self.fields. Only a boundary-sized tail is ever held back.
+    The caller closes or aborts the writers in self.files once the body is parsed.
+    """
+
+    MAX_HEADER_BYTES = 16 * 1024
+    MAX_FIELD_BYTES = 64 * 1024
+
+    def __init__(self, boundary, writer_factory):
+        # Prefix with CRLF so the first delimiter looks like every other one
+        self.delimiter = b'\r\n--' + boundary.encode('latin-1')
+        self.writer_factory = writer_factory
+        self.buffer = bytearray(b'\r\n')
+        self.state = 'preamble'
+        self.fields = {}
+        self.files = []
+        self.current_name = None
+        self.current_writer = None
+        self.current_value = None
+
+    def feed(self, chunk):
+        self.buffer.extend(chunk)
+        while self._step():
+            pass
+
+    def close(self):
+        if self.state != 'end':
+            raise ValueError('Malformed multipart body: closing boundary not found')
+
+    def _step(self):
+        """Advance the state machine; returns False when more data is needed"""
+        if self.state == 'preamble':
+            index = self.buffer.find(self.delimiter)
+            if index < 0:
+                del self.buffer[:max(0, len(self.buffer) - len(self.delimiter))]
+                return False
+            del self.buffer[:index + len(self.delimiter)]
+            self.state = 'delimiter'
+            return True
+
+        if self.state == 'delimiter':
+            if len(self.buffer) < 2:
+                return False
+            if self.buffer[:2] == b'--':
+                self.state = 'end'
+                self.buffer = bytearray()
+                return False
+            # Transport padding is allowed between the boundary and CRLF
+            index = self.buffer.find(b'\r\n')
+            if index < 0:
+                return False
+            del self.buffer[:index + 2]
+            self.state = 'headers'
+            return True
+
+        if self.state == 'headers':
+            index = self.buffer.find(b'\r\n\r\n')
+            if index < 0:
+                if len(self.buffer) > self.MAX_HEADER_BYTES:
+                    raise ValueError('Multipart part headers too large')
+                return False
+            raw_headers = bytes(self.buffer[:index]).decode('utf-8', errors='replace')
+            del self.buffer[:index + 4]
+            self._begin_part(raw_headers)
+            self.state = 'body'
+            return True
+
+        if self.state == 'body':
+            index = self.buffer.find(self.delimiter)
+            if index < 0:
+                # Keep enough bytes to recognise a delimiter split across chunks
+                safe = len(self.buffer) - len(self.delimiter) + 1
+                if safe > 0:
+                    self._part_data(bytes(self.buffer[:safe]))
+                    del self.buffer[:safe]
+                return False
+            self._part_data(bytes(self.buffer[:index]))
+            del self.buffer[:index + len(self.delimiter)]
+            self._end_part()
+            self.state = 'delimiter'
+            return True
+
+        return False
+
+    def _begin_part(self, raw_headers):
+        headers = {}
+        for line in raw_headers.split('\r\n'):
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        _, disposition = parse_header_params(headers.get('content-disposition', ''))
+        self.current_name = disposition.get('name')
+        filename = disposition.get('filename')
+
+        if filename:
+            content_type = headers.get('content-type', 'application/octet-stream')
+            self.current_writer = self.writer_factory(os.path.basename(filename), content_type)
+            self.files.append(self.current_writer)
+        else:
+            self.current_value = bytearray()
+
+    def _part_data(self, data):
+        if self.current_writer is not None:
+            self.current_writer.write(data)
+        else:
+            if len(self.current_value) + len(data) > self.MAX_FIELD_BYTES:
+                raise ValueError(f"Form field too large: {self.current_name}")
+            self.current_value.extend(data)
+
+    def _end_part(self):
+        if self.current_writer is None and self.current_name:
+            self.fields[self.current_name] = self.current_value.decode('utf-8')
+        self.current_name = None
+        self.current_writer = None
+        self.current_value = None
+
+def parse_count(value):
+    """Integer from a JSON number or a numeric string, or None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+def start_processing(bucket_name, s3_key, mapping_source):
+    """Start the Step Functions execution if a state machine is configured"""
+    state_machine_arn = os.environ.get('STATE_MACHINE_ARN')
+    if not state_machine_arn:
+        return None
+
+    execution_input = {
+        'bucket': bucket_name,
+        'key': s3_key,
+        'mappingSource': mapping_source
+    }
+
+    response = stepfunctions.start_execution(
+        stateMachineArn=state_machine_arn,
+        name=f"file-processing-{str(uuid.uuid4())}",
+        input=json.dumps(execution_input)
+    )
+
+    return response['executionArn']
+
+def uploaded_response(bucket_name, s3_key, mapping_source):
+    """Start processing for an uploaded object and build the API response"""
+    execution_arn = start_processing(bucket_name, s3_key, mapping_source)
+
+    if execution_arn:
+        return json_response(202, {
+            'message': 'File uploaded and processing started',
+            'file': {
                 'bucket': bucket_name,
-                'key': s3_key,
-                'mappingSource': mapping_source
-            }
-            
-            response = stepfunctions.start_execution(
-                stateMachineArn=state_machine_arn,
-                name=f"file-processing-{str(uuid.uuid4())}",
-                input=json.dumps(execution_input)
-            )
-            
-            execution_arn = response['executionArn']
-            
-            return {
-                'statusCode': 202,
-                'headers': {
-                    'Content-Type': 'application/json'
-                },
-                'body': json.dumps({
-                    'message': 'File uploaded and processing started',
-                    'file': {
-                        'bucket': bucket_name,
-                        'key': s3_key
-                    },
-                    'execution': {
-                        'arn': execution_arn
-                    }
-                })
+                'key': s3_key
+            },
+            'execution': {
+                'arn': execution_arn
             }
-        else:
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json'
+        })
+
+    return json_response(200, {
+        'message': 'File uploaded but processing not started (no state machine ARN)',
+        'file': {
+            'bucket': bucket_name,
+            'key': s3_key
+        }
+    })
+
+def handle_direct_upload(event):
+    """Stream a small direct upload (raw or multipart/form-data) into S3"""
+    if 'body' not in event:
+        return json_response(400, {'error': 'No body found in request'})
+
+    bucket_name = os.environ.get('UPLOAD_BUCKET')
+    query_params = event.get('queryStringParameters') or {}
+    mapping_source = query_params.get('source', 'default')
+
+    content_type = get_header(event.get('headers'), 'Content-Type') or 'application/octet-stream'
+    media_type, params = parse_header_params(content_type)
+
+    if media_type == 'multipart/form-data':
+        if 'boundary' not in params:
+            return json_response(400, {'error': 'Missing multipart boundary'})
+
+        def writer_factory(filename, part_content_type):
+            return S3ObjectWriter(bucket_name, f"uploads/{filename}", part_content_type)
+
+        parser = MultipartFormParser(params['boundary'], writer_factory)
+        try:
+            for chunk in iter_body_chunks(event):
+                parser.feed(chunk)
+            parser.close()
+        except Exception:
+            for writer in parser.files:
+                writer.abort()
+            raise
+
+        # Nothing has reached S3 yet, so a rejected form leaves no objects behind
+        if len(parser.files) != 1:
+            for writer in parser.files:
+                writer.abort()
+            error = "No file part found in multipart body" if not parser.files else \
+                f"Expected one file part, got {len(parser.files)}"
+            return json_response(400, {'error': error})
+
+        writer = parser.files[0]
+        writer.close()
+        mapping_source = parser.fields.get('source', mapping_source)
+        logger.info(f"Uploaded {writer.size} bytes to {writer.key}")
+        return uploaded_response(bucket_name, writer.key, mapping_source)
+
+    # Raw body upload
+    file_name = os.path.basename(query_params.get('filename', f"upload-{str(uuid.uuid4())}.csv"))
+    writer = S3ObjectWriter(bucket_name, f"uploads/{file_name}", content_type)
+    try:
+        for chunk in iter_body_chunks(event):
+            writer.write(chunk)
+        writer.close()
+    except Exception:
+        writer.abort()
+        raise
+
+    logger.info(f"Uploaded {writer.size} bytes to {writer.key}")
+    return uploaded_response(bucket_name, writer.key, mapping_source)
+
+def handle_presigned_upload(body):
+    """Create a multipart upload and return presigned part URLs so bytes bypass Lambda"""
+    file_name = body.get('filename')
+    if not file_name:
+        return json_response(400, {'error': 'Missing required field: filename'})
+
+    part_count = parse_count(body.get('parts', 1))
+    if part_count is None or part_count < 1 or part_count > MAX_PRESIGNED_PARTS:
+        return json_response(400, {'error': f"parts must be between 1 and {MAX_PRESIGNED_PARTS}"})
+
+    bucket_name = os.environ.get('UPLOAD_BUCKET')
+    s3_key = f"uploads/{os.path.basename(file_name)}"
+
+    response = s3.create_multipart_upload(
+        Bucket=bucket_name,
+        Key=s3_key,
+        ContentType=body.get('contentType', 'application/octet-stream')
+    )
+    upload_id = response['UploadId']
+
+    part_urls = [
+        {
+            'partNumber': part_number,
+            'url': s3.generate_presigned_url(
+                'upload_part',
+                Params={
+                    'Bucket': bucket_name,
+                    'Key': s3_key,
+                    'UploadId': upload_id,
+                    'PartNumber': part_number
                 },
-                'body': json.dumps({
-                    'message': 'File uploaded but processing not started (no state machine ARN)',
-                    'file': {
-                        'bucket': bucket_name,
-                        'key': s3_key
-                    }
-                })
-            }
-        
+                ExpiresIn=PRESIGNED_URL_EXPIRY
+            )
+        }
+        for part_number in range(1, part_count + 1)
+    ]
+
+    return json_response(200, {
+        'file': {
+            'bucket': bucket_name,
+            'key': s3_key
+        },
+        'uploadId': upload_id,
+        'expiresIn': PRESIGNED_URL_EXPIRY,
+        'parts': part_urls
+    })
+
+def handle_complete_upload(body):
+    """Complete a presigned multipart upload and start processing"""
+    s3_key = body.get('key')
+    upload_id = body.get('uploadId')
+    parts = body.get('parts')
+
+    bucket_name = os.environ.get('UPLOAD_BUCKET')
+
+    # Aborting only needs the key and upload id
+    if body.get('abort'):
+        if not s3_key or not upload_id:
+            return json_response(400, {'error': 'Missing required fields: key and uploadId'})
+        s3.abort_multipart_upload(Bucket=bucket_name, Key=s3_key, UploadId=upload_id)
+        return json_response(200, {'message': 'Upload aborted', 'file': {'bucket': bucket_name, 'key': s3_key}})
+
+    if not s3_key or not upload_id or not parts:
+        return json_response(400, {'error': 'Missing required fields: key, uploadId and parts'})
+    if not isinstance(parts, list):
+        return json_response(400, {'error': 'parts must be a list of {partNumber, etag}'})
+
+    completed_parts = []
+    for part in parts:
+        part_number = parse_count(part.get('partNumber')) if isinstance(part, dict) else None
+        etag = part.get('etag') if isinstance(part, dict) else None
+        if part_number is None or not 1 <= part_number <= MAX_PRESIGNED_PARTS or not isinstance(etag, str) or not etag:
+            return json_response(400, {
+                'error': f"Each part needs a partNumber between 1 and {MAX_PRESIGNED_PARTS} and an etag: {json.dumps(part)}"
+            })
+        completed_parts.append({'PartNumber': part_number, 'ETag': etag})
+
+    s3.complete_multipart_upload(
+        Bucket=bucket_name,
+        Key=s3_key,
+        UploadId=upload_id,
+        MultipartUpload={
+            'Parts': sorted(completed_parts, key=lambda p: p['PartNumber'])
+        }
+    )
+
+    return uploaded_response(bucket_name, s3_key, body.get('source', 'default'))
+
+def lambda_handler(event, context):
+    """Lambda handler for file upload API"""
+    logger.info(f"Received upload request: {event.get('httpMethod')} {event.get('path')}")
+
+    try:
+        path = (event.get('path') or '').rstrip('/')
+
+        if path.endswith('/upload/presigned'):
+            return handle_presigned_upload(json.loads(event.get('body') or '{}'))
+        elif path.endswith('/upload/complete'):
+            return handle_complete_upload(json.loads(event.get('body') or '{}'))
+
+        return handle_direct_upload(event)
+
     except Exception as e:
         logger.error(f"Error in file upload lambda: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({
-                'error': str(e)
-            })
-        }
\ No newline at end of file
+        return json_response(500, {'error': str(e)})
@@ -1,8 +1,10 @@
 import json
 import boto3
 import os
-import uuid
+import time
+import hashlib
 import logging
+from botocore.exceptions import ClientError
 
 # Configure logging
 logger = logging.getLogger()
@@ -10,6 +12,13 @@ logger.setLevel(logging.INFO)
 
 # Initialize AWS clients
 stepfunctions = boto3.client('stepfunctions')
+s3 = boto3.client('s3')
+dynamodb = boto3.resource('dynamodb')
+
+# Conditional-put lock table absorbing duplicate triggers (optional)
+IDEMPOTENCY_TABLE = os.environ.get('IDEMPOTENCY_TABLE')
+locks_table = dynamodb.Table(IDEMPOTENCY_TABLE) if IDEMPOTENCY_TABLE else None
+LOCK_TTL_SECONDS = int(os.environ.get('LOCK_TTL_SECONDS', '900'))
 
 def lambda_handler(event, context):
     """Lambda handler for initiating file processing workflow"""
@@ -17,7 +26,10 @@ def lambda_handler(event, context):
     
     try:
         # Check event source
-        if 'httpMethod' in event:
+        if 'Records' in event:
+            # Batched S3 events delivered through SQS
+            return handle_sqs_batch(event)
+        elif 'httpMethod' in event:
             # API Gateway event
             return handle_api_event(event)
         elif 'source' in event and event['source'] == 'aws.s3':
@@ -50,6 +62,7 @@ def handle_api_event(event):
         # Extract parameters
         bucket = body.get('bucket')
         key = body.get('key')
+        etag = body.get('etag')
         mapping_source = body.get('mappingSource', 'default')
         
         # Validate parameters
@@ -65,7 +78,7 @@ def handle_api_event(event):
             }
         
         # Start Step Functions execution
-        execution_arn = start_execution(bucket, key, mapping_source)
+        execution_arn, duplicate = start_execution(bucket, key, mapping_source, etag)
         
         return {
             'statusCode': 202,
@@ -73,13 +86,14 @@ def handle_api_event(event):
                 'Content-Type': 'application/json'
             },
             'body': json.dumps({
-                'message': 'File processing initiated',
+                'message': 'File processing already initiated' if duplicate else 'File processing initiated',
                 'file': {
                     'bucket': bucket,
                     'key': key
                 },
                 'execution': {
-                    'arn': execution_arn
+                    'arn': execution_arn,
+                    'duplicate': duplicate
                 }
             })
         }
@@ -96,6 +110,7 @@ def handle_s3_event(event):
         bucket = detail.get('bucket', {}).get('name')
         object_info = detail.get('object', {})
         key = object_info.get('key')
+        etag = object_info.get('etag')
         
         # Default mapping source
         mapping_source = 'default'
@@ -116,10 +131,10 @@ def handle_s3_event(event):
             }
         
         # Start Step Functions execution
-        execution_arn = start_execution(bucket, key, mapping_source)
+        execution_arn, duplicate = start_execution(bucket, key, mapping_source, etag)
         
         return {
-            'status': 'initiated',
+            'status': 'duplicate' if duplicate else 'initiated',
             'file': {
                 'bucket': bucket,
                 'key': key
@@ -133,25 +148,141 @@ def handle_s3_event(event):
         logger.error(f"Error handling S3 event: {str(e)}")
         raise
 
-def start_execution(bucket, key, mapping_source):
-    """Start Step Functions execution for file processing"""
+def handle_sqs_batch(event):
+    """Handle a batch of EventBridge S3 events buffered in SQS, coalescing duplicates"""
+    batch_item_failures = []
+    seen = {}
+
+    for record in event['Records']:
+        try:
+            s3_event = json.loads(record['body'])
+            detail = s3_event.get('detail', {})
+            object_info = detail.get('object', {})
+            identity = (detail.get('bucket', {}).get('name'), object_info.get('key'), object_info.get('etag'))
+
+            # Repeated notifications for the same object version within one batch window
+            if identity in seen:
+                logger.info(f"Coalesced duplicate event for {identity[0]}/{identity[1]}")
+                continue
+
+            seen[identity] = handle_s3_event(s3_event)
+        except Exception as e:
+            logger.error(f"Error handling SQS record {record.get('messageId')}: {str(e)}")
+            batch_item_failures.append({'itemIdentifier': record['messageId']})
+
+    logger.info(f"Processed {len(event['Records'])} records, {len(seen)} distinct objects")
+
+    return {'batchItemFailures': batch_item_failures}
+
+# Earlier runs in these states are retried under a new name instead of absorbing the trigger
+FAILED_EXECUTION_STATUSES = ('FAILED', 'TIMED_OUT', 'ABORTED')
+
+def get_execution_name(bucket, key, etag, mapping_source):
+    """Deterministic execution name for one version of an object and mapping (max 80 chars, leaving room for -r<N>)"""
+    identity = json.dumps([bucket, key, etag, mapping_source], sort_keys=True)
+    digest = hashlib.sha256(identity.encode('utf-8')).hexdigest()
+    return f"file-processing-{digest[:56]}"
+
+def get_execution_status(execution_arn):
+    """Status of an existing execution, or None if it cannot be found"""
+    try:
+        return stepfunctions.describe_execution(executionArn=execution_arn)['status']
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ExecutionDoesNotExist':
+            raise
+        return None
+
+def acquire_lock(execution_name, bucket, key):
+    """Take the processing lock; returns the existing item if another trigger holds it"""
+    if locks_table is None:
+        return None
+
+    now = int(time.time())
+    try:
+        locks_table.put_item(
+            Item={
+                'lock_key': execution_name,
+                'bucket': bucket,
+                'key': key,
+                'created_at': now,
+                'expires_at': now + LOCK_TTL_SECONDS
+            },
+            ConditionExpression='attribute_not_exists(lock_key) OR expires_at < :now',
+            ExpressionAttributeValues={':now': now}
+        )
+        return None
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        response = locks_table.get_item(Key={'lock_key': execution_name})
+        return response.get('Item', {'lock_key': execution_name})
+
+def record_execution(lock_name, execution_arn):
+    """Remember which execution holds the lock, so later triggers can check how it ended"""
+    if locks_table is not None:
+        locks_table.update_item(
+            Key={'lock_key': lock_name},
+            UpdateExpression='SET execution_arn = :arn',
+            ExpressionAttributeValues={':arn': execution_arn}
+        )
+
+def start_execution(bucket, key, mapping_source, etag=None):
+    """Start Step Functions execution for file processing; returns (execution ARN, duplicate)"""
+    # Get state machine ARN
+    state_machine_arn = os.environ.get('STATE_MACHINE_ARN')
+    if not state_machine_arn:
+        raise ValueError("STATE_MACHINE_ARN environment variable not set")
+
+    if not etag:
+        etag = s3.head_object(Bucket=bucket, Key=key)['ETag']
+    etag = etag.strip('"')
+
+    lock_name = get_execution_name(bucket, key, etag, mapping_source)
+    execution_prefix = state_machine_arn.replace(':stateMachine:', ':execution:')
+
+    # Cheap path: a live lock means another trigger already started this object version,
+    # unless the run it recorded has since failed
+    existing = acquire_lock(lock_name, bucket, key)
+    if existing is not None:
+        existing_arn = existing.get('execution_arn', f"{execution_prefix}:{lock_name}")
+        if 'execution_arn' not in existing or get_execution_status(existing_arn) not in FAILED_EXECUTION_STATUSES:
+            logger.info(f"Duplicate trigger absorbed for {bucket}/{key} ({etag})")
+            return existing_arn, True
+
     # Prepare input for Step Functions
     execution_input = {
         'bucket': bucket,
         'key': key,
+        'etag': etag,
         'mappingSource': mapping_source
     }
-    
-    # Get state machine ARN
-    state_machine_arn = os.environ.get('STATE_MACHINE_ARN')
-    if not state_machine_arn:
-        raise ValueError("STATE_MACHINE_ARN environment variable not set")
-    
-    # Start execution
-    response = stepfunctions.start_execution(
-        stateMachineArn=state_machine_arn,
-        name=f"file-processing-{str(uuid.uuid4())}",
-        input=json.dumps(execution_input)
-    )
-    
-    return response['executionArn']
\ No newline at end of file
+
+    # Start execution; the deterministic name makes Step Functions itself reject repeats.
+    # A repeat of a run that failed is started again as <name>-r1, -r2, ...
+    attempt = 0
+    while True:
+        execution_name = lock_name if attempt == 0 else f"{lock_name}-r{attempt}"
+        try:
+            response = stepfunctions.start_execution(
+                stateMachineArn=state_machine_arn,
+                name=execution_name,
+                input=json.dumps(execution_input)
+            )
+            break
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ExecutionAlreadyExists':
+                if locks_table is not None:
+                    locks_table.delete_item(Key={'lock_key': lock_name})
+                raise
+
+        execution_arn = f"{execution_prefix}:{execution_name}"
+        status = get_execution_status(execution_arn)
+        if status not in FAILED_EXECUTION_STATUSES:
+            logger.info(f"Execution {execution_name} already exists for {bucket}/{key} ({status})")
+            record_execution(lock_name, execution_arn)
+            return execution_arn, True
+        logger.info(f"Execution {execution_name} ended {status}, retrying {bucket}/{key}")
+        attempt += 1
+
+    record_execution(lock_name, response['executionArn'])
+    return response['executionArn'], False
@@ -1,6 +1,9 @@
 import json
 import boto3
 import os
+import base64
+import hashlib
+import time
 import logging
 
 # Configure logging
@@ -11,6 +14,24 @@ logger.setLevel(logging.INFO)
 dynamodb = boto3.resource('dynamodb')
 mappings_table = dynamodb.Table(os.environ.get('FIELD_MAPPINGS_TABLE'))
 
+# Paging for GET /mappings
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+# Item holding the table-wide version counter used for ETags
+VERSION_ITEM_KEY = '__version__'
+VERSION_CACHE_SECONDS = int(os.environ.get('VERSION_CACHE_SECONDS', '5'))
+_version_cache = {'value': 0, 'expires': 0}
+
+DEFAULT_MAPPINGS = {
+    "name": ["name", "full_name", "customer_name", "client_name"],
+    "address1": ["address", "address1", "street_address", "street"],
+    "city": ["city", "town"],
+    "state": ["state", "province", "region"],
+    "zip": ["zip", "zipcode", "postal_code", "postalcode", "zip_code"],
+    "auth_id": ["auth_id", "authid", "authorization_id", "auth", "id"]
+}
+
 def lambda_handler(event, context):
     """Lambda handler for managing field mappings"""
     logger.info(f"Received event: {json.dumps(event)}")
@@ -21,7 +42,7 @@ def lambda_handler(event, context):
         
         # Handle different methods
         if http_method == 'GET':
-            return get_mappings()
+            return get_mappings(event)
         elif http_method == 'POST':
             # Parse request body
             if 'body' in event:
@@ -51,47 +72,160 @@ def lambda_handler(event, context):
             })
         }
 
-def get_mappings():
-    """Retrieve all field mappings"""
+def encode_token(last_evaluated_key):
+    """Encode a DynamoDB LastEvaluatedKey as an opaque continuation token"""
+    if not last_evaluated_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_evaluated_key).encode('utf-8')).decode('ascii')
+
+def decode_token(token):
+    """Decode a continuation token back into an ExclusiveStartKey; ValueError if it is malformed"""
     try:
-        # Scan the mappings table
-        response = mappings_table.scan()
-        items = response.get('Items', [])
-        
-        # Convert to a dictionary with mapping_name as key
-        mappings = {item['mapping_name']: item['mappings'] for item in items}
-        
-        # If no mappings found, initialize with defaults
-        if not mappings:
-            default_mappings = {
-                "default": {
-                    "name": ["name", "full_name", "customer_name", "client_name"],
-                    "address1": ["address", "address1", "street_address", "street"],
-                    "city": ["city", "town"],
-                    "state": ["state", "province", "region"],
-                    "zip": ["zip", "zipcode", "postal_code", "postalcode", "zip_code"],
-                    "auth_id": ["auth_id", "authid", "authorization_id", "auth", "id"]
-                }
+        key = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid nextToken: {token}") from e
+    if not isinstance(key, dict) or set(key) != {'mapping_name'} or not isinstance(key['mapping_name'], str):
+        raise ValueError(f"Invalid nextToken: {token}")
+    return key
+
+def get_table_version():
+    """Return the table-wide version counter, cached briefly per container"""
+    now = time.time()
+    if _version_cache['expires'] > now:
+        return _version_cache['value']
+
+    response = mappings_table.get_item(
+        Key={'mapping_name': VERSION_ITEM_KEY},
+        ProjectionExpression='table_version'
+    )
+    value = int(response.get('Item', {}).get('table_version', 0))
+
+    _version_cache['value'] = value
+    _version_cache['expires'] = now + VERSION_CACHE_SECONDS
+    return value
+
+def save_mapping(name, mappings):
+    """Write a mapping, bumping its own version and the table-wide version counter"""
+    response = mappings_table.update_item(
+        Key={'mapping_name': name},
+        UpdateExpression='SET mappings = :mappings ADD #version :one',
+        ExpressionAttributeNames={'#version': 'version'},
+        ExpressionAttributeValues={':mappings': mappings, ':one': 1},
+        ReturnValues='UPDATED_NEW'
+    )
+    mappings_table.update_item(
+        Key={'mapping_name': VERSION_ITEM_KEY},
+        UpdateExpression='ADD table_version :one',
+        ExpressionAttributeValues={':one': 1}
+    )
+    _version_cache['expires'] = 0
+    return int(response['Attributes']['version'])
+
+def build_etag(*parts):
+    """Weak ETag over the table version and request parameters"""
+    digest = hashlib.md5(json.dumps(parts, default=str).encode('utf-8')).hexdigest()
+    return f'W/"{digest}"'
+
+def not_modified(etag):
+    return {
+        'statusCode': 304,
+        'headers': {
+            'ETag': etag,
+            'Cache-Control': 'no-cache'
+        },
+        'body': ''
+    }
+
+def get_mappings(event):
+    """List field mapping names and versions page by page, or fetch a single mapping by name"""
+    try:
+        query_params = event.get('queryStringParameters') or {}
+        headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+        if_none_match = headers.get('if-none-match')
+
+        name = query_params.get('name')
+        next_token = query_params.get('nextToken')
+        try:
+            limit = min(max(int(query_params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            error = 'limit must be an integer'
+        else:
+            try:
+                start_key = decode_token(next_token) if next_token else None
+                error = None
+            except ValueError:
+                error = 'Invalid nextToken'
+        if error:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({
+                    'error': error
+                })
             }
-            
-            # Save default mappings
-            mappings_table.put_item(
-                Item={
-                    'mapping_name': 'default',
-                    'mappings': default_mappings['default']
+
+        # Answer polling from the version counter alone when nothing has changed
+        table_version = get_table_version()
+        etag = build_etag(table_version, name, limit, next_token)
+        if if_none_match == etag:
+            return not_modified(etag)
+
+        if name:
+            response = mappings_table.get_item(Key={'mapping_name': name})
+            if 'Item' not in response or name == VERSION_ITEM_KEY:
+                return {
+                    'statusCode': 404,
+                    'headers': {
+                        'Content-Type': 'application/json'
+                    },
+                    'body': json.dumps({
+                        'error': f"Mapping not found: {name}"
+                    })
                 }
-            )
-            
-            mappings = default_mappings
-        
+            item = response['Item']
+            body = {
+                'name': item['mapping_name'],
+                'version': int(item.get('version', 0)),
+                'mappings': item['mappings']
+            }
+        else:
+            scan_params = {
+                'Limit': limit,
+                'ProjectionExpression': '#name, #version',
+                'ExpressionAttributeNames': {'#name': 'mapping_name', '#version': 'version'}
+            }
+            if start_key:
+                scan_params['ExclusiveStartKey'] = start_key
+
+            response = mappings_table.scan(**scan_params)
+            items = [item for item in response.get('Items', []) if item['mapping_name'] != VERSION_ITEM_KEY]
+
+            # If no mappings exist at all, initialize with defaults
+            if not items and not next_token and 'LastEvaluatedKey' not in response:
+                version = save_mapping('default', DEFAULT_MAPPINGS)
+                items = [{'mapping_name': 'default', 'version': version}]
+                etag = build_etag(get_table_version(), name, limit, next_token)
+
+            body = {
+                'mappings': [
+                    {'name': item['mapping_name'], 'version': int(item.get('version', 0))}
+                    for item in items
+                ],
+                'nextToken': encode_token(response.get('LastEvaluatedKey'))
+            }
+
         return {
             'statusCode': 200,
             'headers': {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'ETag': etag,
+                'Cache-Control': 'no-cache'
             },
-            'body': json.dumps(mappings)
+            'body': json.dumps(body, default=str)
         }
-        
+
     except Exception as e:
         logger.error(f"Error getting mappings: {str(e)}")
         raise
@@ -115,13 +249,19 @@ def create_mapping(body):
                 })
             }
         
-        # Save to DynamoDB
-        mappings_table.put_item(
-            Item={
-                'mapping_name': name,
-                'mappings': mappings
+        if name == VERSION_ITEM_KEY:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps({
+                    'error': f"Reserved mapping name: {name}"
+                })
             }
-        )
+
+        # Save to DynamoDB
+        version = save_mapping(name, mappings)
         
         return {
             'statusCode': 201,
@@ -130,7 +270,8 @@ def create_mapping(body):
             },
             'body': json.dumps({
                 'message': 'Mapping configuration created',
-                'name': name
+                'name': name,
+                'version': version
             })
         }
         
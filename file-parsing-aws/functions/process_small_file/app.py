@@ -0,0 +1,237 @@
+import json
+import boto3
+import pandas as pd
+import io
+import os
+import csv
+import codecs
+import itertools
+import logging
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize AWS clients
+s3 = boto3.client('s3')
+dynamodb = boto3.resource('dynamodb')
+mappings_table = dynamodb.Table(os.environ.get('FIELD_MAPPINGS_TABLE'))
+
+REQUIRED_TARGET_FIELDS = ['name', 'auth_id']
+
+def get_field_mappings(mapping_key='default'):
+    """Retrieve field mappings from DynamoDB"""
+    try:
+        response = mappings_table.get_item(Key={'mapping_name': mapping_key})
+        if 'Item' in response:
+            return response['Item']['mappings']
+    except Exception as e:
+        logger.error(f"Error retrieving field mappings: {str(e)}")
+
+    # Default mappings if retrieval fails or mapping not found
+    return {
+        "name": ["name", "full_name", "customer_name", "client_name"],
+        "address1": ["address", "address1", "street_address", "street"],
+        "city": ["city", "town"],
+        "state": ["state", "province", "region"],
+        "zip": ["zip", "zipcode", "postal_code", "postalcode", "zip_code"],
+        "auth_id": ["auth_id", "authid", "authorization_id", "auth", "id"]
+    }
+
+def detect_file_type(filename):
+    """Detect file type based on extension"""
+    extension = filename.split('.')[-1].lower()
+
+    if extension == 'csv':
+        return 'csv'
+    elif extension in ['xls', 'xlsx']:
+        return 'excel'
+    elif extension == 'json':
+        return 'json'
+    elif extension == 'txt':
+        return 'text'
+    else:
+        return 'unknown'
+
+def resolve_target_field(source_field, mapping):
+    """Return the target field a source column maps to, or None (same rules as map_fields)"""
+    source_field_lower = source_field.lower().strip()
+
+    for target_field, possible_source_fields in mapping.items():
+        if any(source_field_lower == s.lower() or source_field_lower.find(s.lower()) >= 0
+              for s in possible_source_fields):
+            return target_field
+
+    return None
+
+def missing_required_fields(headers, mapping, case_sensitive=False):
+    """Return required target fields that no header can be mapped to"""
+    if case_sensitive:
+        available = set(headers)
+    else:
+        available = {h.lower() for h in headers}
+
+    missing_fields = []
+    for target_field in REQUIRED_TARGET_FIELDS:
+        source_fields = mapping.get(target_field, [])
+        if not case_sensitive:
+            source_fields = [s.lower() for s in source_fields]
+        if not any(source in available for source in source_fields):
+            missing_fields.append(target_field)
+
+    return missing_fields
+
+def map_rows(headers, rows, mapping):
+    """Map positional rows to the target schema using a column plan built once from the headers"""
+    # (column index, target field) pairs; later columns win, as in normalize_record
+    plan = []
+    for index, header in enumerate(headers):
+        target_field = resolve_target_field(header, mapping)
+        if target_field is not None:
+            plan.append((index, target_field))
+
+    empty = {target_field: None for target_field in mapping.keys()}
+
+    for row in rows:
+        # Blank lines are skipped, as csv.DictReader does
+        if not row:
+            continue
+        normalized = dict(empty)
+        for index, target_field in plan:
+            if index < len(row):
+                normalized[target_field] = row[index]
+        yield normalized
+
+def map_records(records, mapping):
+    """Map dict records to the target schema, resolving each distinct key only once"""
+    resolved = {}
+    empty = {target_field: None for target_field in mapping.keys()}
+
+    for record in records:
+        normalized = dict(empty)
+        for source_field, value in record.items():
+            if source_field not in resolved:
+                resolved[source_field] = resolve_target_field(source_field, mapping)
+            target_field = resolved[source_field]
+            if target_field is not None:
+                normalized[target_field] = value
+        yield normalized
+
+def process_delimited(body, mapping, detect_delimiter=False):
+    """Validate headers and map rows of a CSV/text stream in a single pass"""
+    stream = codecs.getreader('utf-8')(body)
+    first_line = stream.readline()
+
+    delimiter = ','
+    if detect_delimiter and '\t' in first_line:
+        delimiter = '\t'
+
+    reader = csv.reader(itertools.chain([first_line], stream), delimiter=delimiter)
+    headers = next(reader)
+
+    missing_fields = missing_required_fields(headers, mapping)
+    if missing_fields:
+        return f"Missing mappable fields: {', '.join(missing_fields)}", None
+
+    return None, map_rows(headers, reader, mapping)
+
+def process_json(body, mapping):
+    """Validate the first record and map all records of a JSON document"""
+    data = json.loads(body.read())
+
+    # Ensure data is a list
+    if not isinstance(data, list):
+        data = [data]
+
+    if len(data) == 0:
+        return "JSON file contains no records", None
+
+    missing_fields = missing_required_fields(data[0], mapping, case_sensitive=True)
+    if missing_fields:
+        return f"Missing mappable fields: {', '.join(missing_fields)}", None
+
+    return None, map_records(data, mapping)
+
+def process_excel(body, mapping):
+    """Map the rows of an Excel workbook (Excel files are not header-validated, as in validate_file)"""
+    df = pd.read_excel(io.BytesIO(body.read()))
+    return None, map_records(df.to_dict(orient='records'), mapping)
+
+def lambda_handler(event, context):
+    """Lambda handler that validates, detects, parses and maps a small file in one pass"""
+    logger.info(f"Received event: {json.dumps(event)}")
+
+    bucket = event.get('bucket', 'unknown')
+    key = event.get('key', 'unknown')
+    mapping_source = event.get('mappingSource', 'default')
+    extension = key.split('.')[-1].lower()
+    file_type = detect_file_type(key)
+
+    result = {
+        'bucket': bucket,
+        'key': key,
+        'mappingSource': mapping_source,
+        'validation': {'isValid': False, 'errors': []},
+        'fileType': {
+            'type': file_type,
+            'extension': extension
+        },
+        'mappedData': {
+            'total': 0,
+            'valid': 0,
+            'invalid': 0,
+            'records': []
+        }
+    }
+
+    try:
+        if file_type == 'unknown':
+            result['validation']['errors'].append(f"Unsupported file type: {extension}")
+            return result
+
+        field_mappings = get_field_mappings(mapping_source)
+
+        # Stream the object once; nothing is handed to another state until mapping is done
+        response = s3.get_object(Bucket=bucket, Key=key)
+        body = response['Body']
+
+        if file_type == 'csv':
+            error, mapped_records = process_delimited(body, field_mappings)
+        elif file_type == 'text':
+            error, mapped_records = process_delimited(body, field_mappings, detect_delimiter=True)
+        elif file_type == 'json':
+            error, mapped_records = process_json(body, field_mappings)
+        else:
+            error, mapped_records = process_excel(body, field_mappings)
+
+        if error:
+            result['validation']['errors'].append(error)
+            return result
+
+        result['validation']['isValid'] = True
+
+        total = 0
+        valid_records = []
+        for record in mapped_records:
+            total += 1
+            if record['name'] is not None and record['auth_id'] is not None:
+                valid_records.append(record)
+
+        result['mappedData'] = {
+            'total': total,
+            'valid': len(valid_records),
+            'invalid': total - len(valid_records),
+            'records': valid_records
+        }
+
+        logger.info(f"Mapped {total} records, {len(valid_records)} valid")
+
+        return result
+
+    except Exception as e:
+        logger.error(f"Error in small file processing lambda: {str(e)}")
+        result['validation'] = {
+            'isValid': False,
+            'errors': [f"Small file processing error: {str(e)}"]
+        }
+        return result
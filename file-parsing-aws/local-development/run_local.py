@@ -0,0 +1,355 @@
+"""
+In-process runner for the file processing state machine.
+
+Loads statemachine/file_processing.asl.json, imports each Lambda handler from
+functions/<name>/app.py and executes the workflow against moto-backed S3,
+DynamoDB and SNS. Every state is timed and its output payload size and peak
+Python memory are recorded, so the pipeline can be profiled on a laptop.
+
+Usage:
+    python local-development/run_local.py sample_files/sample_data.csv
+    python local-development/run_local.py big.csv --mapping-source vendor2 --repeat 5
+"""
+import argparse
+import importlib.util
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+import uuid
+
+import boto3
+
+try:
+    from moto import mock_aws
+
+    def aws_mock():
+        return mock_aws()
+except ImportError:  # moto < 5
+    from contextlib import ExitStack
+    from moto import mock_s3, mock_dynamodb, mock_sns
+
+    def aws_mock():
+        stack = ExitStack()
+        for mock in (mock_s3(), mock_dynamodb(), mock_sns()):
+            stack.enter_context(mock)
+        return stack
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFINITION_PATH = os.path.join(PROJECT_DIR, 'statemachine', 'file_processing.asl.json')
+FUNCTIONS_DIR = os.path.join(PROJECT_DIR, 'functions')
+
+BUCKET_NAME = 'local-upload-bucket'
+RECORDS_TABLE = 'local-records-table'
+FIELD_MAPPINGS_TABLE = 'local-field-mappings-table'
+
+# Step Functions rejects state input/output larger than 256 KB
+MAX_PAYLOAD_BYTES = 256 * 1024
+
+SUBSTITUTION_PATTERN = re.compile(r'^\$\{(\w+)FunctionArn\}$')
+SDK_RESOURCE_PATTERN = re.compile(r'^arn:aws:states:::aws-sdk:(\w+):(\w+)$')
+
+
+class StateMachineError(Exception):
+    """Error raised inside a state, carrying a Step Functions error name"""
+
+    def __init__(self, error, cause):
+        super().__init__(f"{error}: {cause}")
+        self.error = error
+        self.cause = cause
+
+
+class LambdaContext:
+    """Minimal stand-in for the Lambda context object"""
+
+    def __init__(self, function_name):
+        self.function_name = function_name
+        self.invoked_function_arn = f"arn:aws:lambda:us-east-1:000000000000:function:{function_name}"
+        self.aws_request_id = str(uuid.uuid4())
+
+
+def to_snake_case(name):
+    """ValidateFile -> validate_file"""
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower()
+
+
+def load_handler(function_name):
+    """Import functions/<function_name>/app.py under a unique module name"""
+    path = os.path.join(FUNCTIONS_DIR, function_name, 'app.py')
+    spec = importlib.util.spec_from_file_location(f"{function_name}_app", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.lambda_handler
+
+
+def get_path(data, path):
+    """Resolve a simple JSONPath ($, $.a.b) against data"""
+    if path == '$':
+        return data
+    value = data
+    for part in path[2:].split('.'):
+        if not isinstance(value, dict) or part not in value:
+            raise StateMachineError('States.Runtime', f"Path {path} not found in input")
+        value = value[part]
+    return value
+
+
+def set_path(data, path, value):
+    """Apply a ResultPath, returning the new state data"""
+    if path is None:
+        return data
+    if path == '$':
+        return value
+    result = dict(data)
+    target = result
+    parts = path[2:].split('.')
+    for part in parts[:-1]:
+        target[part] = dict(target.get(part, {}))
+        target = target[part]
+    target[parts[-1]] = value
+    return result
+
+
+def resolve_parameters(template, data):
+    """Build a Parameters/ResultSelector payload, resolving keys ending in .$"""
+    if isinstance(template, dict):
+        resolved = {}
+        for key, value in template.items():
+            if key.endswith('.$'):
+                resolved[key[:-2]] = get_path(data, value)
+            else:
+                resolved[key] = resolve_parameters(value, data)
+        return resolved
+    if isinstance(template, list):
+        return [resolve_parameters(item, data) for item in template]
+    return template
+
+
+def evaluate_rule(rule, data):
+    """Evaluate a single Choice rule"""
+    if 'And' in rule:
+        return all(evaluate_rule(r, data) for r in rule['And'])
+    if 'Or' in rule:
+        return any(evaluate_rule(r, data) for r in rule['Or'])
+    if 'Not' in rule:
+        return not evaluate_rule(rule['Not'], data)
+
+    variable = rule['Variable']
+    if 'IsPresent' in rule:
+        try:
+            get_path(data, variable)
+            return rule['IsPresent']
+        except StateMachineError:
+            return not rule['IsPresent']
+
+    value = get_path(data, variable)
+    comparisons = {
+        'BooleanEquals': lambda a, b: a is b,
+        'StringEquals': lambda a, b: a == b,
+        'NumericEquals': lambda a, b: a == b,
+        'NumericGreaterThan': lambda a, b: a > b,
+        'NumericGreaterThanEquals': lambda a, b: a >= b,
+        'NumericLessThan': lambda a, b: a < b,
+        'NumericLessThanEquals': lambda a, b: a <= b,
+    }
+    for operator, compare in comparisons.items():
+        if operator in rule:
+            return compare(value, rule[operator])
+        if f"{operator}Path" in rule:
+            return compare(value, get_path(data, rule[f"{operator}Path"]))
+
+    raise StateMachineError('States.Runtime', f"Unsupported choice rule: {rule}")
+
+
+class LocalStateMachine:
+    """Executes an ASL definition with in-process Lambda handlers"""
+
+    def __init__(self, definition, measure_memory=True):
+        self.definition = definition
+        self.measure_memory = measure_memory
+        self.handlers = {}
+        self.clients = {}
+
+    def invoke_task(self, state_name, resource, payload):
+        """Run a Task resource: a substituted Lambda ARN or an aws-sdk integration"""
+        match = SUBSTITUTION_PATTERN.match(resource)
+        if match:
+            function_name = to_snake_case(match.group(1))
+            if function_name not in self.handlers:
+                self.handlers[function_name] = load_handler(function_name)
+            # Round-trip through JSON like the Lambda service does
+            event = json.loads(json.dumps(payload, default=str))
+            return json.loads(json.dumps(self.handlers[function_name](event, LambdaContext(function_name)), default=str))
+
+        match = SDK_RESOURCE_PATTERN.match(resource)
+        if match:
+            service, action = match.groups()
+            if service not in self.clients:
+                self.clients[service] = boto3.client(service)
+            try:
+                response = getattr(self.clients[service], to_snake_case(action))(**payload)
+            except Exception as e:
+                raise StateMachineError(f"{service.capitalize()}.{type(e).__name__}", str(e))
+            response.pop('ResponseMetadata', None)
+            return json.loads(json.dumps(response, default=str))
+
+        raise StateMachineError('States.Runtime', f"Unsupported resource in {state_name}: {resource}")
+
+    def run_state(self, name, state, data):
+        """Execute one state, returning (output, next state name or None)"""
+        state_type = state['Type']
+
+        if state_type == 'Choice':
+            for rule in state.get('Choices', []):
+                if evaluate_rule(rule, data):
+                    return data, rule['Next']
+            if 'Default' not in state:
+                raise StateMachineError('States.NoChoiceMatched', name)
+            return data, state['Default']
+
+        if state_type in ('Succeed', 'Fail'):
+            return data, None
+
+        effective_input = get_path(data, state.get('InputPath', '$'))
+        if 'Parameters' in state:
+            effective_input = resolve_parameters(state['Parameters'], effective_input)
+
+        if state_type == 'Pass':
+            result = state.get('Result', effective_input)
+        elif state_type == 'Task':
+            try:
+                result = self.invoke_task(name, state['Resource'], effective_input)
+            except Exception as e:
+                error = e.error if isinstance(e, StateMachineError) else type(e).__name__
+                for catcher in state.get('Catch', []):
+                    if 'States.ALL' in catcher['ErrorEquals'] or error in catcher['ErrorEquals']:
+                        error_output = {'Error': error, 'Cause': str(e)}
+                        return set_path(data, catcher.get('ResultPath', '$'), error_output), catcher['Next']
+                raise
+            if 'ResultSelector' in state:
+                result = resolve_parameters(state['ResultSelector'], result)
+        else:
+            raise StateMachineError('States.Runtime', f"Unsupported state type: {state_type}")
+
+        output = set_path(data, state.get('ResultPath', '$'), result)
+        output = get_path(output, state.get('OutputPath', '$'))
+        return output, None if state.get('End') else state['Next']
+
+    def execute(self, execution_input):
+        """Run the workflow and return (final output, per-state metrics)"""
+        metrics = []
+        data = execution_input
+        name = self.definition['StartAt']
+
+        if self.measure_memory:
+            tracemalloc.start()
+
+        try:
+            while name:
+                state = self.definition['States'][name]
+                if self.measure_memory:
+                    tracemalloc.reset_peak()
+                    baseline, _ = tracemalloc.get_traced_memory()
+
+                start = time.perf_counter()
+                data, next_name = self.run_state(name, state, data)
+                duration_ms = (time.perf_counter() - start) * 1000
+
+                peak_kb = None
+                if self.measure_memory:
+                    _, peak = tracemalloc.get_traced_memory()
+                    peak_kb = (peak - baseline) / 1024
+
+                metrics.append({
+                    'state': name,
+                    'type': state['Type'],
+                    'duration_ms': duration_ms,
+                    'payload_bytes': len(json.dumps(data, default=str).encode('utf-8')),
+                    'peak_memory_kb': peak_kb,
+                })
+                name = next_name
+        finally:
+            if self.measure_memory:
+                tracemalloc.stop()
+
+        return data, metrics
+
+
+def setup_resources(file_path, key):
+    """Create the bucket and tables in moto and upload the input file"""
+    s3 = boto3.client('s3')
+    s3.create_bucket(Bucket=BUCKET_NAME)
+    with open(file_path, 'rb') as f:
+        s3.put_object(Bucket=BUCKET_NAME, Key=key, Body=f.read())
+
+    dynamodb = boto3.client('dynamodb')
+    dynamodb.create_table(
+        TableName=RECORDS_TABLE,
+        AttributeDefinitions=[{'AttributeName': 'auth_id', 'AttributeType': 'S'}],
+        KeySchema=[{'AttributeName': 'auth_id', 'KeyType': 'HASH'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    dynamodb.create_table(
+        TableName=FIELD_MAPPINGS_TABLE,
+        AttributeDefinitions=[{'AttributeName': 'mapping_name', 'AttributeType': 'S'}],
+        KeySchema=[{'AttributeName': 'mapping_name', 'KeyType': 'HASH'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+def print_report(metrics, run):
+    """Print a per-state timing table"""
+    print(f"\nRun {run}")
+    print(f"{'State':<26}{'Type':<8}{'ms':>10}{'payload KB':>13}{'peak mem KB':>14}")
+    for m in metrics:
+        memory = f"{m['peak_memory_kb']:.1f}" if m['peak_memory_kb'] is not None else '-'
+        warning = '  <-- exceeds 256 KB' if m['payload_bytes'] > MAX_PAYLOAD_BYTES else ''
+        print(f"{m['state']:<26}{m['type']:<8}{m['duration_ms']:>10.2f}"
+              f"{m['payload_bytes'] / 1024:>13.1f}{memory:>14}{warning}")
+    print(f"{'Total':<34}{sum(m['duration_ms'] for m in metrics):>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the file processing state machine in-process')
+    parser.add_argument('file', help='Local file to upload and process')
+    parser.add_argument('--mapping-source', default='default', help='Field mapping name')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of executions (the first includes imports)')
+    parser.add_argument('--no-memory', action='store_true', help='Skip tracemalloc for lower-overhead timings')
+    parser.add_argument('--json', action='store_true', help='Print metrics as JSON')
+    args = parser.parse_args()
+
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    os.environ['DYNAMODB_TABLE'] = RECORDS_TABLE
+    os.environ['FIELD_MAPPINGS_TABLE'] = FIELD_MAPPINGS_TABLE
+    os.environ['UPLOAD_BUCKET'] = BUCKET_NAME
+
+    with open(DEFINITION_PATH) as f:
+        definition = json.load(f)
+
+    key = f"uploads/{os.path.basename(args.file)}"
+
+    with aws_mock():
+        setup_resources(args.file, key)
+        machine = LocalStateMachine(definition, measure_memory=not args.no_memory)
+        execution_input = {'bucket': BUCKET_NAME, 'key': key, 'mappingSource': args.mapping_source}
+
+        runs = []
+        for run in range(1, args.repeat + 1):
+            output, metrics = machine.execute(execution_input)
+            runs.append({'run': run, 'output': output, 'metrics': metrics})
+
+    if args.json:
+        print(json.dumps(runs, indent=2, default=str))
+        return
+
+    for run in runs:
+        print_report(run['metrics'], run['run'])
+    print(f"\nFinal output: {json.dumps(runs[-1]['output'], default=str)[:500]}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import re
+import pickle
+from array import array
+from collections import Counter
+
+DIRECTIONS = {
+    'N', 'S', 'E', 'W', 'NE', 'NW', 'SE', 'SW',
+    'NORTH', 'SOUTH', 'EAST', 'WEST', 'NORTHEAST', 'NORTHWEST', 'SOUTHEAST', 'SOUTHWEST'
+}
+
+HOUSE_NUMBER_PATTERN = re.compile(r'^\d+[A-Z]?$')
+ZIP_PATTERN = re.compile(r'^\d{5}$')
+
+SOUNDEX_CODES = {
+    **dict.fromkeys('BFPV', '1'),
+    **dict.fromkeys('CGJKQSXZ', '2'),
+    **dict.fromkeys('DT', '3'),
+    'L': '4',
+    **dict.fromkeys('MN', '5'),
+    'R': '6',
+}
+
+def soundex(word):
+    """
+    American Soundex code of a word ('MAIN' and 'MAINE' are both 'M500').
+    """
+    letters = [char for char in word.upper() if char.isalpha()]
+    if not letters:
+        return ''
+
+    code = letters[0]
+    previous = SOUNDEX_CODES.get(letters[0], '')
+    for char in letters[1:]:
+        digit = SOUNDEX_CODES.get(char, '')
+        if digit and digit != previous:
+            code += digit
+        # H and W do not separate letters with the same code; vowels do
+        if char not in 'HW':
+            previous = digit
+    return (code + '000')[:4]
+
+def blocking_keys(std_address):
+    """
+    ZIP code, house number and phonetic street key of a standardized address.
+    Any of them is None when the address does not have it.
+    """
+    tokens = std_address.split()
+    zip_code = next((token for token in reversed(tokens) if ZIP_PATTERN.match(token)), None)
+
+    house_number = None
+    street_tokens = tokens
+    if tokens and HOUSE_NUMBER_PATTERN.match(tokens[0]):
+        house_number = tokens[0]
+        street_tokens = tokens[1:]
+
+    street = next((token for token in street_tokens if token not in DIRECTIONS and not token.isdigit()), None)
+    return zip_code, house_number, soundex(street) if street else None
+
+def ngrams(text, n=3):
+    """
+    Character n-grams of the address, padded so short tokens still produce grams.
+    """
+    padded = f' {text} '
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+class AddressIndex:
+    """
+    Candidate retrieval over a reference list of addresses, so the matcher only
+    runs its scorers on a few likely matches instead of the whole list.
+
+    Candidates come from blocks that share two of (ZIP, house number, street
+    key), topped up from a trigram inverted index when the blocks are small.
+    They are ranked by trigram overlap with the query.
+    """
+
+    def __init__(self, matcher, max_postings=50000, voting_grams=8):
+        """
+        max_postings: trigrams found in more addresses than this (e.g. ' NE',
+        'STR') are too common to narrow anything down and are skipped at query time.
+        voting_grams: how many of the query's rarest trigrams vote for candidates.
+        """
+        self.matcher = matcher
+        self.max_postings = max_postings
+        self.voting_grams = voting_grams
+        self.addresses = []
+        self.standardized = []
+        self.blocks = {}
+        self.postings = {}
+
+    def add(self, address, std_address=None):
+        """
+        Add one reference address; pass std_address if it is already standardized.
+        """
+        if std_address is None:
+            std_address = self.matcher.standardize_address(address)
+        address_id = len(self.addresses)
+        self.addresses.append(address)
+        self.standardized.append(std_address)
+
+        zip_code, house_number, street_key = blocking_keys(std_address)
+        for key in (('zip_house', zip_code, house_number),
+                    ('zip_street', zip_code, street_key),
+                    ('house_street', house_number, street_key)):
+            if key[1] is not None and key[2] is not None:
+                self.blocks.setdefault(key, array('I')).append(address_id)
+
+        for gram in ngrams(std_address):
+            self.postings.setdefault(gram, array('I')).append(address_id)
+
+    @classmethod
+    def build(cls, matcher, address_list, **kwargs):
+        """
+        Index a reference list, standardizing it once in bulk.
+        """
+        index = cls(matcher, **kwargs)
+        addresses = list(address_list)
+        for address, std_address in zip(addresses, matcher.standardize_many(addresses)):
+            index.add(address, std_address)
+        return index
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def candidate_ids(self, std_query, top_k):
+        zip_code, house_number, street_key = blocking_keys(std_query)
+        ids = set()
+        for key in (('zip_house', zip_code, house_number),
+                    ('zip_street', zip_code, street_key),
+                    ('house_street', house_number, street_key)):
+            ids.update(self.blocks.get(key, ()))
+
+        if len(ids) < top_k:
+            # Not enough blocked candidates: vote with the query's rarest trigrams
+            postings = sorted(
+                (posting for posting in map(self.postings.get, ngrams(std_query))
+                 if posting is not None and len(posting) <= self.max_postings),
+                key=len
+            )
+            votes = Counter()
+            for posting in postings[:self.voting_grams]:
+                votes.update(posting)
+            ids.update(address_id for address_id, _ in votes.most_common(top_k * 4))
+        return ids
+
+    def candidates(self, std_query, top_k=50):
+        """
+        Up to top_k (address, standardized address) pairs most similar to the
+        standardized query, by trigram Jaccard similarity.
+        """
+        query_grams = ngrams(std_query)
+
+        def similarity(address_id):
+            grams = ngrams(self.standardized[address_id])
+            return len(query_grams & grams) / len(query_grams | grams)
+
+        ranked = sorted(self.candidate_ids(std_query, top_k), key=similarity, reverse=True)[:top_k]
+        return [(self.addresses[address_id], self.standardized[address_id]) for address_id in ranked]
+
+    def save(self, path):
+        """
+        Write the index to disk. Load it with AddressIndex.load (pickle: only load files you wrote).
+        """
+        state = {
+            'max_postings': self.max_postings,
+            'voting_grams': self.voting_grams,
+            'addresses': self.addresses,
+            'standardized': self.standardized,
+            'blocks': self.blocks,
+            'postings': self.postings,
+        }
+        with open(path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path, matcher):
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        index = cls(matcher, max_postings=state['max_postings'], voting_grams=state['voting_grams'])
+        index.addresses = state['addresses']
+        index.standardized = state['standardized']
+        index.blocks = state['blocks']
+        index.postings = state['postings']
+        return index
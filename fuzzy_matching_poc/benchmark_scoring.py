@@ -0,0 +1,84 @@
+"""
+Benchmark bulk fuzzy matching: top-5 choices by fuzz.ratio for every query.
+
+Compares thefuzz's process.extract, one query at a time (what fuzzy_match used
+to do), with scoring.top_k, which scores query x choice matrices on all cores
+through rapidfuzz. thefuzz is only timed on a sample of the queries and the
+total is extrapolated; its answers on that sample are checked against top_k.
+
+Usage:
+    python benchmark_scoring.py
+    python benchmark_scoring.py --queries 10000 --choices 100000 --thefuzz-queries 20
+    python benchmark_scoring.py --score-cutoff 80 --workers 4
+"""
+import time
+import random
+import argparse
+
+from thefuzz import fuzz, process
+
+import scoring
+
+STREETS = ['Main', 'Oak', 'Pine', 'Maple', 'Cedar', 'Elm', 'Washington', 'Lake', 'Hill', 'Park',
+           'Sunset', 'River', 'Church', 'Mill', 'Spring', 'Ridge', 'Forest', 'Highland', 'Meadow', 'Jackson']
+STREET_TYPES = ['St', 'Street', 'Ave', 'Avenue', 'Rd', 'Road', 'Dr', 'Blvd', 'Ln', 'Ct']
+CITIES = [('New York', 'NY'), ('Boston', 'MA'), ('Austin', 'TX'), ('Denver', 'CO'), ('Seattle', 'WA')]
+
+def generate_addresses(count, seed):
+    rng = random.Random(seed)
+    addresses = []
+    for _ in range(count):
+        city, state = rng.choice(CITIES)
+        direction = rng.choice(['', '', 'N ', 'S '])
+        street = rng.choice(STREETS) + rng.choice(['', 's', 'wood'])
+        addresses.append(
+            f"{rng.randint(1, 9999)} {direction}{street} {rng.choice(STREET_TYPES)}, "
+            f"{city}, {state} {rng.randint(10000, 10400):05d}"
+        )
+    return addresses
+
+def run_thefuzz(queries, choices, limit, score_cutoff):
+    results = []
+    for query in queries:
+        matches = process.extract(query, choices, scorer=fuzz.ratio, limit=limit)
+        results.append([score for _, score in matches if score >= score_cutoff])
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark thefuzz against the bulk scoring backend")
+    parser.add_argument("--queries", type=int, default=10000, help="Number of query strings")
+    parser.add_argument("--choices", type=int, default=100000, help="Number of choice strings")
+    parser.add_argument("--limit", type=int, default=5, help="Matches kept per query")
+    parser.add_argument("--score-cutoff", type=int, default=0, help="Minimum score kept")
+    parser.add_argument("--workers", type=int, default=-1, help="Scoring threads (-1 for all cores)")
+    parser.add_argument("--thefuzz-queries", type=int, default=10, help="Queries timed with thefuzz")
+    args = parser.parse_args()
+
+    queries = generate_addresses(args.queries, seed=1)
+    choices = generate_addresses(args.choices, seed=2)
+    pairs = args.queries * args.choices
+    print(f"{args.queries} queries x {args.choices} choices = {pairs:,} pairs (backend: {scoring.BACKEND})")
+
+    start = time.perf_counter()
+    _, scores = scoring.top_k(queries, choices, k=args.limit, scorer='ratio', process=True,
+                              score_cutoff=args.score_cutoff, workers=args.workers)
+    bulk_seconds = time.perf_counter() - start
+    print(f"scoring.top_k: {bulk_seconds:.1f}s ({pairs / bulk_seconds / 1e6:.1f}M pairs/s)")
+
+    sample = queries[:args.thefuzz_queries]
+    start = time.perf_counter()
+    expected = run_thefuzz(sample, choices, args.limit, args.score_cutoff)
+    sample_seconds = time.perf_counter() - start
+    projected = sample_seconds / len(sample) * len(queries)
+    print(f"thefuzz process.extract: {sample_seconds:.1f}s for {len(sample)} queries, "
+          f"~{projected:.0f}s projected for {len(queries)} ({projected / bulk_seconds:.0f}x slower)")
+
+    # Ties can pick different choices, but the top scores must agree
+    agree = sum(
+        [int(score) for score in row if score >= args.score_cutoff][:len(reference)] == reference
+        for row, reference in zip(scores, expected)
+    )
+    print(f"Top-{args.limit} scores agree on {agree}/{len(sample)} sampled queries")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,24 @@
-from thefuzz import fuzz, process
+from functools import lru_cache
 import re
-import usaddress
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    np = pd = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+from address_index import AddressIndex
+from scoring import SCORERS, best_of, get_scorer
+
+NON_WORD_PATTERN = re.compile(r'[^\w\s]')
 
 class AddressMatcher:
-    def __init__(self):
+    def __init__(self, cache_size=100000):
         """Initialize the address matcher with common abbreviations and cleaners."""
         self.street_type_mapping = {
             'ST': 'STREET',
@@ -33,36 +48,64 @@ class AddressMatcher:
             'SE': 'SOUTHEAST',
             'SW': 'SOUTHWEST'
         }
+        
+        # Token -> expansion, built once (street types and directions never overlap)
+        self.abbreviations = {**self.street_type_mapping, **self.direction_mapping}
+        self.cache_size = cache_size
+        self._init_runtime()
+
+    def _init_runtime(self):
+        """Per-process state that cannot be pickled: the standardization cache and the scorers."""
+        self._standardize_cached = lru_cache(maxsize=self.cache_size)(self._standardize)
+        self.scorers = {name: get_scorer(name) for name in SCORERS}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_standardize_cached'], state['scorers']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_runtime()
 
     def standardize_address(self, address):
         """
         Standardize address format by expanding abbreviations and removing special characters.
+        Results are cached, so repeated addresses are only standardized once.
         """
         if not address:
             return ""
-            
-        # Convert to uppercase
-        address = address.upper()
-        
-        # Parse address using usaddress library
-        try:
-            parsed_addr, addr_type = usaddress.tag(address)
-        except:
-            return address
-            
-        # Expand street type abbreviations
-        for abbr, full in self.street_type_mapping.items():
-            address = re.sub(r'\b' + abbr + r'\b', full, address)
-            
-        # Expand directional abbreviations
-        for abbr, full in self.direction_mapping.items():
-            address = re.sub(r'\b' + abbr + r'\b', full, address)
-            
-        # Remove special characters and extra spaces
-        address = re.sub(r'[^\w\s]', ' ', address)
-        address = re.sub(r'\s+', ' ', address).strip()
-        
-        return address
+        return self._standardize_cached(address)
+
+    def _standardize(self, address):
+        # Special characters become token separators; then every token is expanded with one dict lookup
+        tokens = NON_WORD_PATTERN.sub(' ', address.upper()).split()
+        return ' '.join([self.abbreviations.get(token, token) for token in tokens])
+
+    def standardize_many(self, addresses):
+        """
+        Standardize a batch of addresses: a pandas Series, a pyarrow Array or
+        ChunkedArray, or any list of strings. Each distinct value is standardized
+        once and the results are mapped back to every row with a vectorized take
+        (plain iterables go through the cache instead). Missing values become "".
+        Returns the same kind of container it was given, or a list.
+        """
+        if pa is not None and isinstance(addresses, (pa.Array, pa.ChunkedArray)):
+            array = addresses.combine_chunks() if isinstance(addresses, pa.ChunkedArray) else addresses
+            encoded = array.dictionary_encode()
+            dictionary = pa.array(
+                [self.standardize_address(value) for value in encoded.dictionary.to_pylist()],
+                type=pa.string()
+            )
+            return dictionary.take(encoded.indices).fill_null("")
+
+        if pd is not None and isinstance(addresses, pd.Series):
+            codes, uniques = pd.factorize(addresses)
+            # Missing values get code -1, which picks the trailing ""
+            standardized = np.array([self.standardize_address(value) for value in uniques] + [""], dtype=object)[codes]
+            return pd.Series(standardized, index=addresses.index, name=addresses.name)
+
+        return [self.standardize_address(address) for address in addresses]
 
     def compare_addresses(self, addr1, addr2):
         """
@@ -72,35 +115,43 @@ class AddressMatcher:
         std_addr1 = self.standardize_address(addr1)
         std_addr2 = self.standardize_address(addr2)
         
-        # Calculate different similarity scores
-        scores = {
-            'ratio': fuzz.ratio(std_addr1, std_addr2),
-            'partial_ratio': fuzz.partial_ratio(std_addr1, std_addr2),
-            'token_sort_ratio': fuzz.token_sort_ratio(std_addr1, std_addr2),
-            'token_set_ratio': fuzz.token_set_ratio(std_addr1, std_addr2)
-        }
-        
-        return scores
+        return self.compare_standardized(std_addr1, std_addr2)
+
+    def compare_standardized(self, std_addr1, std_addr2):
+        """
+        Similarity scores of two addresses that are already standardized.
+        """
+        return {name: scorer(std_addr1, std_addr2) for name, scorer in self.scorers.items()}
 
-    def find_matches(self, query_address, address_list, threshold=80):
+    def find_matches(self, query_address, address_list, threshold=80, top_k=50):
         """
         Find matching addresses from a list that exceed the similarity threshold.
         
+        address_list can also be an AddressIndex built over the reference list,
+        in which case only its top_k candidates for the query are scored.
+        All candidates are scored in one batch, skipping pairs early once they
+        cannot reach the threshold.
+        
         Returns list of tuples (address, score, match_type)
         """
-        matches = []
         std_query = self.standardize_address(query_address)
         
-        for addr in address_list:
-            scores = self.compare_addresses(query_address, addr)
-            
-            # Get the best score and its type
-            best_score = max(scores.values())
-            best_match_type = max(scores.items(), key=lambda x: x[1])[0]
-            
-            if best_score >= threshold:
-                matches.append((addr, best_score, best_match_type))
-                
+        if isinstance(address_list, AddressIndex):
+            candidates = address_list.candidates(std_query, top_k)
+        else:
+            addresses = list(address_list)
+            candidates = list(zip(addresses, self.standardize_many(addresses)))
+        if not candidates:
+            return []
+        
+        # Best score over all scorers for every candidate, and which scorer gave it
+        scores, scorer_ids = best_of([std_query], [std_addr for _, std_addr in candidates], score_cutoff=threshold)
+        
+        matches = [
+            (addr, int(score), SCORERS[scorer_id])
+            for (addr, _), score, scorer_id in zip(candidates, scores[0], scorer_ids[0])
+            if score >= threshold
+        ]
         return sorted(matches, key=lambda x: x[1], reverse=True)
 
 def demonstrate_address_matching():
@@ -130,6 +181,13 @@ def demonstrate_address_matching():
         print(f"Score: {score}")
         print(f"Match Type: {match_type}")
         print("-" * 50)
+    
+    # Large reference lists: build an index once and score only its candidates
+    index = AddressIndex.build(matcher, addresses)
+    query = "123 Maine Street, New York, NY 10001"
+    print(f"\nSearching the index for: {query}")
+    for addr, score, match_type in matcher.find_matches(query, index, top_k=5):
+        print(f"{addr}: {score} ({match_type})")
 
 if __name__ == "__main__":
     demonstrate_address_matching()
\ No newline at end of file
@@ -1,4 +1,6 @@
-from thefuzz import fuzz, process
+from thefuzz import fuzz
+
+from scoring import top_k
 
 def fuzzy_match(query, choices, threshold=50):
     """
@@ -12,8 +14,10 @@ def fuzzy_match(query, choices, threshold=50):
     Returns:
     list: Matching results above threshold, sorted by score
     """
-    # Get all matches with their scores
-    matches = process.extract(query, choices, scorer=fuzz.ratio)
+    # Get the 5 best matches with their scores (same scores as thefuzz's process.extract)
+    choices = list(choices)
+    indices, scores = top_k([query], choices, k=5, scorer='ratio', process=True)
+    matches = [(choices[i], int(score)) for i, score in zip(indices[0], scores[0]) if i >= 0]
     
     # Print all scores before filtering
     print("\nAll scores before filtering:")
@@ -24,6 +28,18 @@ def fuzzy_match(query, choices, threshold=50):
     good_matches = [(match, score) for match, score in matches if score >= threshold]
     return sorted(good_matches, key=lambda x: x[1], reverse=True)
 
+def fuzzy_match_many(queries, choices, threshold=50, limit=5, workers=-1):
+    """
+    Batch version of fuzzy_match: the best `limit` choices for every query,
+    scored on all cores.
+    
+    Returns:
+    tuple: (indices, scores) NumPy arrays of shape (len(queries), limit), sorted
+    by score; slots with no choice above threshold hold index -1
+    """
+    return top_k(queries, choices, k=limit, scorer='ratio', process=True,
+                 score_cutoff=threshold, workers=workers)
+
 def demonstrate_fuzzy_matching():
     # Sample data
     company_names = [
@@ -64,6 +80,13 @@ def demonstrate_fuzzy_matching():
     print("\nFiltered matches:")
     for match, score in matches:
         print(f"{match}: {score}")
+    
+    # Many queries at once
+    queries = ["apple inc", "microsoft corp", "amazon inc"]
+    indices, scores = fuzzy_match_many(queries, company_names, threshold)
+    print("\nBatch matches:")
+    for query, row, row_scores in zip(queries, indices, scores):
+        print(f"{query}: {[(company_names[i], int(score)) for i, score in zip(row, row_scores) if i >= 0]}")
 
 if __name__ == "__main__":
     demonstrate_fuzzy_matching()
\ No newline at end of file
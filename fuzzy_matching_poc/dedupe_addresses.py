@@ -0,0 +1,311 @@
+"""
+Cluster duplicate addresses within one large file.
+
+The job runs in two streamed passes over a process pool:
+
+1. Read the address column in batches, standardize each batch in a worker and
+   spill the rows to one of `partitions` Parquet files by hashing their block
+   key (ZIP code + phonetic street key). Rows without a block key cannot have
+   duplicates found for them and go straight to the output as their own cluster.
+2. Cluster one partition file at a time: identical standardized addresses are
+   merged directly, the distinct ones are scored pairwise within each block,
+   and matching pairs are connected with union-find. Only equal house numbers
+   are joined; an address without one joins its single best match.
+
+Every block lives in exactly one partition, so clusters never span partitions
+and memory is bounded by the largest partition rather than the whole file.
+A cluster id is the smallest row id in the cluster; row ids are 0-based row
+positions in the input.
+
+Usage:
+    python dedupe_addresses.py addresses.parquet clusters.parquet --column address
+    python dedupe_addresses.py addresses.csv clusters.parquet --threshold 92 --processes 8
+"""
+import os
+import zlib
+import argparse
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from address_index import blocking_keys
+from compare_address import AddressMatcher
+from scoring import SCORERS, best_of
+
+SPILL_SCHEMA = pa.schema([
+    ('row_id', pa.int64()),
+    ('address', pa.string()),
+    ('std_address', pa.string()),
+    ('house_number', pa.string()),
+    ('block_key', pa.string()),
+])
+
+OUTPUT_SCHEMA = pa.schema([
+    ('row_id', pa.int64()),
+    ('address', pa.string()),
+    ('std_address', pa.string()),
+    ('cluster_id', pa.int64()),
+])
+
+# One matcher per worker process, so its standardization cache is reused across batches
+_matcher = None
+
+def get_matcher():
+    global _matcher
+    if _matcher is None:
+        _matcher = AddressMatcher()
+    return _matcher
+
+class UnionFind:
+    """
+    Disjoint sets over 0..n-1 with path halving and union by size.
+    """
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+
+    def roots(self):
+        return np.array([self.find(x) for x in range(len(self.parent))], dtype=np.int64)
+
+def read_batches(path, column, batch_size):
+    """
+    The address column of a Parquet or CSV file, batch_size rows at a time.
+    """
+    if path.endswith('.csv'):
+        reader = pa_csv.open_csv(
+            path,
+            # Roughly batch_size rows of ~64 bytes per block
+            read_options=pa_csv.ReadOptions(block_size=max(batch_size * 64, 1 << 20)),
+            convert_options=pa_csv.ConvertOptions(include_columns=[column], column_types={column: pa.string()})
+        )
+        for batch in reader:
+            yield batch.column(0)
+    else:
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=[column]):
+            yield batch.column(0).cast(pa.string())
+
+def bounded_map(executor, fn, args_iter, max_pending):
+    """
+    executor.map that only keeps max_pending tasks in flight (executor.map
+    would read the whole input up front). Results come back in order.
+    """
+    pending = deque()
+    for args in args_iter:
+        pending.append(executor.submit(fn, *args))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def standardize_batch(first_row_id, addresses, partitions):
+    """
+    Worker: standardize a batch and assign every row to a partition
+    (-1 for rows without a block key).
+    """
+    std_addresses = get_matcher().standardize_many(addresses).to_pylist()
+    houses, block_keys, partition_ids = [], [], []
+    for std_address in std_addresses:
+        zip_code, house_number, street_key = blocking_keys(std_address)
+        block_key = f'{zip_code} {street_key}' if zip_code and street_key else None
+        houses.append(house_number)
+        block_keys.append(block_key)
+        partition_ids.append(zlib.crc32(block_key.encode()) % partitions if block_key else -1)
+
+    table = pa.table([
+        pa.array(np.arange(first_row_id, first_row_id + len(addresses), dtype=np.int64)),
+        addresses,
+        pa.array(std_addresses, type=pa.string()),
+        pa.array(houses, type=pa.string()),
+        pa.array(block_keys, type=pa.string()),
+    ], schema=SPILL_SCHEMA)
+    return table, np.array(partition_ids, dtype=np.int64)
+
+def matching_pairs(std_addresses, house_codes, threshold, scorers, max_cells):
+    """
+    Index pairs (i, j) of distinct addresses in one block whose best score
+    reaches the threshold. Addresses with house numbers only match when the
+    numbers are equal. An address without a house number is paired with its
+    single best match only: partial_ratio and token_set_ratio give it 100
+    against every number on the street, and union-find would otherwise chain
+    123, 125 and 999 Main St into one cluster through it.
+
+    Rows are scored in chunks so a chunk's score matrices stay under max_cells cells.
+    """
+    n = len(std_addresses)
+    chunk = max(1, max_cells // n)
+    # Best match of every address without a house number: (score, partner)
+    best = {}
+    for start in range(0, n - 1, chunk):
+        stop = min(n, start + chunk)
+        # Only the columns from `start` on: the rest of the lower triangle was scored already
+        scores, _ = best_of(std_addresses[start:stop], std_addresses[start:], scorers=scorers,
+                            score_cutoff=threshold, workers=1)
+        rows, cols = np.nonzero(scores >= threshold)
+        pair_scores = scores[rows, cols]
+        rows += start
+        cols += start
+        upper = cols > rows
+        rows, cols, pair_scores = rows[upper], cols[upper], pair_scores[upper]
+
+        house_rows, house_cols = house_codes[rows], house_codes[cols]
+        numbered = (house_rows >= 0) & (house_cols >= 0)
+        same = numbered & (house_rows == house_cols)
+        yield from zip(rows[same].tolist(), cols[same].tolist())
+
+        for i, j, score in zip(rows[~numbered].tolist(), cols[~numbered].tolist(), pair_scores[~numbered].tolist()):
+            for address, partner in ((i, j), (j, i)):
+                # Highest score wins, then the earliest partner
+                if house_codes[address] < 0 and (-score, partner) < best.get(address, (1, n)):
+                    best[address] = (-score, partner)
+
+    for address, (_, partner) in best.items():
+        yield address, partner
+
+def cluster_partition(path, threshold, scorers, max_cells):
+    """
+    Worker: cluster the rows of one partition file.
+    """
+    table = pq.read_table(path)
+    n = len(table)
+    row_ids = table.column('row_id').to_numpy()
+    std_addresses = table.column('std_address').to_numpy(zero_copy_only=False)
+    houses = table.column('house_number').to_numpy(zero_copy_only=False)
+    block_codes, _ = pd.factorize(table.column('block_key').to_numpy(zero_copy_only=False))
+
+    union_find = UnionFind(n)
+    order = np.argsort(block_codes, kind='stable')
+    for block in np.split(order, np.flatnonzero(np.diff(block_codes[order])) + 1):
+        if len(block) < 2:
+            continue
+        # Identical addresses join the first row with the same text; only distinct texts are scored
+        codes, uniques = pd.factorize(std_addresses[block])
+        first = block[np.unique(codes, return_index=True)[1]].tolist()
+        for position, code in zip(block.tolist(), codes.tolist()):
+            union_find.union(position, first[code])
+        if len(uniques) < 2:
+            continue
+        house_codes, _ = pd.factorize(houses[np.asarray(first)])
+        for i, j in matching_pairs(list(uniques), house_codes, threshold, scorers, max_cells):
+            union_find.union(first[i], first[j])
+
+    # Cluster id: the smallest row id in each set
+    roots = union_find.roots()
+    smallest = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(smallest, roots, row_ids)
+    return pa.table([
+        table.column('row_id'),
+        table.column('address'),
+        table.column('std_address'),
+        pa.array(smallest[roots]),
+    ], schema=OUTPUT_SCHEMA)
+
+def dedupe_addresses(input_path, output_path, column='address', threshold=90, scorers=SCORERS,
+                     partitions=64, batch_size=100000, processes=None, max_cells=4000000, work_dir=None):
+    """
+    Cluster the addresses in input_path (Parquet or CSV) and write one row per
+    input row, with its cluster_id, to the Parquet file output_path. Rows are
+    written partition by partition, not in input order.
+
+    partitions: number of spill files; raise it so that a partition fits in
+    memory (about 10M rows / 64 partitions = 160k rows each by default).
+    max_cells: size of the score matrices per scoring chunk within a block.
+    Returns the number of rows and clusters written.
+    """
+    processes = processes or os.cpu_count()
+    max_pending = processes * 2
+    rows = clusters = 0
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as spill_dir, \
+            ProcessPoolExecutor(max_workers=processes) as executor, \
+            pq.ParquetWriter(output_path, OUTPUT_SCHEMA) as output:
+        paths = [os.path.join(spill_dir, f'partition-{p:05d}.parquet') for p in range(partitions)]
+        writers = {}
+
+        def batches():
+            first_row_id = 0
+            for addresses in read_batches(input_path, column, batch_size):
+                yield first_row_id, addresses, partitions
+                first_row_id += len(addresses)
+
+        # Pass 1: standardize in parallel and spill rows to their partition
+        try:
+            for table, partition_ids in bounded_map(executor, standardize_batch, batches(), max_pending):
+                order = np.argsort(partition_ids, kind='stable')
+                table, partition_ids = table.take(order), partition_ids[order]
+                bounds = np.flatnonzero(np.diff(partition_ids)) + 1
+                for start, stop in zip(np.r_[0, bounds], np.r_[bounds, len(partition_ids)]):
+                    part = table.slice(start, stop - start)
+                    partition = int(partition_ids[start])
+                    if partition < 0:
+                        output.write_table(pa.table([
+                            part.column('row_id'), part.column('address'),
+                            part.column('std_address'), part.column('row_id'),
+                        ], schema=OUTPUT_SCHEMA))
+                        rows += len(part)
+                        clusters += len(part)
+                        continue
+                    if partition not in writers:
+                        writers[partition] = pq.ParquetWriter(paths[partition], SPILL_SCHEMA)
+                    writers[partition].write_table(part)
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+        # Pass 2: cluster the partitions in parallel, a few at a time
+        tasks = ((paths[p], threshold, scorers, max_cells) for p in sorted(writers))
+        for clustered in bounded_map(executor, cluster_partition, tasks, max_pending):
+            output.write_table(clustered)
+            rows += len(clustered)
+            clusters += len(pc.unique(clustered.column('cluster_id')))
+
+    return rows, clusters
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster duplicate addresses in a Parquet or CSV file")
+    parser.add_argument("input", help="Parquet or CSV file with an address column")
+    parser.add_argument("output", help="Parquet file to write row_id, address, std_address, cluster_id to")
+    parser.add_argument("--column", default="address", help="Name of the address column")
+    parser.add_argument("--threshold", type=int, default=90, help="Minimum score (0-100) for two addresses to match")
+    parser.add_argument("--partitions", type=int, default=64, help="Number of spill partitions")
+    parser.add_argument("--batch-size", type=int, default=100000, help="Rows read per batch")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--work-dir", default=None, help="Directory for the spill files (default: system temp)")
+    args = parser.parse_args()
+
+    rows, clusters = dedupe_addresses(
+        args.input, args.output,
+        column=args.column,
+        threshold=args.threshold,
+        partitions=args.partitions,
+        batch_size=args.batch_size,
+        processes=args.processes,
+        work_dir=args.work_dir
+    )
+    print(f"{rows} rows in {clusters} clusters written to {args.output}")
+
+if __name__ == "__main__":
+    main()
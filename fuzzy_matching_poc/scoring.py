@@ -0,0 +1,144 @@
+from functools import partial
+
+import numpy as np
+
+try:
+    from rapidfuzz import fuzz as rf_fuzz, process as rf_process
+except ImportError:
+    rf_fuzz = rf_process = None
+
+from thefuzz import fuzz, utils
+
+BACKEND = 'rapidfuzz' if rf_process is not None else 'thefuzz'
+
+# Scorer names in the order compare_addresses reports them (ties go to the first)
+SCORERS = ('ratio', 'partial_ratio', 'token_sort_ratio', 'token_set_ratio')
+
+# thefuzz lowercases and strips punctuation before these scorers, but not before ratio/partial_ratio
+PROCESSED_BY_DEFAULT = {'token_sort_ratio', 'token_set_ratio'}
+
+def _processor(scorer, process):
+    """
+    thefuzz's preprocessing for a scorer: token scorers always drop non-ASCII,
+    lowercase and strip punctuation; process=True (process.extract) does the
+    same but keeps non-ASCII letters.
+    """
+    if scorer in PROCESSED_BY_DEFAULT:
+        return partial(utils.full_process, force_ascii=True)
+    if process:
+        return utils.full_process
+    return None
+
+def get_scorer(name):
+    """
+    Pairwise scorer returning the same integer scores as thefuzz.fuzz.<name>.
+    """
+    if name not in SCORERS:
+        raise ValueError(f"Unknown scorer: {name}")
+    if rf_fuzz is None:
+        return getattr(fuzz, name)
+
+    scorer = getattr(rf_fuzz, name)
+    processor = _processor(name, False)
+
+    def score(s1, s2):
+        return int(round(scorer(s1, s2, processor=processor)))
+    return score
+
+def score_matrix(queries, choices, scorer='ratio', process=False, score_cutoff=0, workers=-1):
+    """
+    len(queries) x len(choices) uint8 matrix of scores, computed in bulk on
+    `workers` threads (-1 uses every core). Pairs scoring below score_cutoff
+    stop early and come back as 0.
+
+    process: lowercase and strip punctuation first, like thefuzz's process.extract.
+    """
+    if scorer not in SCORERS:
+        raise ValueError(f"Unknown scorer: {scorer}")
+    processor = _processor(scorer, process)
+
+    if rf_process is not None:
+        matrix = rf_process.cdist(
+            queries, choices,
+            scorer=getattr(rf_fuzz, scorer),
+            processor=processor,
+            # Half a point of slack: 49.5 still rounds to 50
+            score_cutoff=max(score_cutoff - 0.5, 0),
+            dtype=np.float32,
+            workers=workers
+        )
+        # Round half to even like thefuzz's round(); cdist's integer dtypes round half up
+        scores = np.rint(matrix, out=matrix).astype(np.uint8)
+        scores[scores < score_cutoff] = 0
+        return scores
+
+    # thefuzz fallback: one pair at a time
+    pairwise = getattr(fuzz, scorer)
+    if scorer in PROCESSED_BY_DEFAULT:
+        pairwise = partial(pairwise, full_process=False)
+    if processor is not None:
+        queries = [processor(query) for query in queries]
+        choices = [processor(choice) for choice in choices]
+    matrix = np.zeros((len(queries), len(choices)), dtype=np.uint8)
+    for i, query in enumerate(queries):
+        for j, choice in enumerate(choices):
+            score = pairwise(query, choice)
+            if score >= score_cutoff:
+                matrix[i, j] = score
+    return matrix
+
+def best_of(queries, choices, scorers=SCORERS, score_cutoff=0, workers=-1):
+    """
+    Best score over several scorers for every query x choice pair.
+    Returns (scores, scorer_ids) matrices; scorer_ids index into `scorers`.
+    """
+    stacked = np.stack([
+        score_matrix(queries, choices, scorer=scorer, score_cutoff=score_cutoff, workers=workers)
+        for scorer in scorers
+    ])
+    scorer_ids = stacked.argmax(axis=0)
+    scores = np.take_along_axis(stacked, scorer_ids[np.newaxis], axis=0)[0]
+    return scores, scorer_ids
+
+def top_k(queries, choices, k=5, scorer='ratio', process=False, score_cutoff=0, workers=-1, chunk_size=250):
+    """
+    The k best choices for every query, as (indices, scores) arrays of shape
+    (len(queries), k) sorted by descending score. Slots without a choice at or
+    above score_cutoff hold index -1 and score 0.
+
+    Queries are scored chunk_size at a time, so memory stays at
+    about 5 x chunk_size x len(choices) bytes however many queries there are.
+    """
+    choices = list(choices)
+    queries = list(queries)
+    if process:
+        # Process the choices once rather than once per chunk
+        choices = [utils.full_process(choice) for choice in choices]
+        queries = [utils.full_process(query) for query in queries]
+        process = False
+    k = min(k, len(choices))
+    indices = np.full((len(queries), k), -1, dtype=np.int64)
+    scores = np.zeros((len(queries), k), dtype=np.uint8)
+    if k == 0:
+        return indices, scores
+
+    for start in range(0, len(queries), chunk_size):
+        matrix = score_matrix(
+            queries[start:start + chunk_size], choices,
+            scorer=scorer, process=process, score_cutoff=score_cutoff, workers=workers
+        )
+        if k < len(choices):
+            best = np.argpartition(matrix, -k, axis=1)[:, -k:]
+        else:
+            best = np.broadcast_to(np.arange(len(choices)), matrix.shape)
+        best_scores = np.take_along_axis(matrix, best, axis=1)
+        # Descending score; equal scores keep the order of the choices
+        order = np.lexsort((best, -best_scores.astype(np.int16)), axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+
+        rows = slice(start, start + len(matrix))
+        kept = best_scores >= score_cutoff
+        indices[rows] = np.where(kept, best, -1)
+        scores[rows] = np.where(kept, best_scores, 0)
+    return indices, scores
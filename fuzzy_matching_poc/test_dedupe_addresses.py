@@ -0,0 +1,26 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dedupe_addresses import dedupe_addresses
+
+def test_address_without_house_number_does_not_chain_clusters(tmp_path):
+    addresses = [
+        "123 Main St, New York, NY 10001",
+        "125 Main St, New York, NY 10001",
+        "999 Main St, New York, NY 10001",
+        "17 Main St, New York, NY 10001",
+        "Main St, New York, NY 10001",
+        "123 Main Street, New York, NY 10001",
+    ]
+    input_path = tmp_path / "addresses.parquet"
+    output_path = tmp_path / "clusters.parquet"
+    pq.write_table(pa.table({"address": addresses}), input_path)
+
+    rows, _ = dedupe_addresses(str(input_path), str(output_path), partitions=2, processes=1)
+
+    clusters = dict(zip(*pq.read_table(output_path).select(["row_id", "cluster_id"]).to_pydict().values()))
+    assert rows == len(addresses)
+    assert clusters[5] == clusters[0]
+    # 123, 125, 999 and 17 Main St stay apart; the address without a number joins at most one of them
+    assert len({clusters[i] for i in range(4)}) == 4
+    assert clusters[4] in {clusters[i] for i in range(4)} | {4}
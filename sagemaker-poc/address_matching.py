@@ -6,7 +6,8 @@ import time
 import random
 import numpy as np
 import pandas as pd
-from difflib import SequenceMatcher
+from rapidfuzz import process
+from rapidfuzz.distance import Indel, Levenshtein
 import joblib
 import xgboost as xgb
 from sklearn.model_selection import train_test_split
@@ -102,67 +103,77 @@ class AddressStandardizer:
 # ----------------------
 # 2. Feature Generation
 # ----------------------
+FEATURE_COLUMNS = [
+    'levenshtein_sim',
+    'indel_sim',
+    'house_num_match',
+    'unit_match',
+    'zipcode_match',
+    'token_count_diff'
+]
+
 def levenshtein_distance(s1, s2):
-    if len(s1) < len(s2):
-        return levenshtein_distance(s2, s1)
-    if len(s2) == 0:
-        return len(s1)
-    previous_row = range(len(s2) + 1)
-    for i, c1 in enumerate(s1):
-        current_row = [i + 1]
-        for j, c2 in enumerate(s2):
-            insertions = previous_row[j + 1] + 1
-            deletions = current_row[j] + 1
-            substitutions = previous_row[j] + (c1 != c2)
-            current_row.append(min(insertions, deletions, substitutions))
-        previous_row = current_row
-    return previous_row[-1]
+    return Levenshtein.distance(s1, s2)
 
 def tokenize_address(address):
     if not address:
         return []
     return re.findall(r'\b\w+\b', address.lower())
 
-def generate_features(addr1, addr2, standardizer):
-    features = {}
-    
-    # Standardize addresses
-    std_addr1 = standardizer.standardize(addr1) if addr1 else ""
-    std_addr2 = standardizer.standardize(addr2) if addr2 else ""
-    
-    # Handle empty addresses
-    if not std_addr1 or not std_addr2:
-        return {
-            'levenshtein_sim': 0.0,
-            'seq_matcher_sim': 0.0,
-            'house_num_match': 0.0,
-            'unit_match': 0.0,
-            'zipcode_match': 0.0,
-            'token_count_diff': 0.0
-        }
-    
-    # String similarity metrics
-    max_len = max(len(std_addr1), len(std_addr2))
-    features['levenshtein_sim'] = 1 - (levenshtein_distance(std_addr1, std_addr2) / max_len if max_len > 0 else 0)
-    features['seq_matcher_sim'] = SequenceMatcher(None, std_addr1, std_addr2).ratio()
-    
-    # Extract components
-    comp1 = standardizer.parse_components(std_addr1)
-    comp2 = standardizer.parse_components(std_addr2)
-    
-    # Component matching
-    features['house_num_match'] = int(comp1['house_number'] == comp2['house_number'] and comp1['house_number'] is not None)
-    features['unit_match'] = int(comp1['unit'] == comp2['unit'] and comp1['unit'] is not None)
-    features['zipcode_match'] = int(comp1['zipcode'] == comp2['zipcode'] and comp1['zipcode'] is not None)
-    
-    # Token differences
-    tokens1 = tokenize_address(std_addr1)
-    tokens2 = tokenize_address(std_addr2)
-    max_tokens = max(len(tokens1), len(tokens2))
-    features['token_count_diff'] = abs(len(tokens1) - len(tokens2)) / max_tokens if max_tokens > 0 else 0
-    
+def component_codes(parsed, name):
+    # Equal component values get equal codes; a missing component gets -1
+    codes, _ = pd.factorize(np.array([components[name] for components in parsed], dtype=object))
+    return codes
+
+def generate_features_batch(addr1, addr2, standardizer, workers=-1):
+    """
+    Feature matrix for arrays of address pairs: one float32 row per pair,
+    columns in FEATURE_COLUMNS order, ready for model.predict_proba.
+
+    Each distinct address is standardized and parsed once. String similarities
+    run pairwise in native code on `workers` threads (-1 uses every core):
+    indel_sim is the indel similarity 2 * LCS / (len1 + len2), the exact form of
+    the ratio SequenceMatcher approximates; it replaces seq_matcher_sim, so a
+    model trained on that feature has to be retrained.
+    """
+    addr1, addr2 = list(addr1), list(addr2)
+    if len(addr1) != len(addr2):
+        raise ValueError(f"addr1 and addr2 must have the same length, got {len(addr1)} and {len(addr2)}")
+    addresses = pd.Series(addr1 + addr2, dtype=object).fillna('')
+    codes, uniques = pd.factorize(addresses)
+    n = len(addresses) // 2
+    codes1, codes2 = codes[:n], codes[n:]
+
+    std = np.array([standardizer.standardize(address) if address else "" for address in uniques], dtype=object)
+    parsed = [standardizer.parse_components(std_address) for std_address in std]
+    lengths = np.array([len(std_address) for std_address in std])
+    token_counts = np.array([len(tokenize_address(std_address)) for std_address in std])
+
+    features = np.zeros((n, len(FEATURE_COLUMNS)), dtype=np.float32)
+    if n == 0:
+        return features
+
+    features[:, 0] = process.cpdist(std[codes1], std[codes2], scorer=Levenshtein.normalized_similarity, workers=workers)
+    features[:, 1] = process.cpdist(std[codes1], std[codes2], scorer=Indel.normalized_similarity, workers=workers)
+
+    for column, name in ((2, 'house_number'), (3, 'unit'), (4, 'zipcode')):
+        component = component_codes(parsed, name)
+        features[:, column] = (component[codes1] == component[codes2]) & (component[codes1] >= 0)
+
+    tokens1, tokens2 = token_counts[codes1], token_counts[codes2]
+    features[:, 5] = np.abs(tokens1 - tokens2) / np.maximum(np.maximum(tokens1, tokens2), 1)
+
+    # Pairs with an empty address get all-zero features
+    features[(lengths[codes1] == 0) | (lengths[codes2] == 0)] = 0.0
     return features
 
+def generate_features(addr1, addr2, standardizer):
+    """
+    Features of a single address pair, as a dict keyed by FEATURE_COLUMNS.
+    """
+    row = generate_features_batch([addr1], [addr2], standardizer, workers=1)[0]
+    return {name: float(value) for name, value in zip(FEATURE_COLUMNS, row)}
+
 # ----------------------
 # 3. Sample Data Generation
 # ----------------------
@@ -233,18 +244,14 @@ standardizer = AddressStandardizer()
 training_data = generate_sample_data(n_samples=200)
 print(f"Generated {len(training_data)} training samples")
 
-# Process data
-features_list = []
-labels = []
-
-for pair in training_data:
-    features = generate_features(pair['addr1'], pair['addr2'], standardizer)
-    features_list.append(features)
-    labels.append(pair['is_match'])
-
-# Convert to DataFrame
-X = pd.DataFrame(features_list)
-y = np.array(labels)
+# Process data: one feature matrix for all pairs
+X = pd.DataFrame(
+    generate_features_batch([pair['addr1'] for pair in training_data],
+                            [pair['addr2'] for pair in training_data],
+                            standardizer),
+    columns=FEATURE_COLUMNS
+)
+y = np.array([pair['is_match'] for pair in training_data])
 
 # Split data
 X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
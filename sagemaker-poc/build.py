@@ -3,72 +3,173 @@
 # 5. Create Inference Script
 # ----------------------
 inference_script = """
+import io
 import os
 import re
+import csv
 import json
 import numpy as np
 import pandas as pd
 import joblib
-from difflib import SequenceMatcher
+from rapidfuzz import process
+from rapidfuzz.distance import Indel, Levenshtein
+
+# Class and function definitions (same as in notebook)
+class AddressStandardizer:
+    def __init__(self):
+        # Street type abbreviations
+        self.street_types = {
+            'avenue': 'ave',
+            'boulevard': 'blvd',
+            'street': 'st',
+            'road': 'rd',
+            'drive': 'dr',
+            'lane': 'ln',
+            'place': 'pl'
+        }
+        
+        # Unit type abbreviations
+        self.unit_types = {
+            'apartment': 'apt',
+            'suite': 'ste',
+            'unit': 'unit'
+        }
+        
+        # Patterns for components
+        self.house_number_pattern = re.compile(r'^\\d+')
+        self.zip_pattern = re.compile(r'\\b\\d{5}(?:-\\d{4})?\\b')
+        self.unit_pattern = re.compile(r'\\b(?:apt|suite|ste|unit|#)\\s*(?:[a-zA-Z0-9-]+)\\b', re.IGNORECASE)
+    
+    def standardize(self, address):
+        if not address:
+            return ""
+            
+        # Convert to lowercase
+        addr = address.lower()
+        
+        # Replace periods and commas with spaces
+        addr = addr.replace('.', ' ').replace(',', ' ')
+        
+        # Replace hash/pound sign with 'unit'
+        addr = re.sub(r'#\\s*', 'unit ', addr)
+        
+        # Standardize street types
+        for full, abbr in self.street_types.items():
+            addr = re.sub(r'\\b' + full + r'\\b', abbr, addr)
+            addr = re.sub(r'\\b' + abbr + r'\\.\\b', abbr, addr)
+        
+        # Standardize unit types
+        for full, abbr in self.unit_types.items():
+            addr = re.sub(r'\\b' + full + r'\\b', abbr, addr)
+            addr = re.sub(r'\\b' + abbr + r'\\.\\b', abbr, addr)
+        
+        # Remove extra whitespace
+        addr = ' '.join(addr.split())
+        
+        return addr
+    
+    def parse_components(self, address):
+        components = {
+            'house_number': None,
+            'unit': None,
+            'zipcode': None
+        }
+        
+        # Extract ZIP code
+        zip_match = self.zip_pattern.search(address)
+        if zip_match:
+            components['zipcode'] = zip_match.group()
+        
+        # Extract unit information
+        unit_match = self.unit_pattern.search(address)
+        if unit_match:
+            components['unit'] = unit_match.group()
+        
+        # Extract house number
+        house_match = self.house_number_pattern.search(address)
+        if house_match:
+            components['house_number'] = house_match.group()
+        
+        return components
+
+FEATURE_COLUMNS = [
+    'levenshtein_sim',
+    'indel_sim',
+    'house_num_match',
+    'unit_match',
+    'zipcode_match',
+    'token_count_diff'
+]
 
-# Function definitions (same as in notebook)
 def levenshtein_distance(s1, s2):
-    if len(s1) < len(s2):
-        return levenshtein_distance(s2, s1)
-    if len(s2) == 0:
-        return len(s1)
-    previous_row = range(len(s2) + 1)
-    for i, c1 in enumerate(s1):
-        current_row = [i + 1]
-        for j, c2 in enumerate(s2):
-            insertions = previous_row[j + 1] + 1
-            deletions = current_row[j] + 1
-            substitutions = previous_row[j] + (c1 != c2)
-            current_row.append(min(insertions, deletions, substitutions))
-        previous_row = current_row
-    return previous_row[-1]
+    return Levenshtein.distance(s1, s2)
 
 def tokenize_address(address):
     if not address:
         return []
     return re.findall(r'\\b\\w+\\b', address.lower())
 
-def generate_features(addr1, addr2, standardizer):
-    features = {}
-    std_addr1 = standardizer.standardize(addr1) if addr1 else ""
-    std_addr2 = standardizer.standardize(addr2) if addr2 else ""
-    if not std_addr1 or not std_addr2:
-        return {
-            'levenshtein_sim': 0.0,
-            'seq_matcher_sim': 0.0,
-            'house_num_match': 0.0,
-            'unit_match': 0.0,
-            'zipcode_match': 0.0,
-            'token_count_diff': 0.0
-        }
-    max_len = max(len(std_addr1), len(std_addr2))
-    features['levenshtein_sim'] = 1 - (levenshtein_distance(std_addr1, std_addr2) / max_len if max_len > 0 else 0)
-    features['seq_matcher_sim'] = SequenceMatcher(None, std_addr1, std_addr2).ratio()
-    comp1 = standardizer.parse_components(std_addr1)
-    comp2 = standardizer.parse_components(std_addr2)
-    features['house_num_match'] = int(comp1['house_number'] == comp2['house_number'] and comp1['house_number'] is not None)
-    features['unit_match'] = int(comp1['unit'] == comp2['unit'] and comp1['unit'] is not None)
-    features['zipcode_match'] = int(comp1['zipcode'] == comp2['zipcode'] and comp1['zipcode'] is not None)
-    tokens1 = tokenize_address(std_addr1)
-    tokens2 = tokenize_address(std_addr2)
-    max_tokens = max(len(tokens1), len(tokens2))
-    features['token_count_diff'] = abs(len(tokens1) - len(tokens2)) / max_tokens if max_tokens > 0 else 0
+def component_codes(parsed, name):
+    # Equal component values get equal codes; a missing component gets -1
+    codes, _ = pd.factorize(np.array([components[name] for components in parsed], dtype=object))
+    return codes
+
+# Feature matrix for arrays of address pairs (one float32 row per pair, FEATURE_COLUMNS order).
+# Each distinct address is standardized once; string similarities run in native code on all cores.
+def generate_features_batch(addr1, addr2, standardizer, workers=-1):
+    addr1, addr2 = list(addr1), list(addr2)
+    if len(addr1) != len(addr2):
+        raise ValueError(f"addr1 and addr2 must have the same length, got {len(addr1)} and {len(addr2)}")
+    addresses = pd.Series(addr1 + addr2, dtype=object).fillna('')
+    codes, uniques = pd.factorize(addresses)
+    n = len(addresses) // 2
+    codes1, codes2 = codes[:n], codes[n:]
+
+    std = np.array([standardizer.standardize(address) if address else "" for address in uniques], dtype=object)
+    parsed = [standardizer.parse_components(std_address) for std_address in std]
+    lengths = np.array([len(std_address) for std_address in std])
+    token_counts = np.array([len(tokenize_address(std_address)) for std_address in std])
+
+    features = np.zeros((n, len(FEATURE_COLUMNS)), dtype=np.float32)
+    if n == 0:
+        return features
+
+    features[:, 0] = process.cpdist(std[codes1], std[codes2], scorer=Levenshtein.normalized_similarity, workers=workers)
+    features[:, 1] = process.cpdist(std[codes1], std[codes2], scorer=Indel.normalized_similarity, workers=workers)
+
+    for column, name in ((2, 'house_number'), (3, 'unit'), (4, 'zipcode')):
+        component = component_codes(parsed, name)
+        features[:, column] = (component[codes1] == component[codes2]) & (component[codes1] >= 0)
+
+    tokens1, tokens2 = token_counts[codes1], token_counts[codes2]
+    features[:, 5] = np.abs(tokens1 - tokens2) / np.maximum(np.maximum(tokens1, tokens2), 1)
+
+    # Pairs with an empty address get all-zero features
+    features[(lengths[codes1] == 0) | (lengths[codes2] == 0)] = 0.0
     return features
 
+def generate_features(addr1, addr2, standardizer):
+    row = generate_features_batch([addr1], [addr2], standardizer, workers=1)[0]
+    return {name: float(value) for name, value in zip(FEATURE_COLUMNS, row)}
+
 # Model loading and inference
 def model_fn(model_dir):
     print(f"Loading model from {model_dir}")
+    # standardizer.pkl was pickled from the training notebook, where AddressStandardizer lives in __main__
+    import __main__
+    if not hasattr(__main__, 'AddressStandardizer'):
+        __main__.AddressStandardizer = AddressStandardizer
     standardizer = joblib.load(os.path.join(model_dir, 'standardizer.pkl'))
     model = joblib.load(os.path.join(model_dir, 'xgboost_model.pkl'))
     
     with open(os.path.join(model_dir, 'feature_columns.json'), 'r') as f:
         feature_columns = json.load(f)
     
+    # A model trained on features this code no longer computes (e.g. seq_matcher_sim) must be retrained
+    unknown = [column for column in feature_columns if column not in FEATURE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Model expects features that are not computed: {unknown}; retrain it with {FEATURE_COLUMNS}")
+    
     return {
         'standardizer': standardizer,
         'model': model,
@@ -76,66 +177,77 @@ def model_fn(model_dir):
     }
 
 def input_fn(request_body, request_content_type):
-    if request_content_type == 'application/json':
+    if isinstance(request_body, bytes):
+        request_body = request_body.decode('utf-8')
+    content_type = request_content_type.split(';')[0].strip()
+    
+    if content_type == 'application/json':
         return json.loads(request_body)
+    elif content_type in ('application/jsonlines', 'application/x-ndjson'):
+        # One pair per line
+        return [json.loads(line) for line in request_body.splitlines() if line.strip()]
+    elif content_type == 'text/csv':
+        # addr1,addr2 per row, with an optional header row
+        rows = [row for row in csv.reader(io.StringIO(request_body)) if row]
+        if rows and [column.strip().lower() for column in rows[0][:2]] == ['addr1', 'addr2']:
+            rows = rows[1:]
+        return [{'addr1': row[0], 'addr2': row[1] if len(row) > 1 else ''} for row in rows]
     else:
         raise ValueError(f"Unsupported content type: {request_content_type}")
 
+def pair_addresses(pair):
+    # A pair is either {"addr1": ..., "addr2": ...} or [addr1, addr2]
+    if isinstance(pair, dict):
+        return pair.get('addr1') or '', pair.get('addr2') or ''
+    addr1, addr2 = (list(pair) + ['', ''])[:2]
+    return addr1 or '', addr2 or ''
+
 def predict_fn(input_data, artifacts):
     standardizer = artifacts['standardizer']
     model = artifacts['model']
     feature_columns = artifacts['feature_columns']
     
     # Process input format
-    if 'addresses' in input_data:
+    if isinstance(input_data, dict) and 'addresses' in input_data:
         pairs = input_data['addresses']
-    elif 'addr1' in input_data and 'addr2' in input_data:
+    elif isinstance(input_data, dict) and 'addr1' in input_data and 'addr2' in input_data:
         pairs = [input_data]
     else:
         pairs = input_data
     
-    results = []
+    if not pairs:
+        return []
     
-    for pair in pairs:
-        addr1 = pair.get('addr1', '')
-        addr2 = pair.get('addr2', '')
-        
-        # Generate features
-        features = generate_features(addr1, addr2, standardizer)
-        
-        # Convert to DataFrame
-        features_df = pd.DataFrame([features])
-        
-        # Make sure all expected columns are present
-        for col in feature_columns:
-            if col not in features_df.columns:
-                features_df[col] = 0.0
-        
-        # Ensure columns are in the correct order
-        features_df = features_df[feature_columns]
-        
-        # Make prediction
-        probability = float(model.predict_proba(features_df)[0][1])
-        prediction = int(probability >= 0.5)
-        
-        # Include standardized addresses
-        std_addr1 = standardizer.standardize(addr1) if addr1 else ""
-        std_addr2 = standardizer.standardize(addr2) if addr2 else ""
-        
-        results.append({
-            'addr1': addr1,
-            'addr2': addr2,
-            'standardized_addr1': std_addr1,
-            'standardized_addr2': std_addr2,
-            'match_probability': probability,
-            'is_match': prediction
-        })
+    addr1, addr2 = zip(*(pair_addresses(pair) for pair in pairs))
+    
+    # One feature matrix for the whole request, in the column order the model was trained with
+    features = generate_features_batch(addr1, addr2, standardizer)
+    features_df = pd.DataFrame(features, columns=FEATURE_COLUMNS)[feature_columns]
+    
+    # One predict_proba call for every pair
+    probabilities = model.predict_proba(features_df)[:, 1]
     
-    return results
+    # Standardized addresses, computed once per distinct address
+    standardized = {address: standardizer.standardize(address) if address else "" for address in set(addr1) | set(addr2)}
+    
+    return [
+        {
+            'addr1': a1,
+            'addr2': a2,
+            'standardized_addr1': standardized[a1],
+            'standardized_addr2': standardized[a2],
+            'match_probability': float(probability),
+            'is_match': int(probability >= 0.5)
+        }
+        for a1, a2, probability in zip(addr1, addr2, probabilities)
+    ]
 
 def output_fn(prediction, content_type):
+    content_type = (content_type or 'application/json').split(';')[0].strip()
     if content_type == 'application/json':
         return json.dumps(prediction)
+    elif content_type in ('application/jsonlines', 'application/x-ndjson'):
+        return ''.join(json.dumps(result) + '\\n' for result in prediction)
     else:
         raise ValueError(f"Unsupported content type: {content_type}")
 """
@@ -146,7 +258,7 @@ with open(os.path.join(code_dir, 'inference.py'), 'w') as f:
 
 # Write requirements file
 with open(os.path.join(code_dir, 'requirements.txt'), 'w') as f:
-    f.write('pandas>=1.0.0\nnumpy>=1.0.0\nscikit-learn>=0.0.0\nxgboost>=1.0.0\njoblib>=0.0.0\n')
+    f.write('pandas>=1.0.0\nnumpy>=1.0.0\nscikit-learn>=0.0.0\nxgboost>=1.0.0\njoblib>=0.0.0\nrapidfuzz>=3.6.0\n')
 
 print(f"Inference script saved to {code_dir}/inference.py")
 
@@ -1,7 +1,9 @@
 import json
 import os
+import sys
 import boto3
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -9,69 +11,161 @@ logger.setLevel(logging.INFO)
 # Get the endpoint name from environment variable
 ENDPOINT_NAME = os.environ.get('SAGEMAKER_ENDPOINT_NAME')
 
-# Initialize the SageMaker runtime client
-sagemaker_runtime = boto3.client('sagemaker-runtime')
+# Offline mode: score with the model artifacts in this directory instead of the endpoint
+LOCAL_MODEL_DIR = os.environ.get('LOCAL_MODEL_DIR')
+
+# Pairs per invoke_endpoint call, and how many calls run at once
+BATCH_SIZE = int(os.environ.get('BATCH_SIZE', '500'))
+MAX_CONCURRENCY = int(os.environ.get('MAX_CONCURRENCY', '4'))
+
+# Initialize the SageMaker runtime client (not needed offline)
+sagemaker_runtime = boto3.client('sagemaker-runtime') if not LOCAL_MODEL_DIR else None
+
+# Reused across warm invocations
+executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY)
+local_artifacts = None
+
+CORS_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*',  # For CORS support
+    'Access-Control-Allow-Headers': 'Content-Type',
+    'Access-Control-Allow-Methods': 'OPTIONS,POST'
+}
+
+def valid_address(address):
+    """An address is a string; null is scored as an empty address."""
+    return address is None or isinstance(address, str)
+
+def valid_pair(pair):
+    """A pair is {"addr1": ..., "addr2": ...} or a two-element array of addresses."""
+    if isinstance(pair, dict):
+        return all(key in pair and valid_address(pair[key]) for key in ['addr1', 'addr2'])
+    return isinstance(pair, list) and len(pair) == 2 and all(valid_address(address) for address in pair)
+
+def extract_pairs(request_body):
+    """Address pairs of one request, or None if the request is invalid."""
+    if isinstance(request_body, dict):
+        if 'addresses' in request_body:
+            pairs = request_body['addresses']
+        elif all(key in request_body for key in ['addr1', 'addr2']):
+            pairs = [{'addr1': request_body['addr1'], 'addr2': request_body['addr2']}]
+        else:
+            return None
+    else:
+        pairs = request_body
+
+    if not isinstance(pairs, list) or not all(valid_pair(pair) for pair in pairs):
+        return None
+    return pairs
+
+def load_local_artifacts():
+    """Load xgboost_model.pkl and standardizer.pkl once, with the endpoint's own inference code."""
+    global local_artifacts
+    if local_artifacts is None:
+        # inference.py is generated by build.py into code/; package it next to this file
+        import inference
+        local_artifacts = inference.model_fn(LOCAL_MODEL_DIR)
+    return local_artifacts
+
+def invoke_endpoint(pairs):
+    response = sagemaker_runtime.invoke_endpoint(
+        EndpointName=ENDPOINT_NAME,
+        ContentType='application/json',
+        Body=json.dumps({'addresses': pairs})
+    )
+    return json.loads(response['Body'].read().decode())
+
+def score_pairs(pairs):
+    """Match results for a list of pairs, in order."""
+    if LOCAL_MODEL_DIR:
+        import inference
+        return inference.predict_fn(pairs, load_local_artifacts())
+
+    # Micro-batches of BATCH_SIZE pairs, MAX_CONCURRENCY endpoint calls in flight
+    batches = [pairs[i:i + BATCH_SIZE] for i in range(0, len(pairs), BATCH_SIZE)]
+    results = []
+    for batch_results in executor.map(invoke_endpoint, batches):
+        results.extend(batch_results)
+    return results
 
 def lambda_handler(event, context):
-    """Lambda function that invokes a SageMaker endpoint for address matching."""
+    """
+    Lambda function that scores address pairs with the SageMaker endpoint
+    (or, offline, the local model artifacts).
+
+    A direct invocation can also batch several requests as
+    {"requests": [request, ...]}; their pairs are scored together and the
+    response body is a list with one result list per request.
+    """
     logger.info(f"Event: {json.dumps(event)}")
-    
+
     # Check if endpoint name is configured
-    if not ENDPOINT_NAME:
+    if not ENDPOINT_NAME and not LOCAL_MODEL_DIR:
         logger.error("SAGEMAKER_ENDPOINT_NAME environment variable not set")
         return {
             'statusCode': 500,
             'body': json.dumps({'error': 'SageMaker endpoint name not configured'})
         }
-    
+
     try:
         # Extract request body
-        if 'body' in event:
+        if isinstance(event, dict) and 'body' in event:
             # API Gateway integration
             if isinstance(event['body'], str):
-                request_body = json.loads(event['body'])
+                request_bodies = [json.loads(event['body'])]
             else:
-                request_body = event['body']
+                request_bodies = [event['body']]
+            batched = False
+        elif isinstance(event, dict) and 'requests' in event:
+            # Direct Lambda invocation with several requests
+            request_bodies = event['requests']
+            batched = True
+            if not isinstance(request_bodies, list):
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps({'error': 'Invalid input. "requests" must be an array of requests.'})
+                }
         else:
             # Direct Lambda invocation
-            request_body = event
-        
-        logger.info(f"Request body: {json.dumps(request_body)}")
-        
+            request_bodies = [event]
+            batched = False
+
         # Validate input
-        if 'addresses' not in request_body and not all(key in request_body for key in ['addr1', 'addr2']):
+        pair_lists = [extract_pairs(request_body) for request_body in request_bodies]
+        if any(pairs is None for pairs in pair_lists):
             return {
                 'statusCode': 400,
                 'body': json.dumps({
-                    'error': 'Invalid input. Provide either an "addresses" array or "addr1" and "addr2" fields.'
+                    'error': 'Invalid input. Provide either an "addresses" array of pairs or "addr1" and "addr2" fields, with string addresses.'
                 })
             }
-        
-        # Invoke SageMaker endpoint
-        response = sagemaker_runtime.invoke_endpoint(
-            EndpointName=ENDPOINT_NAME,
-            ContentType='application/json',
-            Body=json.dumps(request_body)
-        )
-        
-        # Parse response
-        result = json.loads(response['Body'].read().decode())
-        
+
+        # Score every pair of every request together, then split the results back per request
+        results = score_pairs([pair for pairs in pair_lists for pair in pairs])
+        per_request = []
+        offset = 0
+        for pairs in pair_lists:
+            per_request.append(results[offset:offset + len(pairs)])
+            offset += len(pairs)
+        logger.info(f"Scored {len(results)} pairs for {len(request_bodies)} requests")
+
         # Return response
         return {
             'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',  # For CORS support
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Allow-Methods': 'OPTIONS,POST'
-            },
-            'body': json.dumps(result)
+            'headers': CORS_HEADERS,
+            'body': json.dumps(per_request if batched else per_request[0])
         }
-        
+
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         return {
             'statusCode': 500,
             'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        }
+
+if __name__ == "__main__":
+    # Offline scoring without an endpoint:
+    #   LOCAL_MODEL_DIR=model python lambda_function.py event.json
+    logging.basicConfig()
+    with open(sys.argv[1]) as f:
+        print(json.dumps(lambda_handler(json.load(f), None), indent=2))